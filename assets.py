@@ -0,0 +1,168 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+# Assets usados em todo job
+ASSETS_DIR = "png"
+EVENT_FRAME_PATH = os.path.join(ASSETS_DIR, "frame.png")
+CIGARETTE_PATH = os.path.join(ASSETS_DIR, "cingarro.png")
+RANDOM_FRAMES = [os.path.join(ASSETS_DIR, name) for name in ("frame_fro.png", "frame _s2.png")]
+
+# Quantas variantes prontas (asset, tamanho, espelhado, invertido) manter em memória
+ASSET_CACHE_SIZE = int(os.getenv("ASSET_CACHE_SIZE", "64"))
+
+
+def invert_rgb(img):
+    """Inverte as cores de uma imagem RGBA mantendo o canal alpha."""
+    r, g, b, a = img.split()
+    rgb_inverted = ImageOps.invert(Image.merge("RGB", (r, g, b)))
+    ir, ig, ib = rgb_inverted.split()
+    return Image.merge("RGBA", (ir, ig, ib, a))
+
+
+def cover_size(asset_size, target_size):
+    """Tamanho para o asset cobrir target_size inteiro mantendo a proporção (mesma conta do pipeline)."""
+    aw, ah = asset_size
+    tw, th = target_size
+    scale = max(tw / aw, th / ah)
+    return (int(aw * scale), int(ah * scale))
+
+
+class AssetCache:
+    """
+    Cache de processo para os PNGs de overlay/moldura.
+    Guarda imagens RGBA prontas para colar, por (asset, tamanho, espelhado, invertido),
+    num LRU limitado. Se o arquivo mudar no disco (mtime), todas as variantes dele
+    são descartadas.
+    As imagens retornadas são compartilhadas: use, cole, mas não altere.
+    """
+
+    def __init__(self, max_entries=ASSET_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._mtimes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_mtime(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            if self._mtimes.get(path) != mtime:
+                if path in self._mtimes:
+                    print(f"Asset alterado no disco, recarregando: {path}")
+                for key in [k for k in self._entries if k[0] == path]:
+                    del self._entries[key]
+                self._mtimes[path] = mtime
+
+    def _lookup(self, key):
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return img
+
+    def _store(self, key, img):
+        with self._lock:
+            self._entries[key] = img
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, path, size=None, mirrored=False, inverted=False):
+        """
+        Retorna o asset em RGBA, redimensionado (LANCZOS) para `size`,
+        espelhado e/ou com as cores invertidas.
+        """
+        path = os.path.abspath(path)
+        self._check_mtime(path)
+        return self._get((path, tuple(size) if size else None, bool(mirrored), bool(inverted)))
+
+    def _get(self, key):
+        img = self._lookup(key)
+        if img is not None:
+            return img
+
+        # Monta a variante a partir da mais próxima: original -> resize -> espelho -> inversão
+        path, size, mirrored, inverted = key
+        if inverted:
+            img = invert_rgb(self._get((path, size, mirrored, False)))
+        elif mirrored:
+            img = ImageOps.mirror(self._get((path, size, False, False)))
+        elif size:
+            base = self._get((path, None, False, False))
+            img = base if base.size == size else base.resize(size, Image.Resampling.LANCZOS)
+        else:
+            with Image.open(path) as f:
+                img = f.convert("RGBA")
+
+        self._store(key, img)
+        return img
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._mtimes.clear()
+                return
+            path = os.path.abspath(path)
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+            self._mtimes.pop(path, None)
+
+    def warm_up(self, width=384):
+        """
+        Pré-carrega as variantes usadas em todo job na largura fixa da impressora:
+        moldura do texto, moldura obrigatória e molduras aleatórias sobre fotos 9:16
+        (normais e invertidas) e o cigarro original.
+        """
+        start_count = len(self._entries)
+        photo_sizes = {(width, int(width * 16 / 9)), (width, int(width * 16 / 9) + 1)}
+
+        for path in [EVENT_FRAME_PATH] + RANDOM_FRAMES:
+            if not os.path.exists(path):
+                continue
+            base = self.get(path)
+            for photo_size in photo_sizes:
+                size = cover_size(base.size, photo_size)
+                for inverted in (False, True):
+                    self.get(path, size, inverted=inverted)
+
+        if os.path.exists(EVENT_FRAME_PATH):
+            # Moldura do texto: largura da impressora, mantendo a proporção
+            base = self.get(EVENT_FRAME_PATH)
+            self.get(EVENT_FRAME_PATH, (width, int(width * (base.height / base.width))))
+
+        if os.path.exists(CIGARETTE_PATH):
+            self.get(CIGARETTE_PATH)
+
+        print(f"Cache de assets aquecido: {len(self._entries) - start_count} variantes ({width}px).")
+
+
+# Cache compartilhado pelo processo
+asset_cache = AssetCache()
+
+
+def get_asset(path, size=None, mirrored=False, inverted=False):
+    return asset_cache.get(path, size, mirrored, inverted)
+
+
+def asset_version(path):
+    """Identifica a versão do arquivo no disco (mtime + tamanho), para chaves de cache."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def warm_up(width=384):
+    try:
+        asset_cache.warm_up(width)
+    except Exception as e:
+        print(f"Aviso: não foi possível aquecer o cache de assets: {e}")
@@ -57,6 +57,36 @@ const API_BASE_URL = "https://api.exemplo.com";
 let currentFilename = null;
 let currentFacingMode = 'user'; // 'user' é a frontal, 'environment' é a traseira
 
+// Foto preparada no navegador: crop 9:16 e largura múltipla da impressora (384 px),
+// em vez de mandar a resolução inteira da câmera pelo túnel
+const PRINT_WIDTH = 384;
+const UPLOAD_WIDTH_MULTIPLE = 2; // 768 px: a bridge reduz 2:1 e a detecção de faces ainda tem detalhe
+const UPLOAD_QUALITY = 0.8;
+// Marca no nome do arquivo (como o raw_): a bridge pula o crop e reduz por fator inteiro
+const PREPARED_PREFIX = 'prep_';
+
+// WebP quando o navegador sabe codificar (o Safari antigo devolve PNG), senão JPEG
+function detectUploadFormat() {
+    const probe = document.createElement('canvas');
+    probe.width = probe.height = 1;
+    if (probe.toDataURL('image/webp').startsWith('data:image/webp')) {
+        return { type: 'image/webp', ext: 'webp' };
+    }
+    return { type: 'image/jpeg', ext: 'jpg' };
+}
+const UPLOAD_FORMAT = detectUploadFormat();
+
+let capturedPhoto = null; // Promise de { blob, filename } da última captura
+let previewUrl = null;
+let uploadStartedAt = null;
+
+function releasePreview() {
+    if (previewUrl) {
+        URL.revokeObjectURL(previewUrl);
+        previewUrl = null;
+    }
+}
+
 let alertTimeout = null;
 // Overlay Notification System
 function showToast(message, type = 'info') {
@@ -144,8 +174,16 @@ captureBtn.addEventListener('click', () => {
     const sx = (video.videoWidth - drawW) / 2;
     const sy = (video.videoHeight - drawH) / 2;
 
-    canvas.width = drawW;
-    canvas.height = drawH;
+    // Largura final: o maior múltiplo de 384 px até UPLOAD_WIDTH_MULTIPLE que a câmera cobre
+    const multiple = Math.min(UPLOAD_WIDTH_MULTIPLE, Math.floor(drawW / PRINT_WIDTH));
+    const prepared = multiple >= 1;
+    const outW = prepared ? PRINT_WIDTH * multiple : Math.round(drawW);
+    const outH = Math.round(outW / targetAspect);
+
+    canvas.width = outW;
+    canvas.height = outH;
+    context.imageSmoothingEnabled = true;
+    context.imageSmoothingQuality = 'high';
 
     // Se estiver espelhado na visualização, espelhar na captura também
     if (currentFacingMode === 'user') {
@@ -153,11 +191,24 @@ captureBtn.addEventListener('click', () => {
         context.scale(-1, 1);
     }
 
-    // Desenhar a imagem cortada para ser 9:16
-    context.drawImage(video, sx, sy, drawW, drawH, 0, 0, drawW, drawH);
+    // Desenhar a imagem cortada para ser 9:16, já reduzida
+    context.drawImage(video, sx, sy, drawW, drawH, 0, 0, outW, outH);
+
+    // Um único encode (assíncrono): o mesmo blob vira a prévia e o upload
+    const encodeStart = performance.now();
+    const filename = `${prepared ? PREPARED_PREFIX : ''}capture.${UPLOAD_FORMAT.ext}`;
+    capturedPhoto = new Promise((resolve) => {
+        canvas.toBlob((blob) => {
+            console.info(`Captura ${outW}x${outH} ${UPLOAD_FORMAT.type}: ${Math.round(blob.size / 1024)} KB, ` +
+                `encode em ${Math.round(performance.now() - encodeStart)} ms`);
+            releasePreview();
+            previewUrl = URL.createObjectURL(blob);
+            photoPreview.src = previewUrl;
+            resolve({ blob, filename });
+        }, UPLOAD_FORMAT.type, UPLOAD_QUALITY);
+    });
 
     video.style.display = 'none';
-    photoPreview.src = canvas.toDataURL('image/png');
     photoPreview.style.display = 'block';
 
     initialControls.style.display = 'none';
@@ -167,6 +218,9 @@ captureBtn.addEventListener('click', () => {
 function resetCamera() {
     video.style.display = 'block';
     photoPreview.style.display = 'none';
+    photoPreview.removeAttribute('src');
+    releasePreview();
+    capturedPhoto = null;
     initialControls.style.display = 'flex';
     actionControls.style.display = 'none';
     statusCard.style.display = 'none';
@@ -207,22 +261,23 @@ async function uploadPhoto(blobParam = null, isText = false, customFilename = nu
     statusCard.style.display = 'flex';
     statusMessage.innerText = "Usando habilidades de telepatia...";
 
-    const sendBlob = async (blob) => {
+    const sendBlob = async (blob, filename) => {
         const formData = new FormData();
-        const defaultFilename = isText ? 'message.txt' : 'capture.jpg';
-        const filename = customFilename || defaultFilename;
         formData.append('file', blob, filename);
 
         try {
+            uploadStartedAt = performance.now();
             const response = await fetch(`${API_BASE_URL}/upload/`, {
                 method: 'POST',
                 body: formData
             });
             const data = await response.json();
+            console.info(`Upload ${filename}: ${Math.round(blob.size / 1024)} KB em ` +
+                `${Math.round(performance.now() - uploadStartedAt)} ms`);
 
             if (data.filename) {
                 currentFilename = data.filename;
-                startPollingStatus();
+                startStatusUpdates();
             } else {
                 statusMessage.innerText = "Erro no upload.";
                 loader.style.display = 'none';
@@ -235,9 +290,10 @@ async function uploadPhoto(blobParam = null, isText = false, customFilename = nu
     };
 
     if (blobParam) {
-        await sendBlob(blobParam);
+        await sendBlob(blobParam, customFilename || (isText ? 'message.txt' : 'capture.jpg'));
     } else {
-        canvas.toBlob(sendBlob, 'image/jpeg', 0.85);
+        const { blob, filename } = await capturedPhoto;
+        await sendBlob(blob, filename);
     }
 }
 
@@ -284,6 +340,57 @@ messageArea.addEventListener('input', () => {
     }
 });
 
+// Atualiza a tela com um novo status. Retorna true quando o job terminou.
+function applyStatus(status) {
+    statusMessage.innerText = status;
+
+    if (status === "Pronto" || status.includes("Erro")) {
+        loader.style.display = 'none';
+        if (uploadStartedAt !== null) {
+            console.info(`Upload → ${status}: ${Math.round(performance.now() - uploadStartedAt)} ms`);
+            uploadStartedAt = null;
+        }
+        if (status === "Pronto") {
+            statusMessage.classList.add('completed');
+            setTimeout(() => {
+                resetCamera();
+            }, 1500);
+        }
+        return true;
+    }
+    return false;
+}
+
+// Status em tempo real via Server-Sent Events; se não der, volta para o polling
+function startStatusUpdates() {
+    if (!currentFilename) return;
+
+    if (!window.EventSource) {
+        startPollingStatus();
+        return;
+    }
+
+    const filename = currentFilename;
+    const source = new EventSource(`${API_BASE_URL}/status/${filename}/stream`);
+    let finished = false;
+
+    source.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (applyStatus(data.status)) {
+            finished = true;
+            source.close();
+        }
+    };
+
+    source.onerror = () => {
+        source.close();
+        if (!finished && currentFilename === filename) {
+            console.warn("Stream de status indisponível, usando polling.");
+            startPollingStatus();
+        }
+    };
+}
+
 async function startPollingStatus() {
     if (!currentFilename) return;
 
@@ -292,17 +399,8 @@ async function startPollingStatus() {
             const response = await fetch(`${API_BASE_URL}/status/${currentFilename}/`);
             const data = await response.json();
 
-            statusMessage.innerText = data.status;
-
-            if (data.status === "Pronto" || data.status.includes("Erro")) {
+            if (applyStatus(data.status)) {
                 clearInterval(interval);
-                loader.style.display = 'none';
-                if (data.status === "Pronto") {
-                    statusMessage.classList.add('completed');
-                    setTimeout(() => {
-                        resetCamera();
-                    }, 1500);
-                }
             }
         } catch (err) {
             console.error("Polling error:", err);
@@ -0,0 +1,148 @@
+"""
+Modo tudo-em-um: servidor Flask, bridge e monitor da impressora num processo só.
+Os jobs saem do job_feed do servidor, a bridge renderiza em threads e entrega a
+imagem PIL (ou o texto) para o PrintPipeline por filas asyncio: sem HTTP local,
+sem PNG codificado/decodificado e sem passar pela print_queue.
+O modo com três processos (start_barzar.sh) continua valendo para bridge e
+impressora em outra máquina.
+Uso: python barzar_all.py
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+import server
+import bridge
+import print_phomemo
+import tracing
+from print_phomemo import PhomemoPrinter, PrintPipeline, monitor_folder, resolve_target
+
+SERVER_HOST = os.getenv("BARZAR_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("BARZAR_PORT", "5001"))
+# Quantos jobs renderizados pela bridge podem esperar pela vez de ir para o pipeline
+HANDOFF_DEPTH = 4
+# Espera máxima (s) por um job novo no job_feed antes de olhar de novo
+JOB_WAIT = 1.0
+# Tentativas de renderizar um job antes de desistir com "Erro no processamento"
+RENDER_ATTEMPTS = int(os.getenv("BRIDGE_RENDER_ATTEMPTS", "3"))
+
+
+def start_server():
+    """Servidor Flask numa thread (o tunnel continua apontando para a mesma porta)."""
+    httpd = make_server(SERVER_HOST, SERVER_PORT, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, name="server", daemon=True).start()
+    print(f"Servidor em http://{SERVER_HOST}:{SERVER_PORT}")
+    return httpd
+
+
+class InProcessBridge:
+    """
+    Etapa da bridge dentro do processo: pega os uploads direto do job_feed e do
+    upload_spool, renderiza em paralelo num pool de threads e entrega ao
+    PrintPipeline na ordem de upload.
+    """
+
+    def __init__(self, pipeline, workers=bridge.BRIDGE_RENDER_PROCESSES):
+        self.pipeline = pipeline
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bridge-render")
+        self.handoff = asyncio.Queue(maxsize=HANDOFF_DEPTH)
+        self._tasks = []
+        # Jobs que falharam e voltam para o começo da fila, com as tentativas já feitas
+        self._retries = []
+        self._attempts = {}
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._feed_loop()),
+            asyncio.create_task(self._handoff_loop()),
+        ]
+        return self
+
+    def _render(self, filename, trace):
+        with tracing.activate(trace):
+            return bridge.render_to_image(filename, server.upload_spool.read(filename))
+
+    async def _feed_loop(self):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        while True:
+            retries, self._retries = self._retries, []
+            # O cursor também avança sobre jobs já processados (ex.: vindos do SQLite)
+            seq, jobs = await loop.run_in_executor(
+                None, server.job_feed.next_jobs, seq, 0 if retries else JOB_WAIT)
+            for job_seq, _ in jobs:
+                seq = max(seq, job_seq)
+            for filename in retries + [filename for _, filename in jobs]:
+                server.set_status(filename, "Me perdi aqui...")
+                # Mesmo ID do trace do upload; as etapas daqui vão para o servidor com o status
+                upload_trace = server.job_traces.picked_up(filename)
+                trace = tracing.Trace(filename, upload_trace.trace_id if upload_trace else None)
+                future = loop.run_in_executor(self.executor, self._render, filename, trace)
+                # Espera aqui quando HANDOFF_DEPTH jobs já estão na fila de entrega
+                await self.handoff.put((filename, future, trace))
+
+    async def _handoff_loop(self):
+        while True:
+            filename, future, trace = await self.handoff.get()
+            try:
+                source = await future
+            except Exception as e:
+                attempts = self._attempts.pop(filename, 0) + 1
+                if attempts < RENDER_ATTEMPTS:
+                    print(f"Erro no job {filename} (tentativa {attempts} de {RENDER_ATTEMPTS}): {e}")
+                    self._attempts[filename] = attempts
+                    self._retries.append(filename)
+                    continue
+                # Desiste: o job sai dos pendentes em vez de ficar preso até expirar
+                print(f"Erro no job {filename}: {e}")
+                server.set_status(filename, "Erro no processamento", trace=trace.export())
+                server.job_store.mark_processed(filename)
+                server.upload_spool.discard(filename)
+                continue
+            self._attempts.pop(filename, None)
+            trace.gauges["bridge_handoff"] = self.handoff.qsize()
+            server.set_status(filename, "Olhe a impressora", trace=trace.export())
+            server.job_store.mark_processed(filename)
+            server.upload_spool.discard(filename)
+            self.pipeline.submit(filename, source, tracing.Trace(filename, trace.trace_id))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+
+async def main():
+    httpd = start_server()
+    # Status da impressora ("Pronto", erros) vão direto para o job_store do servidor
+    print_phomemo.set_status_handler(server.set_status)
+    try:
+        target = await resolve_target()
+        if not target:
+            print("\n❌ Nenhuma impressora selecionada ou encontrada.")
+            return
+
+        print(f"Bridge no processo | Detector de faces: {bridge.get_face_detector().name}")
+        print_phomemo.warm_up(print_phomemo.PRINTER_WIDTH)
+        printer = PhomemoPrinter(target)
+        pipeline = PrintPipeline(printer).start()
+        stage = InProcessBridge(pipeline).start()
+        try:
+            # A print_queue continua sendo observada (jobs de uma bridge remota, arquivos manuais)
+            await monitor_folder(printer, pipeline)
+        finally:
+            await stage.stop()
+            await pipeline.stop()
+    finally:
+        httpd.shutdown()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nInterrompido pelo usuário.")
@@ -0,0 +1,133 @@
+"""
+Modo tudo-em-um contra o fluxo de três componentes, no mesmo computador e com a
+impressora simulada (FakeBleakClient): tempo de cada upload até o status
+"Pronto". No fluxo antigo a bridge baixa por HTTP, grava o PNG na print_queue e
+o monitor decodifica de novo; no barzar_all.InProcessBridge a imagem PIL vai
+direto para o PrintPipeline.
+Uso: python benchmarks/bench_all_in_one.py [fotos]
+"""
+import asyncio
+import io
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PORT = 5080
+os.environ["REMOTE_SERVER_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("FACE_DETECTOR", "none")
+os.environ.setdefault("BRIDGE_RENDER_PROCESSES", "0")
+
+# Os componentes criam uploads/, print_queue/ e temp/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+os.symlink(os.path.join(ROOT, "png"), "png")
+
+import numpy as np  # noqa: E402
+import requests  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import barzar_all  # noqa: E402
+import bridge  # noqa: E402
+import print_phomemo  # noqa: E402
+import server  # noqa: E402
+from ble_transmit import BleTransmitter  # noqa: E402
+from fake_ble import FakeBleakClient  # noqa: E402
+
+PHOTOS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+# Intervalo entre uploads (s), para medir a latência de cada job e não a fila
+UPLOAD_GAP = 2.0
+
+
+def photo_bytes(seed):
+    rng = np.random.default_rng(seed)
+    img = Image.fromarray(rng.integers(0, 256, (400, 225, 3), dtype=np.uint8)).resize((1080, 1920))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+async def fake_printer():
+    printer = print_phomemo.PhomemoPrinter("fake")
+    printer.client = FakeBleakClient(drain_rate=200000)
+    await printer.client.start_notify(print_phomemo.NOTIFY_CHARACTERISTIC_UUID, printer._notification_handler)
+    printer.transmitter = BleTransmitter(printer.client, print_phomemo.WRITE_CHARACTERISTIC_UUID, rate=200000)
+    return printer
+
+
+async def upload_all(prefix):
+    loop = asyncio.get_running_loop()
+    latencies = []
+    for i in range(PHOTOS):
+        data = photo_bytes(i)
+        start = time.perf_counter()
+        response = await loop.run_in_executor(None, lambda: requests.post(
+            f"http://127.0.0.1:{PORT}/upload/", files={"file": (f"{prefix}{i}.jpg", data, "image/jpeg")}))
+        filename = response.json()["filename"]
+        while server.job_store.get_status(filename) != "Pronto":
+            await asyncio.sleep(0.005)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(UPLOAD_GAP)
+    return latencies
+
+
+async def three_components():
+    printer = await fake_printer()
+    print_phomemo.set_status_handler(None)
+    engine = bridge.BridgeEngine(render_processes=0)
+    listener = bridge.JobStreamListener(engine).start()
+    monitor = asyncio.create_task(print_phomemo.monitor_folder(printer))
+    await asyncio.sleep(1)
+    try:
+        return await upload_all("sep_")
+    finally:
+        monitor.cancel()
+        listener.stop()
+        engine.shutdown()
+
+
+async def all_in_one():
+    printer = await fake_printer()
+    print_phomemo.set_status_handler(server.set_status)
+    pipeline = print_phomemo.PrintPipeline(printer).start()
+    stage = barzar_all.InProcessBridge(pipeline).start()
+    monitor = asyncio.create_task(print_phomemo.monitor_folder(printer, pipeline))
+    await asyncio.sleep(1)
+    try:
+        return await upload_all("one_")
+    finally:
+        monitor.cancel()
+        await stage.stop()
+        await pipeline.stop()
+
+
+async def main():
+    # Log de cada requisição do Flask/werkzeug atrapalha a leitura do resultado
+    logging.disable(logging.INFO)
+    barzar_all.SERVER_HOST, barzar_all.SERVER_PORT = "127.0.0.1", PORT
+    httpd = barzar_all.start_server()
+    results = []
+    try:
+        for label, mode in (("três componentes", three_components), ("tudo-em-um", all_in_one)):
+            # Saída das etapas fica de fora; só o resumo interessa
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                results.append((label, await mode()))
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+    finally:
+        httpd.shutdown()
+    print(f"{PHOTOS} fotos 1080x1920 enviadas uma a uma, impressora simulada a 200 KB/s")
+    for label, latencies in results:
+        print(f"{label:>17}: upload → Pronto mediana {statistics.median(latencies) * 1000:6.0f} ms, "
+              f"máx {max(latencies) * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
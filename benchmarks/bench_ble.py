@@ -0,0 +1,78 @@
+"""
+Envio de uma foto para a impressora com o FakeBleakClient: o loop antigo
+(comando inteiro + sleep fixo de 40 ms) contra o BleTransmitter (pacotes do
+MTU, token bucket e taxa adaptativa), numa impressora rápida e numa lenta.
+Uso: python benchmarks/bench_ble.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# print_phomemo cria print_queue/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from ble_transmit import BleTransmitter  # noqa: E402
+from fake_ble import FakeBleakClient  # noqa: E402
+from print_phomemo import WRITE_CHARACTERISTIC_UUID, image_to_escpos  # noqa: E402
+
+PRINTERS = {
+    "rápida": {"drain_rate": 40000, "buffer_size": 16384},
+    "lenta": {"drain_rate": 12000, "buffer_size": 4096},
+}
+
+
+def sample_commands():
+    rng = np.random.default_rng(0)
+    img = Image.fromarray((rng.random((683, 384)) > 0.5).astype(np.uint8) * 255).convert("1")
+    return image_to_escpos(img)
+
+
+async def legacy_send(client, commands):
+    for cmd in commands:
+        await client.write_gatt_char(WRITE_CHARACTERISTIC_UUID, cmd, response=False)
+        await asyncio.sleep(0.04)
+
+
+async def run(label, printer, send):
+    client = FakeBleakClient(**printer)
+    commands = sample_commands()
+    total = sum(len(c) for c in commands)
+    start = time.perf_counter()
+    await send(client, commands)
+    sent = time.perf_counter() - start
+    await client.wait_drained()
+    printed = time.perf_counter() - start
+    intact = bytes(client.received) == b"".join(commands)
+    print(f"  {label:>12}: envio {sent:5.2f} s ({total / sent / 1024:5.1f} KB/s), impresso em {printed:5.2f} s, "
+          f"{client.dropped} bytes perdidos, {client.writes} escritas, íntegro: {'sim' if intact else 'NÃO'}")
+
+
+async def main():
+    total = sum(len(c) for c in sample_commands())
+    print(f"Foto 384x683: {total} bytes de ESC/POS")
+    for name, printer in PRINTERS.items():
+        print(f"Impressora {name}: {printer['drain_rate'] / 1000:.0f} KB/s, buffer {printer['buffer_size']} bytes")
+        await run("sleep fixo", printer, legacy_send)
+
+        transmitter = None
+
+        async def adaptive_send(client, commands):
+            nonlocal transmitter
+            transmitter = BleTransmitter(client, WRITE_CHARACTERISTIC_UUID)
+            await transmitter.send(commands)
+
+        await run("adaptativo", printer, adaptive_send)
+        print(f"  {'':>12}  {transmitter.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
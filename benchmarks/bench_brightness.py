@@ -0,0 +1,92 @@
+"""
+Microbenchmark da análise de brilho (brightness.py) contra os loops por pixel
+originais de bridge.is_dark_area / bridge.is_frame_area_dark.
+Uso: python benchmarks/bench_brightness.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from brightness import BrightnessMap  # noqa: E402
+
+
+def legacy_area_mean(img, pos, size):
+    """Cópia do loop original de is_dark_area (retorna a média)."""
+    area = img.crop((pos[0], pos[1], pos[0] + size[0], pos[1] + size[1])).convert("L")
+    stat = area.load()
+    w, h = area.size
+    total = 0
+    for y in range(h):
+        for x in range(w):
+            total += stat[x, y]
+    return total / (w * h)
+
+
+def legacy_frame_mean(img):
+    """Cópia do loop original de is_frame_area_dark (amostragem de passo 2)."""
+    w, h = img.size
+    pixels = img.convert("L").load()
+    total = 0
+    samples = 0
+    top_h = int(h * 0.3)
+    for y in range(0, top_h, 2):
+        for x in range(0, w, 2):
+            total += pixels[x, y]
+            samples += 1
+    for y in range(top_h, h, 2):
+        for x in range(min(10, w)):
+            total += pixels[x, y]
+            samples += 1
+        for x in range(max(0, w - 10), w):
+            total += pixels[x, y]
+            samples += 1
+    return total / samples
+
+
+def timed(fn, *args, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 256, size=(683, 384, 4), dtype=np.uint8)
+    img = Image.fromarray(arr, "RGBA")
+
+    # Moldura aleatória cobrindo a foto inteira (com sobra fora da imagem) e um cigarro
+    boxes = {
+        "moldura cheia": ((-20, -10), (424, 703)),
+        "cigarro": ((150, 400), (86, 82)),
+    }
+
+    t_map, bmap = timed(BrightnessMap, img)
+    print(f"BrightnessMap (grayscale + tabelas integrais): {t_map * 1000:.2f} ms por foto")
+
+    for name, (pos, size) in boxes.items():
+        t_old, old = timed(legacy_area_mean, img, pos, size)
+        box = (pos[0], pos[1], pos[0] + size[0], pos[1] + size[1])
+        t_new, new = timed(bmap.mean, box)
+        print(f"{name}: loop {t_old * 1000:.2f} ms | tabela {t_new * 1e6:.1f} us | "
+              f"média {old:.3f} vs {new:.3f}")
+
+    t_old, old = timed(legacy_frame_mean, img)
+    t_new, new = timed(bmap.frame_mean)
+    print(f"área da moldura: loop {t_old * 1000:.2f} ms | tabela {t_new * 1e6:.1f} us | "
+          f"média {old:.3f} (amostrada) vs {new:.3f} (exata)")
+
+    t_stats, _ = timed(bmap.stats, (0, 0, 384, 204))
+    print(f"stats (média, variância, histograma) topo 30%: {t_stats * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
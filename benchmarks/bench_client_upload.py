@@ -0,0 +1,168 @@
+"""
+Upload da foto como o app manda hoje (recorte 9:16 na resolução da câmera,
+JPEG 0.85) contra a foto preparada no navegador (9:16 com 768 px de largura,
+WebP ou JPEG 0.8, prefixo prep_), num perfil de celular com a rede limitada.
+O app é simulado com o Pillow (LANCZOS no lugar do drawImage com suavização
+alta) e o uplink com uma espera de RTT + bytes / banda antes de cada POST;
+servidor, bridge e impressora (FakeBleakClient) rodam de verdade. Mostra os
+bytes enviados e o tempo do toque em "Manda bala" até o status "Pronto".
+Uso: python benchmarks/bench_client_upload.py [fotos]
+"""
+import asyncio
+import io
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PORT = 5081
+os.environ["REMOTE_SERVER_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ.setdefault("FACE_DETECTOR", "none")
+os.environ.setdefault("BRIDGE_RENDER_PROCESSES", "0")
+
+# Os componentes criam uploads/, print_queue/ e temp/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+os.symlink(os.path.join(ROOT, "png"), "png")
+
+import numpy as np  # noqa: E402
+import requests  # noqa: E402
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+import barzar_all  # noqa: E402
+import bridge  # noqa: E402
+import print_phomemo  # noqa: E402
+import server  # noqa: E402
+from ble_transmit import BleTransmitter  # noqa: E402
+from fake_ble import FakeBleakClient  # noqa: E402
+
+PHOTOS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+# Throttling "mobile" do Lighthouse aplicado no DevTools: 562,5 ms de RTT e 675 kbit/s de upload
+MOBILE_RTT = 0.5625
+MOBILE_UPLINK = 675_000 / 8
+# Quadro da câmera em retrato (1080p), como o videoWidth/videoHeight de um celular
+FRAME_SIZE = (1080, 1920)
+UPLOAD_WIDTH = bridge.PRINT_WIDTH * 2
+UPLOAD_GAP = 1.0
+
+
+def camera_frame(seed):
+    """Cena com formas suaves, degradê e ruído de sensor: tamanho de arquivo parecido com uma foto."""
+    rng = np.random.default_rng(seed)
+    w, h = FRAME_SIZE
+    img = Image.new("RGB", FRAME_SIZE, tuple(int(v) for v in rng.integers(40, 200, 3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.integers(0, w), rng.integers(0, h)
+        r = int(rng.integers(60, 400))
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(int(v) for v in rng.integers(0, 256, 3)))
+    img = img.filter(ImageFilter.GaussianBlur(6))
+    yy = np.mgrid[0:h, 0:w][0][..., None]
+    arr = np.asarray(img, dtype=np.float32) + yy / h * 40 + rng.normal(0, 4, (h, w, 3))
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+
+
+def encode(img, fmt, quality):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=quality)
+    return buf.getvalue()
+
+
+def original_upload(frame):
+    """App de hoje: o recorte 9:16 inteiro (o quadro já é 9:16) em JPEG 0.85."""
+    return "capture.jpg", encode(frame, "JPEG", 85)
+
+
+def prepared_upload(fmt, ext):
+    def prepare(frame):
+        size = (UPLOAD_WIDTH, round(UPLOAD_WIDTH * 16 / 9))
+        return f"{bridge.PREPARED_PREFIX}capture.{ext}", encode(frame.resize(size, Image.Resampling.LANCZOS), fmt, 80)
+    return prepare
+
+
+MODES = [
+    ("original JPEG", original_upload),
+    ("preparado WebP", prepared_upload("WEBP", "webp")),
+    ("preparado JPEG", prepared_upload("JPEG", "jpg")),
+]
+
+
+async def fake_printer():
+    printer = print_phomemo.PhomemoPrinter("fake")
+    printer.client = FakeBleakClient(drain_rate=200000)
+    await printer.client.start_notify(print_phomemo.NOTIFY_CHARACTERISTIC_UUID, printer._notification_handler)
+    printer.transmitter = BleTransmitter(printer.client, print_phomemo.WRITE_CHARACTERISTIC_UUID, rate=200000)
+    return printer
+
+
+async def upload_all(make_upload):
+    """(bytes, upload limitado, upload → Pronto) de cada foto, uma por vez."""
+    loop = asyncio.get_running_loop()
+    rows = []
+    for i in range(PHOTOS):
+        name, data = make_upload(camera_frame(i))
+        name = f"{i}_{name}"
+        start = time.perf_counter()
+        # Rede do celular: um RTT para a requisição e o corpo na banda de upload
+        await asyncio.sleep(MOBILE_RTT + len(data) / MOBILE_UPLINK)
+        response = await loop.run_in_executor(None, lambda: requests.post(
+            f"http://127.0.0.1:{PORT}/upload/", files={"file": (name, data)}))
+        uploaded = time.perf_counter() - start
+        filename = response.json()["filename"]
+        while server.job_store.get_status(filename) != "Pronto":
+            await asyncio.sleep(0.005)
+        # O "Pronto" ainda volta ao celular pelo stream de status (meio RTT)
+        rows.append((len(data), uploaded, time.perf_counter() - start + MOBILE_RTT / 2))
+        await asyncio.sleep(UPLOAD_GAP)
+    return rows
+
+
+async def run_mode(make_upload):
+    printer = await fake_printer()
+    print_phomemo.set_status_handler(None)
+    engine = bridge.BridgeEngine(render_processes=0)
+    listener = bridge.JobStreamListener(engine).start()
+    monitor = asyncio.create_task(print_phomemo.monitor_folder(printer))
+    await asyncio.sleep(1)
+    try:
+        return await upload_all(make_upload)
+    finally:
+        monitor.cancel()
+        listener.stop()
+        engine.shutdown()
+
+
+async def main():
+    # Log de cada requisição do Flask/werkzeug atrapalha a leitura do resultado
+    logging.disable(logging.INFO)
+    barzar_all.SERVER_HOST, barzar_all.SERVER_PORT = "127.0.0.1", PORT
+    httpd = barzar_all.start_server()
+    results = []
+    try:
+        for label, make_upload in MODES:
+            # Saída das etapas fica de fora; só o resumo interessa
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                results.append((label, await run_mode(make_upload)))
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+    finally:
+        httpd.shutdown()
+
+    print(f"{PHOTOS} fotos de uma câmera {FRAME_SIZE[0]}x{FRAME_SIZE[1]}, rede móvel limitada "
+          f"({MOBILE_RTT * 1000:.1f} ms de RTT, {MOBILE_UPLINK * 8 / 1000:.0f} kbit/s de upload)")
+    print(f"{'modo':<15} {'KB enviados':>11} {'upload ms':>10} {'até Pronto ms':>14} {'máx ms':>8}")
+    for label, rows in results:
+        sizes, uploads, totals = zip(*rows)
+        print(f"{label:<15} {statistics.mean(sizes) / 1024:11.0f} {statistics.median(uploads) * 1000:10.0f} "
+              f"{statistics.median(totals) * 1000:14.0f} {max(totals) * 1000:8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
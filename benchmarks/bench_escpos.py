@@ -0,0 +1,61 @@
+"""
+Encoder ESC/POS com linhas em branco como ESC J: bytes economizados por job e
+conferência com o decoder (o bitmap reconstruído tem que ser idêntico).
+Uso: python benchmarks/bench_escpos.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+# bridge/print_phomemo criam pastas no diretório atual; os PNGs são lidos de png/
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+os.symlink(os.path.join(ROOT, "png"), "png")
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import bridge  # noqa: E402
+from escpos import decode_raster, encode_raster, raster_bytes  # noqa: E402
+from face_detection import NullDetector  # noqa: E402
+from print_phomemo import process_image, text_to_image  # noqa: E402
+
+REPEAT = 20
+
+
+def samples():
+    rng = np.random.default_rng(0)
+    photo = Image.fromarray(rng.integers(0, 256, (1600, 900, 3), dtype=np.uint8))
+    smooth = Image.linear_gradient("L").resize((900, 1600)).convert("RGB")
+    yield "foto (ruído)", process_image(bridge.render_photo(photo, NullDetector()))
+    yield "foto (degradê)", process_image(bridge.render_photo(smooth, NullDetector()))
+    yield "texto curto", process_image(text_to_image("Oi!"))
+    yield "texto longo", process_image(text_to_image("Mensagem telepática " * 12))
+
+
+def main():
+    total_raw = total_sent = 0
+    for label, img in samples():
+        data, width_bytes = raster_bytes(img)
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            commands, stats = encode_raster(img)
+        encode_ms = (time.perf_counter() - start) / REPEAT * 1000
+
+        decoded = decode_raster(commands, width_bytes)
+        ok = decoded == data
+        total_raw += stats["raw_bytes"]
+        total_sent += stats["sent_bytes"]
+        print(f"{label:>15}: {stats['raw_bytes']:6d} -> {stats['sent_bytes']:6d} bytes "
+              f"(-{stats['saved_bytes'] / stats['raw_bytes']:.0%}), {stats['blank_rows']}/{stats['rows']} linhas "
+              f"em branco, {stats['chunks']} blocos, {encode_ms:.2f} ms, decoder: {'idêntico' if ok else 'DIFERENTE'}")
+        if not ok:
+            sys.exit(1)
+    print(f"{'total':>15}: {total_raw} -> {total_sent} bytes (-{(total_raw - total_sent) / total_raw:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Detecção de faces por backend e tamanho de lote: imagens/s e faces/s em fotos
+sintéticas de 384 px (o tamanho que a bridge passa ao detector) com 0 a 2
+faces desenhadas, mais quantas dessas faces cada backend achou e o ganho do
+cache por hash quando as mesmas imagens voltam. O Vision só entra no macOS.
+Uso: python benchmarks/bench_face_detection.py [imagens]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import face_detection  # noqa: E402
+from face_detection import HAS_VISION, HaarDetector, NullDetector, StubDetector, VisionDetector  # noqa: E402
+
+IMAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+BATCH_SIZES = (1, 4, 8, 16)
+WIDTH, HEIGHT = 384, 683
+
+
+def draw_face(draw, cx, cy, size):
+    """Oval claro com sobrancelhas, olhos, nariz e boca escuros."""
+    fw, fh = size, int(size * 1.3)
+    draw.ellipse([cx - fw / 2, cy - fh / 2, cx + fw / 2, cy + fh / 2], fill=200)
+    ey = cy - fh * 0.12
+    for ex in (cx - fw * 0.22, cx + fw * 0.22):
+        draw.ellipse([ex - fw * 0.12, ey - fw * 0.125, ex + fw * 0.12, ey - fw * 0.095], fill=70)
+        draw.ellipse([ex - fw * 0.09, ey - fw * 0.04, ex + fw * 0.09, ey + fw * 0.04], fill=40)
+    draw.polygon([(cx, ey + fw * 0.05), (cx - fw * 0.07, cy + fh * 0.12), (cx + fw * 0.07, cy + fh * 0.12)], fill=170)
+    my = cy + fh * 0.25
+    draw.ellipse([cx - fw * 0.2, my - fw * 0.05, cx + fw * 0.2, my + fw * 0.05], fill=60)
+
+
+def sample_images(count):
+    """(imagem RGBA, faces desenhadas). Fundo com degradê e ruído; faces de 70 a 200 px."""
+    rng = np.random.default_rng(0)
+    samples = []
+    for i in range(count):
+        background = 60 + rng.integers(0, 60)
+        img = Image.new("L", (WIDTH, HEIGHT), int(background))
+        draw = ImageDraw.Draw(img)
+        n_faces = i % 3
+        for k in range(n_faces):
+            size = int(rng.integers(70, 200 if n_faces == 1 else 130))
+            cx = WIDTH // 2 if n_faces == 1 else (WIDTH // 4 if k == 0 else 3 * WIDTH // 4)
+            cy = int(rng.integers(HEIGHT // 3, 2 * HEIGHT // 3))
+            draw_face(draw, cx + int(rng.integers(-20, 20)), cy, size)
+        img = img.filter(ImageFilter.GaussianBlur(2))
+        yy = np.mgrid[0:HEIGHT, 0:WIDTH][0]
+        arr = np.asarray(img, dtype=np.float32) + yy / HEIGHT * 30 + rng.normal(0, 6, (HEIGHT, WIDTH))
+        gray = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8), "L")
+        samples.append((gray.convert("RGBA"), n_faces))
+    return samples
+
+
+def run(detector, images, batch_size):
+    start = time.perf_counter()
+    found = []
+    for i in range(0, len(images), batch_size):
+        found.extend(detector.detect_batch(images[i:i + batch_size], ("outer_lips",)))
+    return time.perf_counter() - start, found
+
+
+def backends():
+    stub_face = {"bbox": [0.35, 0.55, 0.3, 0.2], "landmarks": {"outer_lips": [[0.5, 0.25]]}}
+    yield "none", lambda: NullDetector()
+    yield "stub", lambda: StubDetector([stub_face])
+    yield "haar", lambda: HaarDetector(cache_size=0)
+    if HAS_VISION:
+        yield "vision", lambda: VisionDetector(cache_size=0)
+
+
+def main():
+    samples = sample_images(IMAGES)
+    images = [img for img, _ in samples]
+    planted = sum(n for _, n in samples)
+    print(f"{IMAGES} imagens {WIDTH}x{HEIGHT}, {planted} faces desenhadas")
+    print(f"{'backend':<8} {'lote':>4} {'imagens/s':>10} {'faces/s':>9} {'ms/imagem':>10} {'faces achadas':>14}")
+    for name, make in backends():
+        for batch_size in BATCH_SIZES:
+            detector = make()
+            seconds, found = run(detector, images, batch_size)
+            n_found = sum(len(faces) for faces in found)
+            print(f"{name:<8} {batch_size:>4} {IMAGES / seconds:10.1f} {n_found / seconds:9.1f} "
+                  f"{seconds / IMAGES * 1000:10.1f} {n_found:>14}")
+
+    # Mesmas imagens de novo: o cache por hash devolve sem rodar a cascata
+    detector = HaarDetector(cache_size=IMAGES) if face_detection.DETECTION_CACHE_SIZE else None
+    if detector:
+        cold, _ = run(detector, images, 8)
+        warm, _ = run(detector, images, 8)
+        print(f"cache haar: primeira passada {cold / IMAGES * 1000:.1f} ms/imagem, "
+              f"repetida {warm / IMAGES * 1000:.2f} ms/imagem ({cold / warm:.0f}x), "
+              f"acertos {detector.hits}/{detector.hits + detector.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark do motor de halftone (halftone.py) contra o loop original por célula.
+Uso: python benchmarks/bench_halftone.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageStat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import halftone  # noqa: E402
+
+
+def legacy_apply_halftone(img, sample=3):
+    """Cópia da implementação original de bridge.apply_halftone (referência)."""
+    img = img.convert("L")
+    w, h = img.size
+    out = Image.new("L", (w, h), 255)
+    draw = ImageDraw.Draw(out)
+    for x in range(0, w, sample):
+        for y in range(0, h, sample):
+            box = (x, y, min(x + sample, w), min(y + sample, h))
+            stat = ImageStat.Stat(img.crop(box))
+            if not stat.mean: continue
+            ratio = 1 - (stat.mean[0] / 255.0)
+            radius = (sample / 1.5) * (ratio ** 1.2)
+            if radius > 0.4:
+                cx = x + (sample / 2.0)
+                cy = y + (sample / 2.0)
+                draw.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], fill=0)
+    return out
+
+
+def sample_image(width, seed=0):
+    """Foto sintética 9:16: gradiente + ruído + formas, para exercitar todos os raios."""
+    height = int(width * 16 / 9)
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = (xx / width * 180 + yy / height * 75)
+    noise = rng.normal(0, 25, size=(height, width))
+    arr = np.clip(base + noise, 0, 255).astype(np.uint8)
+    img = Image.fromarray(arr, "L")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([width * 0.2, height * 0.2, width * 0.8, height * 0.5], fill=20)
+    return img
+
+
+def timed(fn, *args, repeat=3, **kwargs):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    for width in (384, 768):
+        # 384x682: altura não múltipla de 3, testa as células parciais da borda
+        img = sample_image(width)
+        halftone.dot_table.cache_clear()
+        t_cold, _ = timed(halftone.apply_halftone, img, 3, repeat=1)
+        print(f"{img.size[0]}x{img.size[1]}: primeira chamada (tabela de pontos fria) {t_cold * 1000:.1f} ms")
+        for sample in (3, 4):
+            t_old, old = timed(legacy_apply_halftone, img, sample)
+            t_new, new = timed(halftone.apply_halftone, img, sample)
+            same = old.tobytes() == new.tobytes()
+            print(f"{img.size[0]}x{img.size[1]} sample={sample}: original {t_old * 1000:.1f} ms | "
+                  f"vetorizado {t_new * 1000:.1f} ms | {t_old / t_new:.1f}x | idêntico: {same}")
+
+        for shape in halftone.DOT_SHAPES:
+            t, _ = timed(halftone.apply_halftone, img, 3, shape=shape)
+            print(f"  shape={shape}: {t * 1000:.1f} ms")
+        for mode in ("ordered", "diffusion"):
+            t, _ = timed(halftone.apply_halftone, img, 3, mode=mode)
+            print(f"  mode={mode}: {t * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
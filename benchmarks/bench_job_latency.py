@@ -0,0 +1,123 @@
+"""
+Mede o tempo entre o upload e a bridge pegar o job, com um servidor local:
+stream (/jobs/stream) contra o polling antigo de POLL_INTERVAL segundos.
+Uso: python benchmarks/bench_job_latency.py
+"""
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+PORT = 5077
+os.environ["REMOTE_SERVER_URL"] = f"http://127.0.0.1:{PORT}"
+
+# O servidor cria uploads/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+
+import requests  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import bridge  # noqa: E402
+import server  # noqa: E402
+
+UPLOADS = 20
+
+
+class RecordingEngine:
+    """Faz o papel do BridgeEngine: só anota quando cada job chegou."""
+
+    def __init__(self):
+        self.seen = {}
+        self.duplicates = 0
+        self.arrived = threading.Condition()
+
+    def submit(self, filenames):
+        with self.arrived:
+            for name in filenames:
+                if name in self.seen:
+                    self.duplicates += 1
+                else:
+                    self.seen[name] = time.perf_counter()
+            self.arrived.notify_all()
+        return len(filenames)
+
+
+def upload(i):
+    start = time.perf_counter()
+    response = requests.post(f"{bridge.REMOTE_SERVER_URL}/upload/", files={"file": (f"msg{i}.txt", b"oi")})
+    return response.json()["filename"], start
+
+
+def idle_stream(cursor, seconds=1.0):
+    """(bytes, ids recebidos) do /jobs/stream em seconds segundos, começando em cursor."""
+    received, ids = 0, []
+    response = requests.get(f"{bridge.REMOTE_SERVER_URL}/jobs/stream/", headers={"Last-Event-ID": cursor},
+                            stream=True, timeout=(5, seconds))
+    try:
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            received += len(line) + 1
+            if line.startswith("id:"):
+                ids.append(line[3:].strip())
+    except requests.exceptions.ConnectionError:
+        pass  # fim da leitura: nada chegou em seconds segundos
+    finally:
+        response.close()
+    return received, ids
+
+
+def main():
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server.logger.setLevel(logging.ERROR)
+    srv = make_server("127.0.0.1", PORT, server.app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    engine = RecordingEngine()
+    listener = bridge.JobStreamListener(engine).start()
+    listener.connected.wait(5)
+
+    latencies = []
+    for i in range(UPLOADS):
+        filename, start = upload(i)
+        with engine.arrived:
+            engine.arrived.wait_for(lambda: filename in engine.seen, timeout=5)
+        latencies.append((engine.seen[filename] - start) * 1000)
+        time.sleep(0.05)
+
+    # Reconexão: jobs enviados com o stream desligado chegam ao reconectar, sem repetir os antigos
+    listener.stop()
+    missed = [upload(UPLOADS + i)[0] for i in range(3)]
+    resumed = bridge.JobStreamListener(engine)
+    resumed.cursor = listener.cursor
+    resumed.start()
+    with engine.arrived:
+        engine.arrived.wait_for(lambda: all(m in engine.seen for m in missed), timeout=5)
+
+    # Cursor atrás de jobs que a bridge já processou: o stream avança o cursor uma vez e fica
+    # parado até o heartbeat, em vez de mandar keep-alive sem parar
+    resumed.stop()
+    for name in server.job_store.pending():
+        server.job_store.mark_processed(name)
+    idle_bytes, idle_ids = idle_stream(server.job_feed.format_cursor(0))
+    expected_cursor = server.job_feed.format_cursor(server.job_store.last_seq)
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"Stream: upload -> bridge em média {statistics.mean(latencies):.1f} ms "
+          f"(p50 {statistics.median(latencies):.1f} ms, p95 {p95:.1f} ms, {UPLOADS} uploads)")
+    print(f"Polling de {bridge.POLL_INTERVAL}s: média esperada {bridge.POLL_INTERVAL * 500:.0f} ms, "
+          f"pior caso {bridge.POLL_INTERVAL * 1000} ms")
+    print(f"Retomada pelo cursor: {sum(m in engine.seen for m in missed)}/{len(missed)} jobs perdidos recuperados, "
+          f"{engine.duplicates} entregas duplicadas")
+    print(f"Cursor atrás de jobs processados: {idle_bytes} bytes em 1 s, cursor avançado para "
+          f"{idle_ids[-1] if idle_ids else '-'} ({'ok' if idle_ids == [expected_cursor] else f'esperado {expected_cursor}'})")
+    srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
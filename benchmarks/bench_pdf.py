@@ -0,0 +1,114 @@
+"""
+Impressão de PDF: o fluxo antigo (todas as páginas rasterizadas a 203 dpi em
+RGB, reduzidas para 384 px e enviadas com 2 s de pausa entre elas) contra o
+PdfPages (página a página já na largura da impressora, em cinza, com prefetch
+enquanto a anterior é enviada). Mede o tempo até o primeiro byte, o tempo
+total na impressora simulada e o pico de memória alocada pelo Python.
+Uso: python benchmarks/bench_pdf.py [páginas]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# print_phomemo cria print_queue/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+
+from PIL import Image  # noqa: E402
+
+import print_phomemo  # noqa: E402
+from ble_transmit import BleTransmitter  # noqa: E402
+from fake_ble import FakeBleakClient  # noqa: E402
+
+fitz = print_phomemo.fitz
+PAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+LEGACY_PAGE_PAUSE = 2
+
+
+def make_pdf(path):
+    doc = fitz.open()
+    for i in range(PAGES):
+        page = doc.new_page()  # A4
+        page.insert_text((50, 80), f"Página {i + 1}", fontsize=36)
+        page.insert_textbox(fitz.Rect(50, 120, 545, 600), "Cigarros grátis e mensagens telepáticas. " * 40, fontsize=16)
+        page.draw_rect(fitz.Rect(50, 620, 545, 790), color=(0, 0, 0), fill=(0.6, 0.6, 0.6))
+    doc.save(path)
+
+
+def legacy_pages(path):
+    """Cópia do ramo .pdf antigo: tudo renderizado antes de enviar."""
+    pages = []
+    with fitz.open(path) as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=203)
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            pages.append(print_phomemo.prepare_image(img))
+    return pages
+
+
+async def fake_printer():
+    printer = print_phomemo.PhomemoPrinter("fake")
+    printer.client = FakeBleakClient(drain_rate=40000)
+    await printer.client.start_notify(print_phomemo.NOTIFY_CHARACTERISTIC_UUID, printer._notification_handler)
+    printer.transmitter = BleTransmitter(printer.client, print_phomemo.WRITE_CHARACTERISTIC_UUID, rate=40000)
+    return printer
+
+
+async def first_byte(client, start):
+    while not client.received:
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - start
+
+
+async def legacy(printer, path):
+    loop = asyncio.get_running_loop()
+    pages = await loop.run_in_executor(None, legacy_pages, path)
+    for i, (commands, _) in enumerate(pages):
+        if i:
+            await asyncio.sleep(LEGACY_PAGE_PAUSE)
+        await printer.transmitter.send(commands)
+    return True
+
+
+async def streaming(printer, path):
+    return await printer.print_pages(print_phomemo.open_pdf(path).start())
+
+
+async def run(mode, path):
+    printer = await fake_printer()
+    tracemalloc.start()
+    start = time.perf_counter()
+    probe = asyncio.create_task(first_byte(printer.client, start))
+    await mode(printer, path)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return await probe, total, peak, len(printer.client.received)
+
+
+async def main():
+    path = os.path.abspath("bench.pdf")
+    make_pdf(path)
+    results = []
+    for label, mode in (("antigo", legacy), ("streaming", streaming)):
+        # Saída das etapas fica de fora; só o resumo interessa
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            results.append((label, await run(mode, path)))
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    print(f"PDF de {PAGES} páginas A4, impressora simulada a 40 KB/s")
+    for label, (ttfb, total, peak, sent) in results:
+        print(f"{label:>10}: primeiro byte {ttfb * 1000:6.0f} ms | total {total:5.2f} s | "
+              f"pico de memória {peak / 1024 / 1024:5.1f} MB | {sent / 1024:.0f} KB enviados")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+"""
+Decodificação das fotos na bridge: o caminho original (foto inteira em RGBA,
+crop 9:16, LANCZOS para 384 px) contra bridge.decode_for_print (draft do JPEG
+na menor escala DCT que ainda cobre 384 px e crop antes da conversão).
+Cada caminho roda num processo filho para medir o pico de memória residente
+(os buffers do Pillow não aparecem no tracemalloc). Também compara as duas
+imagens de 384 px e a densidade de tinta das impressões 1-bit finais, para
+conferir que o resultado é visualmente o mesmo.
+Uso: python benchmarks/bench_photo_decode.py [repetições]
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+# bridge/print_phomemo criam pastas no diretório atual; os PNGs são lidos de png/
+if "--child" not in sys.argv:
+    os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+    os.symlink(os.path.join(ROOT, "png"), "png")
+
+import bridge  # noqa: E402
+import print_phomemo  # noqa: E402
+import tracing  # noqa: E402
+
+REPEAT = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 5
+SAMPLES = [
+    ("celular 12MP", (3024, 4032), "JPEG"),
+    ("celular 12MP paisagem", (4032, 3024), "JPEG"),
+    ("câmera web 1080p", (1080, 1920), "JPEG"),
+    ("PNG 1080p", (1080, 1920), "PNG"),
+]
+
+
+def photo(width, height, seed):
+    """Degradê + ruído: detalhe fino em toda a foto, o pior caso para a redução por DCT."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = 128 + 60 * np.sin(x / width * 6.0) * np.cos(y / height * 4.0)
+    gray = np.clip(base + rng.normal(0, 12, (height, width)), 0, 255)
+    rgb = np.stack([gray, np.clip(gray * 0.9 + 10, 0, 255), np.clip(gray * 1.1 - 10, 0, 255)], axis=-1)
+    return Image.fromarray(rgb.astype(np.uint8), "RGB")
+
+
+def legacy_decode(src, width=bridge.PRINT_WIDTH):
+    """Cópia das etapas 1 e 2 originais do render_photo (referência)."""
+    img = src.convert("RGBA")
+    img = bridge.crop_to_9_16(img)
+    w_orig, h_orig = img.size
+    new_h = int(h_orig * (width / w_orig))
+    return img.resize((width, new_h), Image.Resampling.LANCZOS)
+
+
+PATHS = {"original": legacy_decode, "draft": bridge.decode_for_print}
+
+
+def peak_memory():
+    """Pico de memória residente do processo, em bytes. No Linux lê o VmHWM: o ru_maxrss de um filho começa no pico do pai."""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return tracing.peak_rss()
+
+
+def child(path_name, file_path, repeat):
+    """No processo filho: roda um caminho repeat vezes e imprime 'ms pico_MB'."""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    fn = PATHS[path_name]
+    baseline = peak_memory()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(Image.open(io.BytesIO(data)))
+        times.append(time.perf_counter() - start)
+    print(f"{sorted(times)[len(times) // 2] * 1000:.2f} {(peak_memory() - baseline) / 1024 / 1024:.1f}")
+
+
+def measure(path_name, file_path, repeat):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", path_name, file_path, str(repeat)],
+                         capture_output=True, text=True, check=True, cwd=os.getcwd())
+    ms, peak = out.stdout.split()[-2:]
+    return float(ms), float(peak)
+
+
+def compare(data):
+    """Diferença entre os dois caminhos: imagem de 384 px (média/máx, PSNR) e densidade de tinta na impressão 1-bit."""
+    old = np.asarray(legacy_decode(Image.open(io.BytesIO(data))).convert("RGB"), dtype=np.float64)
+    new = np.asarray(bridge.decode_for_print(Image.open(io.BytesIO(data))).convert("RGB"), dtype=np.float64)
+    diff = np.abs(old - new)
+    mse = float((diff ** 2).mean())
+    psnr = 10 * np.log10(255 ** 2 / mse) if mse else float("inf")
+
+    def printed(img):
+        return np.asarray(print_phomemo.process_image(bridge._composite(img, [])))
+
+    # Pontos isolados do halftone mudam com qualquer ruído; o que se vê no papel é a
+    # densidade de tinta, então compara a média em blocos de 8x8 das duas impressões
+    old_print = printed(legacy_decode(Image.open(io.BytesIO(data))))
+    new_print = printed(bridge.decode_for_print(Image.open(io.BytesIO(data))))
+    h, w = (old_print.shape[0] // 8) * 8, (old_print.shape[1] // 8) * 8
+
+    def density(printed_img):
+        return (printed_img[:h, :w] == 0).reshape(h // 8, 8, w // 8, 8).mean(axis=(1, 3))
+
+    return diff.mean(), diff.max(), psnr, float(np.abs(density(old_print) - density(new_print)).mean())
+
+
+def main():
+    folder = tempfile.mkdtemp(prefix="barzar-photos-")
+    print(f"{'amostra':<22} {'caminho':<9} {'ms/foto':>8} {'pico MB':>8}")
+    rows = []
+    for name, size, fmt in SAMPLES:
+        buf = io.BytesIO()
+        photo(*size, seed=len(rows)).save(buf, format=fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+        data = buf.getvalue()
+        file_path = os.path.join(folder, f"{len(rows)}.{fmt.lower()}")
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+        results = {}
+        for path_name in PATHS:
+            results[path_name] = measure(path_name, file_path, REPEAT)
+            ms, peak = results[path_name]
+            print(f"{name:<22} {path_name:<9} {ms:8.1f} {peak:8.1f}")
+
+        # Saída das etapas fica de fora; só o resumo interessa
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            rows.append((name, results, compare(data)))
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    print(f"\n{'amostra':<22} {'tempo':>6} {'memória':>8} {'dif. média':>10} {'dif. máx':>8} {'PSNR dB':>8} {'tinta':>7}")
+    for name, results, (mean, worst, psnr, flipped) in rows:
+        (old_ms, old_peak), (new_ms, new_peak) = results["original"], results["draft"]
+        print(f"{name:<22} {old_ms / new_ms:5.1f}x {old_peak / max(new_peak, 0.1):7.1f}x {mean:10.2f} {worst:8.0f} "
+              f"{psnr:8.1f} {flipped:7.2%}")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        args = sys.argv[sys.argv.index("--child") + 1:]
+        child(args[0], args[1], int(args[2]))
+    else:
+        main()
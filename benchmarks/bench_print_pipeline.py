@@ -0,0 +1,112 @@
+"""
+Fila de impressão com o FakeBleakClient: renderizar e enviar um job de cada
+vez dentro do loop (como antes) contra o PrintPipeline (renderização no
+executor enquanto o job anterior é transmitido). Mede o tempo total e o maior
+atraso do event loop (que segura as notificações BLE).
+Uso: python benchmarks/bench_print_pipeline.py [jobs]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# print_phomemo cria print_queue/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+os.symlink(os.path.join(ROOT, "png"), "png")
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import print_phomemo  # noqa: E402
+from ble_transmit import BleTransmitter  # noqa: E402
+from fake_ble import FakeBleakClient  # noqa: E402
+
+JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+
+# Sem servidor: o status "Pronto" só é anotado
+print_phomemo.update_remote_status = lambda filename, status, trace=None: None
+
+
+def make_jobs():
+    rng = np.random.default_rng(0)
+    for i in range(JOBS):
+        # Foto em resolução de celular: o resize + dithering é o trabalho pesado da renderização
+        gray = rng.integers(0, 256, (875, 500), dtype=np.uint8)
+        img = Image.fromarray(gray).resize((2000, 3500))
+        img.save(os.path.join(print_phomemo.WATCH_DIR, f"{i:03d}_foto.jpg"), quality=90)
+
+
+async def fake_printer():
+    printer = print_phomemo.PhomemoPrinter("fake")
+    printer.client = FakeBleakClient(drain_rate=12000, buffer_size=4096)
+    await printer.client.start_notify(print_phomemo.NOTIFY_CHARACTERISTIC_UUID, printer._notification_handler)
+    printer.transmitter = BleTransmitter(printer.client, print_phomemo.WRITE_CHARACTERISTIC_UUID, rate=12000)
+    return printer
+
+
+async def watch_lag(stop):
+    """Maior atraso de um timer de 10 ms: quanto tempo o loop ficou bloqueado."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - start - 0.01)
+    return worst
+
+
+def queued():
+    return sorted(f for f in os.listdir(print_phomemo.WATCH_DIR) if f.endswith(".jpg"))
+
+
+async def sequential(printer):
+    for name in queued():
+        path = os.path.join(print_phomemo.WATCH_DIR, name)
+        pages = print_phomemo.render_file(path)
+        if await printer.print_pages(pages):
+            os.remove(path)
+
+
+async def pipelined(printer):
+    pipeline = print_phomemo.PrintPipeline(printer).start()
+    for name in queued():
+        pipeline.submit(name)
+    while queued():
+        await asyncio.sleep(0.05)
+    await pipeline.stop()
+
+
+async def run(label, mode):
+    make_jobs()
+    printer = await fake_printer()
+    stop = asyncio.Event()
+    lag = asyncio.create_task(watch_lag(stop))
+    start = time.perf_counter()
+    await mode(printer)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return label, elapsed, await lag, printer.client
+
+
+async def main():
+    results = []
+    for label, mode in (("sequencial", sequential), ("pipeline", pipelined)):
+        # Saída das etapas fica de fora; só o resumo interessa
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            results.append(await run(label, mode))
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    print(f"{JOBS} fotos 2000x3500, impressora simulada a 12 KB/s com buffer de 4 KB")
+    for label, elapsed, lag, client in results:
+        print(f"{label:>11}: {elapsed:5.2f} s no total ({elapsed / JOBS:.2f} s/job), "
+              f"maior bloqueio do loop {lag * 1000:5.0f} ms, {client.dropped} bytes perdidos")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
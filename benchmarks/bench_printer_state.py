@@ -0,0 +1,81 @@
+"""
+Custo do status antes de cada job: sondar a impressora a cada página (como
+antes) contra o PrinterState mantido pelo StateTracker, com o FakeBleakClient
+respondendo em 150 ms ou calado. Mede o tempo gasto esperando o status por
+job e mostra as métricas de sondagem.
+Uso: python benchmarks/bench_printer_state.py [jobs]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# print_phomemo cria print_queue/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+
+from PIL import Image  # noqa: E402
+
+import print_phomemo  # noqa: E402
+from ble_transmit import BleTransmitter  # noqa: E402
+from fake_ble import FakeBleakClient  # noqa: E402
+from printer_state import StateTracker  # noqa: E402
+
+JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+# Intervalo entre jobs (s): a impressora fica parada entre um e outro
+JOB_GAP = 1.0
+
+
+async def run(silent, tracked):
+    printer = print_phomemo.PhomemoPrinter("fake")
+    printer.client = FakeBleakClient(drain_rate=200000, status_delay=0.15, silent=silent)
+    await printer.client.start_notify(print_phomemo.NOTIFY_CHARACTERISTIC_UUID, printer._notification_handler)
+    printer.transmitter = BleTransmitter(printer.client, print_phomemo.WRITE_CHARACTERISTIC_UUID)
+    if tracked:
+        tracker = StateTracker(printer).start()
+    else:
+        # Comportamento antigo: toda página sonda a impressora
+        printer.check_status = printer.probe_status
+
+    waits = []
+    original = printer.check_status
+
+    async def timed_status():
+        start = time.perf_counter()
+        result = await original()
+        waits.append(time.perf_counter() - start)
+        return result
+
+    printer.check_status = timed_status
+    page = print_phomemo.prepare_image(Image.new("RGB", (384, 120), "white"))
+    for _ in range(JOBS):
+        await asyncio.sleep(JOB_GAP)
+        await printer.print_pages([page])
+    if tracked:
+        await tracker.stop()
+    return waits, printer.state.stats()
+
+
+async def main():
+    print(f"{JOBS} jobs, um a cada {JOB_GAP:.0f} s")
+    for silent in (False, True):
+        for tracked in (False, True):
+            # Saída das etapas fica de fora; só o resumo interessa
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                waits, stats = await run(silent, tracked)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            label = f"{'calada' if silent else 'responde'} / {'tracker' if tracked else 'antes'}"
+            print(f"{label:>20}: status {sum(waits) / len(waits) * 1000:7.1f} ms/job (máx {max(waits) * 1000:7.1f} ms) | "
+                  f"sondagens {stats['probes']}, sem resposta {stats['probe_timeouts']}, "
+                  f"p50 {stats['probe_p50_ms']} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Cache de render: uma sequência de mensagens de texto com repetições (como num
+evento, onde as mesmas frases e testes voltam várias vezes) renderizada do
+zero a cada job contra print_phomemo.render_file com o RenderCache.
+Mostra a taxa de acerto, o tempo por job e confere que os bytes ESC/POS são
+os mesmos. Por fim, reimprime um job pelo ID.
+Uso: python benchmarks/bench_render_cache.py [jobs]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+# print_phomemo cria print_queue/ no diretório atual; os PNGs são lidos de png/
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+os.symlink(os.path.join(ROOT, "png"), "png")
+
+import print_phomemo  # noqa: E402
+
+JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+
+POPULAR = ["free cigarettes", "\U0001F6AC\U0001F6AC\U0001F6AC", "teste", "oi", "alguém viu meu isqueiro?"]
+WORDS = "que noite boa demais telepatia fumaça bar zona cigarro saudade amanhã beijo".split()
+
+
+def messages():
+    """Metade dos jobs repete uma das frases populares, o resto é mensagem nova."""
+    rng = random.Random(0)
+    for _ in range(JOBS):
+        if rng.random() < 0.5:
+            yield rng.choice(POPULAR)
+        else:
+            yield " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+
+
+def write_jobs():
+    paths = []
+    for i, text in enumerate(messages()):
+        path = os.path.join(print_phomemo.WATCH_DIR, f"{i:04d}_msg.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+
+def timed(fn, paths):
+    start = time.perf_counter()
+    results = [fn(p) for p in paths]
+    return (time.perf_counter() - start) / len(paths) * 1000, results
+
+
+def main():
+    paths = write_jobs()
+    print_phomemo.warm_up(print_phomemo.PRINTER_WIDTH)
+
+    # Saída das etapas fica de fora; só o resumo interessa
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        uncached_ms, uncached = timed(print_phomemo.render_uncached, paths)
+        cached_ms, cached = timed(print_phomemo.render_file, paths)
+        reprint = os.path.join(print_phomemo.WATCH_DIR, "9999_0001_msg.txt.reprint")
+        with open(reprint, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(paths[1]))
+        reprinted = print_phomemo.render_file(reprint)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    same = all(a == b for a, b in zip(uncached, cached))
+    stats = print_phomemo.render_cache.stats()
+    print(f"{JOBS} mensagens, {len(set(open(p, encoding='utf-8').read() for p in paths))} diferentes")
+    print(f"sem cache: {uncached_ms:6.2f} ms/job")
+    print(f"com cache: {cached_ms:6.2f} ms/job ({uncached_ms / cached_ms:.1f}x), "
+          f"acertos {stats['hits']}/{stats['hits'] + stats['misses']} ({stats['hit_rate']:.0%}), "
+          f"{stats['entries']} renders, {stats['bytes'] / 1024:.0f} KB")
+    print(f"mesmos bytes ESC/POS: {'sim' if same else 'NÃO'} | "
+          f"reimpressão pelo ID: {'ok' if reprinted == uncached[1] else 'FALHOU'}")
+    if not same or reprinted != uncached[1]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
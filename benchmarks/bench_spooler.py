@@ -0,0 +1,144 @@
+"""
+Escalonamento da fila de impressão numa noite simulada (relógio falso, sem
+impressora): ordem de nome de arquivo (como antes) contra o PrintSpooler
+(menor custo estimado primeiro, com envelhecimento). Mostra a espera média e
+a pior espera por fila. Depois confere backoff, dead letter e a recuperação
+do journal.
+Uso: python benchmarks/bench_spooler.py [jobs]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+import print_spooler  # noqa: E402
+from print_spooler import PrintSpooler  # noqa: E402
+
+JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+# Tempo de impressão (s) de cada tipo e fração dos jobs
+MIX = [(".txt", 1.5, 0.6), (".jpg", 5.0, 0.3), ("raw_.jpg", 5.0, 0.05), (".pdf", 15.0, 0.05)]
+# Chegada média de um job a cada ARRIVAL_GAP s (a impressora fica ~90% ocupada)
+ARRIVAL_GAP = 3.8
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def arrivals():
+    rng = random.Random(0)
+    t = 0.0
+    jobs = []
+    for i in range(JOBS):
+        t += rng.expovariate(1 / ARRIVAL_GAP)
+        suffix, service, _ = rng.choices(MIX, weights=[m[2] for m in MIX])[0]
+        name = f"{int(t):06d}_{i:04d}_{suffix}" if suffix.startswith("raw_") else f"{int(t):06d}_{i:04d}{suffix}"
+        jobs.append((t, name, service * rng.uniform(0.8, 1.2)))
+    return jobs
+
+
+def simulate(jobs, pick):
+    """Uma impressora: a cada job terminado, pick(fila, agora) escolhe o próximo."""
+    waits = {}
+    queue = []
+    now = 0.0
+    pending = list(jobs)
+    while pending or queue:
+        while pending and pending[0][0] <= now:
+            queue.append(pending.pop(0))
+        if not queue:
+            now = pending[0][0]
+            continue
+        job = pick(queue, now)
+        queue.remove(job)
+        arrived, name, service = job
+        waits[name] = now - arrived
+        now += service
+    return waits
+
+
+def filename_order(queue, now):
+    return min(queue, key=lambda j: j[1])
+
+
+def spooler_order():
+    clock = Clock()
+    spooler = PrintSpooler(journal=None, clock=clock)
+    by_name = {}
+    last = {}
+
+    def pick(queue, now):
+        if last:
+            spooler.complete(last["job"], now - last["start"])
+        clock.now = now
+        for job in queue:
+            if job[1] not in by_name:
+                by_name[job[1]] = job
+                clock.now = job[0]
+                spooler.add(job[1])
+        clock.now = now
+        picked, _ = spooler.pick()
+        last.update(job=picked, start=now)
+        return by_name[picked.name]
+
+    return pick
+
+
+def lane_report(label, waits):
+    lanes = {}
+    for name, wait in waits.items():
+        lanes.setdefault(print_spooler.job_lane(name), []).append(wait)
+    parts = " | ".join(f"{lane} {statistics.mean(w):5.0f}/{max(w):4.0f}" for lane, w in sorted(lanes.items()))
+    print(f"{label:>14}: espera média {statistics.mean(waits.values()):6.1f} s | por fila (média/pior s): {parts}")
+
+
+def check_retries():
+    folder = tempfile.mkdtemp(prefix="barzar-spool-")
+    journal = os.path.join(folder, ".spool.journal")
+    for name in ("1_foto.jpg", "2_msg.txt"):
+        open(os.path.join(folder, name), "w").close()
+    clock = Clock()
+    spooler = PrintSpooler(journal=journal, max_attempts=3, clock=clock)
+    spooler.add("1_foto.jpg")
+    spooler.add("2_msg.txt")
+    text, _ = spooler.pick()
+    spooler.complete(text)
+    photo, _ = spooler.pick()
+    delays = []
+    spooler.fail(photo, "render")
+    delays.append(photo.not_before - clock.now)
+    clock.now = photo.not_before
+    spooler.pick()
+    spooler.fail(photo, "render")
+    delays.append(photo.not_before - clock.now)
+
+    # Restart: o journal traz de volta as tentativas e o backoff
+    restored = PrintSpooler(journal=journal, max_attempts=3, clock=clock)
+    job = restored._jobs["1_foto.jpg"]
+    attempts = job.attempts
+    clock.now = job.not_before
+    again, _ = restored.pick()
+    dead = restored.fail(again, "render")
+    print(f"texto antes da foto: {'sim' if text.name == '2_msg.txt' else 'NÃO'} | backoff {delays} s | "
+          f"após restart: {attempts} tentativas, {len(restored)} na fila -> "
+          f"{'dead letter' if dead else 'ainda na fila'} na 3ª falha")
+
+
+def main():
+    jobs = arrivals()
+    print(f"{JOBS} jobs (60% texto, 30% foto, 5% raw, 5% PDF), impressora ~90% ocupada")
+    lane_report("ordem do nome", simulate(jobs, filename_order))
+    lane_report("spooler", simulate(jobs, spooler_order()))
+    check_retries()
+
+
+if __name__ == "__main__":
+    main()
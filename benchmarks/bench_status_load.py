@@ -0,0 +1,108 @@
+"""
+Compara a carga no servidor com N convidados acompanhando o status do job:
+polling de /status/<filename> a cada 2s (como o app fazia) contra o stream
+/status/<filename>/stream. Um driver percorre os status até "Pronto".
+Uso: python benchmarks/bench_status_load.py [convidados]
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+PORT = 5078
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+# O servidor cria uploads/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+
+import requests  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import server  # noqa: E402
+
+GUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+POLL_INTERVAL = 2.0
+STEPS = ["Conteúdo telepaticamente enviado", "Processando imagem...", "Aguardando impressora...", "Imprimindo...", "Pronto"]
+STEP_DELAY = 1.5
+
+
+class RequestCounter:
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.count += 1
+
+
+def drive(filenames):
+    """Faz o papel da bridge/impressora: avança o status de todos os jobs."""
+    changed_at = {}
+    for step in STEPS:
+        time.sleep(STEP_DELAY)
+        changed_at[step] = time.perf_counter()
+        for filename in filenames:
+            server.set_status(filename, step)
+    return changed_at
+
+
+def poll_guest(filename, seen, counter):
+    while True:
+        counter()
+        status = requests.get(f"{BASE_URL}/status/{filename}/").json()["status"]
+        seen.setdefault(status, time.perf_counter())
+        if server.is_final_status(status):
+            return
+        time.sleep(POLL_INTERVAL)
+
+
+def stream_guest(filename, seen, counter):
+    counter()
+    with requests.get(f"{BASE_URL}/status/{filename}/stream", stream=True) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                status = json.loads(line[5:])["status"]
+                seen.setdefault(status, time.perf_counter())
+
+
+def run(mode, guest):
+    filenames = [f"{mode}_{i}.jpg" for i in range(GUESTS)]
+    for filename in filenames:
+        server.set_status(filename, "Aguardando...")
+    counter = RequestCounter()
+    seen = [{} for _ in filenames]
+    threads = [threading.Thread(target=guest, args=(f, s, counter), daemon=True) for f, s in zip(filenames, seen)]
+    for t in threads:
+        t.start()
+    changed_at = drive(filenames)
+    for t in threads:
+        t.join(timeout=POLL_INTERVAL + 5)
+
+    delays = [(s[step] - changed_at[step]) * 1000 for s in seen for step in STEPS if step in s]
+    missed = sum(step not in s for s in seen for step in STEPS)
+    print(f"{mode:>8}: {counter.count / GUESTS:.1f} requisições por convidado, "
+          f"atraso médio {sum(delays) / max(len(delays), 1):.0f} ms, "
+          f"{missed} transições não vistas")
+
+
+def main():
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server.logger.setLevel(logging.ERROR)
+    srv = make_server("127.0.0.1", PORT, server.app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    print(f"{GUESTS} convidados, {len(STEPS)} status com {STEP_DELAY}s entre eles")
+    run("polling", poll_guest)
+    run("stream", stream_guest)
+    srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Suíte de benchmarks das etapas do pipeline de impressão, com saídas de
+referência (golden) para pegar mudanças de resultado.
+
+Entradas fixas e geradas aqui (sem arquivos binários no repositório): fotos
+retrato, paisagem, escura, clara e um JPEG de celular de 12 MP, e mensagens de
+0 a 280 caracteres. Cada etapa roda REPEAT vezes e mostra p50/p95/máx e o pico
+de memória alocada pelo Python (tracemalloc; buffers internos do Pillow não
+entram). Roda no Linux: o Vision é trocado pelo StubDetector e o envio BLE
+usa o FakeBleakClient.
+
+Cada saída vira um SHA-256 exato dos pixels (imagens) ou dos bytes (ESC/POS)
+e é comparada com benchmarks/golden.json. Os hashes dependem das versões do
+Pillow/NumPy/fontes gravadas no arquivo; se elas mudarem, a suíte avisa.
+
+Uso:
+  python benchmarks/bench_suite.py                  # mede e confere o golden
+  python benchmarks/bench_suite.py --update-golden  # grava novas referências
+  python benchmarks/bench_suite.py --repeat 2 --stage escpos
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden.json")
+
+# bridge/print_phomemo criam pastas no diretório atual; os PNGs são lidos de png/
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+os.symlink(os.path.join(ROOT, "png"), "png")
+
+import numpy as np  # noqa: E402
+import PIL  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import bridge  # noqa: E402
+import print_phomemo  # noqa: E402
+from ble_transmit import BleTransmitter  # noqa: E402
+from brightness import BrightnessMap  # noqa: E402
+from face_detection import StubDetector  # noqa: E402
+from fake_ble import FakeBleakClient  # noqa: E402
+from text_layout import resolve_font_path  # noqa: E402
+
+REPEAT = 5
+MESSAGE_LENGTHS = [0, 1, 20, 80, 160, 280]
+WORDS = ("free cigarettes telepatia fumaça noite bar isqueiro saudade amanhã beijo "
+         "que boa demais alguém viu meu a de o um pra com").split()
+
+# Uma face no terço de cima da foto (coordenadas do Vision: origem embaixo, normalizadas)
+STUB_FACE = {
+    "bbox": [0.35, 0.55, 0.3, 0.2],
+    "landmarks": {"outer_lips": [[0.4, 0.25], [0.5, 0.2], [0.6, 0.25]]},
+}
+
+
+def photo(width, height, seed, level=128, spread=60):
+    """Degradê + ruído + formas: um pouco de tudo o que o halftone e o contraste veem."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = level + spread * np.sin(x / width * 6.0) * np.cos(y / height * 4.0)
+    noise = rng.normal(0, 12, (height, width))
+    gray = np.clip(base + noise, 0, 255)
+    rgb = np.stack([gray, np.clip(gray * 0.9 + 10, 0, 255), np.clip(gray * 1.1 - 10, 0, 255)], axis=-1)
+    return Image.fromarray(rgb.astype(np.uint8), "RGB")
+
+
+def jpeg_bytes(img, quality=90):
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def photos():
+    """(nome, bytes do JPEG, faces do stub). O Vision roda em 384 px, então as faces valem para qualquer tamanho."""
+    return [
+        ("retrato", jpeg_bytes(photo(1080, 1920, 1)), [STUB_FACE]),
+        ("paisagem", jpeg_bytes(photo(1920, 1080, 2)), []),
+        ("escura", jpeg_bytes(photo(1080, 1920, 3, level=35, spread=25)), [STUB_FACE]),
+        ("clara", jpeg_bytes(photo(1080, 1920, 4, level=215, spread=25)), []),
+        ("celular 12MP", jpeg_bytes(photo(3024, 4032, 5), quality=85), [STUB_FACE]),
+    ]
+
+
+def messages():
+    rng = random.Random(0)
+    result = []
+    for length in MESSAGE_LENGTHS:
+        words = []
+        while len(" ".join(words)) < length:
+            words.append(rng.choice(WORDS))
+        result.append((f"{length} caracteres", " ".join(words)[:length]))
+    return result
+
+
+def digest(value):
+    h = hashlib.sha256()
+    if isinstance(value, Image.Image):
+        h.update(f"{value.mode}:{value.size}".encode())
+        h.update(value.tobytes())
+    elif isinstance(value, list):
+        h.update(b"".join(value))
+    else:
+        h.update(value)
+    return h.hexdigest()
+
+
+def measure(fn, repeat):
+    """Roda fn repeat vezes. Retorna (último resultado, latências em s, pico de memória em bytes)."""
+    times = []
+    tracemalloc.start()
+    for _ in range(repeat):
+        # Sorteios (espelhar cigarro, moldura aleatória) iguais em toda execução
+        random.seed(0)
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, times, peak
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def stage_cases(selected):
+    """(etapa, amostra, função). As entradas de cada etapa são preparadas fora da medição."""
+    cases = []
+    rendered = {}
+    for name, data, faces in photos():
+        detector = StubDetector(faces)
+        cases.append(("decode", name, lambda data=data: Image.open(io.BytesIO(data)).convert("RGB")))
+        # render_photo recebe a foto ainda não decodificada, como na bridge (o draft do JPEG entra na medida)
+        random.seed(0)
+        rendered[name] = bridge.render_photo(Image.open(io.BytesIO(data)), detector)
+        cases.append(("render_photo", name, lambda data=data, detector=detector:
+                      bridge.render_photo(Image.open(io.BytesIO(data)), detector)))
+
+        src = Image.open(io.BytesIO(data))
+        src.load()
+
+        img384 = bridge.crop_to_9_16(src.convert("RGBA"))
+        img384 = img384.resize((384, int(img384.height * 384 / img384.width)), Image.Resampling.LANCZOS)
+        brightness = BrightnessMap(img384)
+        prefers_white = bridge.is_frame_area_dark(img384, brightness)
+        cases.append(("random_overlay", name, lambda img=img384, faces=faces, w=prefers_white, b=brightness:
+                      bridge.apply_random_overlay(img.copy(), faces, force_white=w, brightness=b)))
+        cases.append(("halftone", name, lambda img=rendered[name]: bridge.apply_halftone(img)))
+
+    for name, text in messages():
+        cases.append(("text_to_image", name, lambda text=text: print_phomemo.text_to_image(text)))
+        random.seed(0)
+        rendered[name] = print_phomemo.text_to_image(text)
+
+    for name, img in rendered.items():
+        one_bit = print_phomemo.process_image(img)
+        cases.append(("escpos", name, lambda img=one_bit: print_phomemo.image_to_escpos(img)))
+
+    return [c for c in cases if not selected or c[0] in selected], rendered
+
+
+def ble_case(rendered, repeat):
+    """Envio do ESC/POS de uma foto e de uma mensagem pelo FakeBleakClient, conferindo os bytes recebidos."""
+    results = []
+    for name in ("retrato", "280 caracteres"):
+        commands = print_phomemo.image_to_escpos(print_phomemo.process_image(rendered[name]))
+        expected = b"".join(commands)
+
+        async def send():
+            client = FakeBleakClient(drain_rate=200000, buffer_size=16384)
+            transmitter = BleTransmitter(client, print_phomemo.WRITE_CHARACTERISTIC_UUID, rate=200000)
+            await transmitter.send(commands)
+            return bytes(client.received)
+
+        received, times, peak = measure(lambda: asyncio.run(send()), repeat)
+        ok = received == expected
+        results.append(("ble_send", name, received, times, peak, ok))
+    return results
+
+
+def versions():
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "font": os.path.basename(resolve_font_path() or "pillow-default"),
+    }
+
+
+def load_golden():
+    if not os.path.exists(GOLDEN_PATH):
+        return None
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--stage", action="append", default=[], help="só estas etapas (pode repetir)")
+    parser.add_argument("--update-golden", action="store_true")
+    args = parser.parse_args()
+
+    golden = load_golden()
+    if golden and golden.get("versions") != versions() and not args.update_golden:
+        print(f"Aviso: golden gravado com {golden.get('versions')}, rodando com {versions()}. "
+              "Diferenças podem ser só de versão.")
+    expected = (golden or {}).get("outputs", {})
+
+    outputs = {}
+    mismatches = []
+    rows = []
+
+    # Saída das etapas fica de fora; só o resumo interessa
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        print_phomemo.warm_up(print_phomemo.PRINTER_WIDTH)
+        cases, rendered = stage_cases(set(args.stage))
+        for stage, name, fn in cases:
+            result, times, peak = measure(fn, args.repeat)
+            rows.append((stage, name, digest(result), times, peak, None))
+        if not args.stage or "ble_send" in args.stage:
+            for stage, name, received, times, peak, ok in ble_case(rendered, args.repeat):
+                rows.append((stage, name, digest(received), times, peak, ok))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print(f"{'etapa':<15} {'amostra':<15} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8} {'pico MB':>8}  golden")
+    for stage, name, h, times, peak, ok in rows:
+        key = f"{stage}/{name}"
+        outputs[key] = h
+        if ok is False:
+            check = "BYTES DIFERENTES"
+            mismatches.append(key)
+        elif args.update_golden or key not in expected:
+            check = "novo"
+        elif expected[key] == h:
+            check = "ok"
+        else:
+            check = "DIFERENTE"
+            mismatches.append(key)
+        print(f"{stage:<15} {name:<15} {percentile(times, 0.5) * 1000:8.1f} {percentile(times, 0.95) * 1000:8.1f} "
+              f"{max(times) * 1000:8.1f} {peak / 1024 / 1024:8.1f}  {check}")
+
+    if args.update_golden:
+        merged = dict(expected)
+        merged.update(outputs)
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump({"versions": versions(), "outputs": dict(sorted(merged.items()))}, f, indent=2)
+            f.write("\n")
+        print(f"Golden gravado em {GOLDEN_PATH} ({len(merged)} saídas).")
+    elif mismatches:
+        print(f"\n{len(mismatches)} saída(s) diferente(s) do golden: {', '.join(mismatches)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
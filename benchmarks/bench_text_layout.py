@@ -0,0 +1,93 @@
+"""
+Ajuste do tamanho da fonte das mensagens: busca linear antiga (recarrega a
+fonte e mede cada prefixo) contra text_layout.fit_text (LRU de fontes, cache
+de larguras e busca binária), para vários tamanhos de mensagem.
+Confere que as linhas e o tamanho escolhido são os mesmos.
+Uso: TEXT_FONT_PATH=/caminho/fonte.ttf python benchmarks/bench_text_layout.py
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+from PIL import ImageFont  # noqa: E402
+
+import text_layout  # noqa: E402
+
+# Área de texto da moldura na largura da impressora (ver print_phomemo.text_to_image)
+MAX_WIDTH = 384 - 80
+MAX_HEIGHT = 682 - int(682 * 0.28) - int(682 * 0.20)
+LENGTHS = [10, 40, 100, 180, 280]
+REPEAT = 5
+
+WORDS = ("que noite boa demais alguém viu meu isqueiro telepatia fumaça bar zona "
+         "cigarro saudade amanhã a de o um pra com beijo").split()
+
+
+def legacy_fit(text, max_width, max_height, path):
+    """Cópia do loop antigo de text_to_image, para comparação."""
+    def get_lines_for_font(f_size):
+        font = ImageFont.truetype(path, f_size) if path else ImageFont.load_default(f_size)
+        words = text.split()
+        lines = []
+        current_line = ""
+        for word in words:
+            test_line = current_line + (" " if current_line else "") + word
+            line_width = font.getlength(test_line)
+            if line_width < max_width:
+                current_line = test_line
+            else:
+                lines.append(current_line)
+                current_line = word
+        if current_line:
+            lines.append(current_line)
+        line_height = f_size + 4
+        return lines, font, len(lines) * line_height, line_height
+
+    best_font_size = 20
+    for s in range(60, 19, -2):
+        lines, font, total_height, line_height = get_lines_for_font(s)
+        if total_height <= max_height:
+            best_font_size = s
+            break
+    return get_lines_for_font(best_font_size)
+
+
+def message(length, rng):
+    words = []
+    while len(" ".join(words)) < length:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:length]
+
+
+def timed(fn, texts):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        results = [fn(t) for t in texts]
+    return (time.perf_counter() - start) / REPEAT / len(texts) * 1000, results
+
+
+def main():
+    path = text_layout.resolve_font_path()
+    print(f"Fonte: {path or 'embutida do Pillow'}")
+    rng = random.Random(0)
+    for length in LENGTHS:
+        texts = [message(length, rng) for _ in range(10)]
+        legacy_ms, legacy = timed(lambda t: legacy_fit(t, MAX_WIDTH, MAX_HEIGHT, path), texts)
+        # Primeira mensagem com o cache frio, depois o regime normal do evento
+        text_layout.get_metrics.cache_clear()
+        cold_start = time.perf_counter()
+        text_layout.fit_text(texts[0], MAX_WIDTH, MAX_HEIGHT)
+        cold_ms = (time.perf_counter() - cold_start) * 1000
+        new_ms, new = timed(lambda t: text_layout.fit_text(t, MAX_WIDTH, MAX_HEIGHT), texts)
+        same = all(a[0] == b[0] and a[1].size == b[1].size for a, b in zip(legacy, new))
+        print(f"{length:4d} caracteres: antigo {legacy_ms:7.2f} ms | novo {new_ms:6.2f} ms "
+              f"(cache frio {cold_ms:6.2f} ms) | {legacy_ms / new_ms:5.1f}x | "
+              f"mesmas linhas e fonte: {'sim' if same else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main()
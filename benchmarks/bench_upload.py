@@ -0,0 +1,99 @@
+"""
+Uploads concorrentes de JPEGs de celular (1–3 MB) num servidor local, com o
+spool em memória e com tudo indo para o disco (UPLOAD_SPOOL_BYTES=0),
+seguidos do download pela "bridge".
+Uso: python benchmarks/bench_upload.py [uploads] [clientes]
+"""
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+PORT = 5079
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+# O servidor cria uploads/ no diretório atual
+os.chdir(tempfile.mkdtemp(prefix="barzar-bench-"))
+
+import requests  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import server  # noqa: E402
+
+UPLOADS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+
+def make_photos():
+    rng = random.Random(0)
+    # O servidor não decodifica a imagem: bytes aleatórios com cabeçalho JPEG bastam
+    return [b"\xff\xd8\xff\xe0" + rng.randbytes(rng.randint(1, 3) * 1024 * 1024) for _ in range(UPLOADS)]
+
+
+def upload(session, i, photo):
+    start = time.perf_counter()
+    response = session.post(f"{BASE_URL}/upload/", files={"file": (f"foto{i}.jpg", photo, "image/jpeg")})
+    response.raise_for_status()
+    return response.json()["filename"], time.perf_counter() - start
+
+
+def run(label, photos):
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        results = list(pool.map(lambda args: upload(session(), *args), enumerate(photos)))
+    elapsed = time.perf_counter() - start
+
+    download_start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        sizes = list(pool.map(lambda r: len(session().get(f"{BASE_URL}/download/{r[0]}").content), results))
+    ok = sum(size == len(photo) for size, photo in zip(sizes, photos))
+    download = time.perf_counter() - download_start
+
+    on_disk = len([n for n in os.listdir(server.UPLOAD_FOLDER) if not n.endswith(".txt")])
+    latencies = sorted(r[1] * 1000 for r in results)
+    total_mb = sum(len(p) for p in photos) / 1024 / 1024
+    print(f"{label:>8}: {total_mb / elapsed:6.1f} MB/s de upload, p50 {statistics.median(latencies):.0f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.0f} ms | download {total_mb / download:6.1f} MB/s "
+          f"({ok}/{len(results)}) | {on_disk} em disco, {server.upload_spool.memory_used / 1024 / 1024:.0f} MB na memória")
+
+    for filename, _ in results:
+        server.upload_spool.discard(filename)
+        server.job_store.mark_processed(filename)
+
+
+def main():
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server.logger.setLevel(logging.ERROR)
+    srv = make_server("127.0.0.1", PORT, server.app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    photos = make_photos()
+    print(f"{UPLOADS} fotos de 1–3 MB, {CLIENTS} clientes simultâneos")
+    # Aquecimento (threads do servidor, conexões, page cache) fora da medição
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        run("aquecer", photos[:CLIENTS])
+        sys.stdout = stdout
+    run("spool", photos)
+    server.upload_spool.memory_budget = 0
+    run("disco", photos)
+    srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Latência entre o rename de um arquivo na print_queue e o monitor da impressora
+enxergá-lo: o loop antigo (sleep de 1 s + listdir) contra os watchers de
+folder_watch (inotify/kqueue e polling do mtime da pasta). Também conta
+quantas vezes a pasta foi listada, incluindo alguns segundos sem jobs.
+Uso: python benchmarks/bench_watch_latency.py [arquivos]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+import folder_watch  # noqa: E402
+
+FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+HEARTBEAT_INTERVAL = 1
+# Tempo parado depois do último arquivo (o loop antigo continua listando a pasta)
+IDLE_SECONDS = 5
+
+
+class LegacyLoop:
+    """O monitor_folder antigo: dorme 1 s e lista a pasta de novo, sempre."""
+
+    name = "antigo (1 s)"
+
+    async def wait(self, timeout):
+        await asyncio.sleep(timeout)
+        return True
+
+    def close(self):
+        pass
+
+
+async def writer(folder, written):
+    rng = random.Random(0)
+    for i in range(FILES):
+        await asyncio.sleep(rng.uniform(0.05, 0.6))
+        name = f"{i:04d}_job.png"
+        folder_watch.atomic_write(os.path.join(folder, name), os.urandom(20000))
+        written[name] = time.perf_counter()
+
+
+async def run(make_watcher):
+    folder = tempfile.mkdtemp(prefix="barzar-watch-")
+    watcher = make_watcher(folder)
+    written, seen = {}, {}
+    scans = 0
+    task = asyncio.create_task(writer(folder, written))
+    rescan = True
+    idle_until = None
+    while idle_until is None or time.perf_counter() < idle_until:
+        if len(seen) == FILES and idle_until is None:
+            idle_until = time.perf_counter() + IDLE_SECONDS
+        if rescan:
+            scans += 1
+            now = time.perf_counter()
+            for name in folder_watch.list_files(folder):
+                seen.setdefault(name, now)
+        rescan = await watcher.wait(HEARTBEAT_INTERVAL)
+    await task
+    watcher.close()
+    latencies = sorted((seen[n] - written[n]) * 1000 for n in written)
+    return watcher.name, latencies, scans
+
+
+async def main():
+    candidates = [lambda folder: LegacyLoop(),
+                  lambda folder: folder_watch.create_watcher(folder),
+                  lambda folder: folder_watch.create_watcher(folder, "polling")]
+    print(f"{FILES} arquivos gravados com temp+rename em intervalos de 50–600 ms, depois {IDLE_SECONDS} s parado")
+    for make_watcher in candidates:
+        name, latencies, scans = await run(make_watcher)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{name:>13}: mediana {statistics.median(latencies):7.1f} ms | p95 {p95:7.1f} ms | "
+              f"máx {latencies[-1]:7.1f} ms | {scans} listagens da pasta")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
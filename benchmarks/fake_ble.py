@@ -0,0 +1,98 @@
+"""
+BleakClient de mentira para medir o envio à impressora sem Bluetooth.
+Simula o link (packets_per_event pacotes a cada conn_interval, com a fila do
+sistema segurando até um evento de conexão), o buffer da impressora esvaziando
+a drain_rate bytes/s e escritas com resposta que a impressora só confirma
+quando o buffer está abaixo de ack_high_water. O que chega com o buffer cheio
+é perdido e contado em `dropped`. Pedidos de status (0xAB 00) são respondidos
+com uma notificação de "pronta, com papel" depois de status_delay segundos, ou
+ignorados (como numa impressora calada) com silent=True.
+"""
+import asyncio
+import math
+import time
+
+
+class FakeCharacteristic:
+    def __init__(self, uuid, max_write_without_response_size):
+        self.uuid = uuid
+        self.properties = ["write-without-response", "write", "notify"]
+        self.max_write_without_response_size = max_write_without_response_size
+
+
+class FakeServices:
+    def __init__(self, mtu):
+        self.mtu = mtu
+
+    def get_characteristic(self, uuid):
+        return FakeCharacteristic(uuid, self.mtu - 3)
+
+
+STATUS_REQUEST = b"\xab\x00"
+STATUS_REQUEST_GS = b"\x1d\x67\x6e"
+STATUS_READY = bytes([0x1a, 0x06, 0x90])
+
+
+class FakeBleakClient:
+    def __init__(self, mtu=185, drain_rate=16000, buffer_size=8192, packets_per_event=4, conn_interval=0.0075,
+                 ack_high_water=0.5, status_delay=None, silent=False):
+        self.mtu_size = mtu
+        self.services = FakeServices(mtu)
+        self.drain_rate = drain_rate
+        self.buffer_size = buffer_size
+        self.packets_per_event = packets_per_event
+        self.conn_interval = conn_interval
+        self.ack_high_water = ack_high_water
+        self.status_delay = conn_interval * 2 if status_delay is None else status_delay
+        self.silent = silent
+        self.status_requests = 0
+        self.is_connected = True
+        self.received = bytearray()
+        self.dropped = 0
+        self.writes = 0
+        self._buffered = 0.0
+        self._last = time.monotonic()
+        self._link_free = self._last
+        self._notify = None
+
+    async def start_notify(self, uuid, callback):
+        self._notify = callback
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    def _drain(self):
+        now = time.monotonic()
+        self._buffered = max(0.0, self._buffered - (now - self._last) * self.drain_rate)
+        self._last = now
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        if data in (STATUS_REQUEST, STATUS_REQUEST_GS):
+            self.status_requests += 1
+            if self._notify and not self.silent and data == STATUS_REQUEST:
+                asyncio.get_running_loop().call_later(self.status_delay, self._notify, uuid, bytearray(STATUS_READY))
+            return
+        self.writes += 1
+        packets = math.ceil(len(data) / (self.mtu_size - 3))
+        now = time.monotonic()
+        self._link_free = max(self._link_free, now) + packets * self.conn_interval / self.packets_per_event
+        # A fila do sistema absorve até um evento de conexão; além disso a escrita espera
+        await asyncio.sleep(max(0.0, self._link_free - now - self.conn_interval))
+        self._drain()
+        if response:
+            while self._buffered + len(data) > self.buffer_size * self.ack_high_water:
+                await asyncio.sleep(self.conn_interval)
+                self._drain()
+        room = max(0, int(self.buffer_size - self._buffered))
+        accepted = data[:room]
+        self.dropped += len(data) - len(accepted)
+        self.received += accepted
+        self._buffered += len(accepted)
+
+    async def wait_drained(self):
+        """Espera a impressora terminar o que está no buffer."""
+        while True:
+            self._drain()
+            if self._buffered <= 0:
+                return
+            await asyncio.sleep(self._buffered / self.drain_rate)
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+
+# Taxa de envio para a impressora (bytes/s): inicial e limites da adaptação
+BLE_RATE = float(os.getenv("BLE_RATE", "20000"))
+BLE_MIN_RATE = float(os.getenv("BLE_MIN_RATE", "4000"))
+BLE_MAX_RATE = float(os.getenv("BLE_MAX_RATE", "80000"))
+
+# A cada quantos bytes uma escrita com resposta serve de checkpoint da vazão
+BLE_CHECKPOINT_BYTES = int(os.getenv("BLE_CHECKPOINT_BYTES", "2048"))
+# Checkpoint mais lento que SLOW_ACK_FACTOR x o melhor já visto (e que BLE_SLOW_ACK
+# segundos) indica que a impressora está segurando a resposta: buffer enchendo
+BLE_SLOW_ACK = float(os.getenv("BLE_SLOW_ACK", "0.03"))
+SLOW_ACK_FACTOR = 3
+
+# ATT_MTU mínimo do BLE (23) menos os 3 bytes de cabeçalho; teto do ATT
+DEFAULT_PACKET_SIZE = 20
+MAX_PACKET_SIZE = 512
+# Quantos pacotes podem sair de uma vez depois de uma pausa
+BURST_PACKETS = 4
+
+RATE_INCREASE = 1.25
+RATE_DECREASE = 0.5
+
+
+class TokenBucket:
+    """Limita a vazão em bytes/s, permitindo rajadas de até capacity bytes."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def consume(self, n):
+        self._refill()
+        if self.tokens < n:
+            await asyncio.sleep((n - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= n
+
+
+def _characteristic(client, char_uuid):
+    try:
+        return client.services.get_characteristic(char_uuid)
+    except Exception:
+        return None
+
+
+def packet_size(client, char_uuid):
+    """Maior escrita sem resposta aceita pela conexão (MTU negociado - 3)."""
+    char = _characteristic(client, char_uuid)
+    size = getattr(char, "max_write_without_response_size", 0) or 0
+    if not size:
+        try:
+            size = (client.mtu_size or 0) - 3
+        except Exception:
+            size = 0
+    return max(DEFAULT_PACKET_SIZE, min(size, MAX_PACKET_SIZE))
+
+
+class BleTransmitter:
+    """
+    Envia o fluxo ESC/POS em pacotes do tamanho do MTU, no ritmo de um token
+    bucket. A taxa se adapta ao que a impressora aguenta (AIMD): sobe um pouco
+    a cada checkpoint (escrita com resposta) confirmado rápido e cai pela
+    metade quando o checkpoint demora ou a impressora avisa que não está pronta.
+    """
+
+    def __init__(self, client, char_uuid, rate=BLE_RATE, min_rate=BLE_MIN_RATE, max_rate=BLE_MAX_RATE,
+                 checkpoint_bytes=BLE_CHECKPOINT_BYTES, slow_ack=BLE_SLOW_ACK):
+        self.client = client
+        self.char_uuid = char_uuid
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.checkpoint_bytes = checkpoint_bytes
+        self.slow_ack = slow_ack
+        self.packet_size = packet_size(client, char_uuid)
+        self.bucket = TokenBucket(min(max(rate, min_rate), max_rate), self.packet_size * BURST_PACKETS)
+
+        char = _characteristic(client, char_uuid)
+        self.can_checkpoint = char is not None and "write" in getattr(char, "properties", [])
+
+        # Métricas acumuladas
+        self.bytes_sent = 0
+        self.busy_time = 0.0
+        self.last_bytes_per_sec = 0.0
+        self.checkpoints = 0
+        self.slowdowns = 0
+        self.best_ack = None
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    @property
+    def bytes_per_sec(self):
+        return self.bytes_sent / self.busy_time if self.busy_time else 0.0
+
+    def _speed_up(self):
+        self.bucket.rate = min(self.max_rate, self.bucket.rate * RATE_INCREASE)
+
+    def _slow_down(self):
+        self.bucket.rate = max(self.min_rate, self.bucket.rate * RATE_DECREASE)
+        self.slowdowns += 1
+
+    def _checkpoint(self, ack):
+        self.checkpoints += 1
+        if self.best_ack is None or ack < self.best_ack:
+            self.best_ack = ack
+        if ack > max(self.slow_ack, self.best_ack * SLOW_ACK_FACTOR):
+            self._slow_down()
+        else:
+            self._speed_up()
+
+    def feedback(self, ready):
+        """Status vindo das notificações da impressora durante o envio."""
+        if not ready:
+            self._slow_down()
+
+    async def send(self, commands, progress=None):
+        """
+        Envia a lista de comandos como um fluxo contínuo (a impressora não se
+        importa onde os pacotes quebram). Retorna os bytes/s deste envio.
+        """
+        data = b"".join(commands)
+        total = len(data)
+        start = time.monotonic()
+        since_checkpoint = 0
+
+        for offset in range(0, total, self.packet_size):
+            packet = data[offset:offset + self.packet_size]
+            await self.bucket.consume(len(packet))
+
+            if self.can_checkpoint and since_checkpoint >= self.checkpoint_bytes:
+                sent_at = time.monotonic()
+                await self.client.write_gatt_char(self.char_uuid, packet, response=True)
+                self._checkpoint(time.monotonic() - sent_at)
+                since_checkpoint = 0
+            else:
+                await self.client.write_gatt_char(self.char_uuid, packet, response=False)
+                since_checkpoint += len(packet)
+
+            if progress:
+                progress(offset + len(packet), total)
+
+        elapsed = time.monotonic() - start
+        self.bytes_sent += total
+        self.busy_time += elapsed
+        self.last_bytes_per_sec = total / elapsed if elapsed else 0.0
+        return self.last_bytes_per_sec
+
+    def stats(self):
+        return {
+            "packet_size": self.packet_size,
+            "rate": round(self.rate),
+            "bytes_sent": self.bytes_sent,
+            "bytes_per_sec": round(self.bytes_per_sec),
+            "last_bytes_per_sec": round(self.last_bytes_per_sec),
+            "checkpoints": self.checkpoints,
+            "slowdowns": self.slowdowns,
+        }
@@ -1,21 +1,27 @@
+import io
+import math
 import os
 import time
-import requests
+import shutil
 import json
 import subprocess
 import random
-from PIL import Image, ImageOps, ImageDraw, ImageStat
-try:
-    import Vision
-    import AppKit
-    import Quartz
-    from Foundation import NSURL
-    HAS_VISION = True
-except ImportError:
-    HAS_VISION = False
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PIL import Image
 
 from dotenv import load_dotenv
 
+import halftone
+from brightness import BrightnessMap, FRAME_AREA_THRESHOLD
+from assets import get_asset, cover_size, warm_up, CIGARETTE_PATH, EVENT_FRAME_PATH, RANDOM_FRAMES
+from face_detection import get_detector
+from http_client import get_session, StatusBatcher, HTTP_TIMEOUT
+from folder_watch import atomic_write
+import tracing
+from tracing import Trace, TRACE_HEADER
+
 load_dotenv()
 
 # Configuration
@@ -23,165 +29,113 @@ REMOTE_SERVER_URL = os.getenv("REMOTE_SERVER_URL", "http://localhost:5001")
 WATCH_DIR = "print_queue"
 POLL_INTERVAL = 5
 
+# Jobs chegam pelo /jobs/stream (SSE); o polling vira só uma rede de segurança
+JOB_STREAM_ENABLED = os.getenv("BRIDGE_JOB_STREAM", "1") != "0"
+FALLBACK_POLL_INTERVAL = int(os.getenv("BRIDGE_FALLBACK_POLL_INTERVAL", "30"))
+JOB_STREAM_READ_TIMEOUT = 45 # maior que o keep-alive do servidor (15s)
+
+# "memory": download decodificado direto do buffer e PNG final gravado uma única vez.
+# "disk": fluxo antigo com arquivos em temp/ e conversão final via sips.
+PIPELINE_MODE = os.getenv("BRIDGE_PIPELINE_MODE", "memory")
+PRINT_WIDTH = 384
+# Fotos que o navegador já recortou em 9:16 e reduziu para um múltiplo de PRINT_WIDTH
+PREPARED_PREFIX = "prep_"
+
+# Pool de workers: threads para rede, processos para o Pillow (0 = render na própria thread)
+BRIDGE_IO_WORKERS = int(os.getenv("BRIDGE_IO_WORKERS", "4"))
+BRIDGE_RENDER_PROCESSES = int(os.getenv("BRIDGE_RENDER_PROCESSES", "2"))
+
+# Detector de faces do processo (Vision no macOS, cascata Haar nos outros; configurável via FACE_DETECTOR)
+_detector = None
+# Landmarks que o overlay usa (só a boca, para posicionar o cigarro)
+OVERLAY_LANDMARKS = ("outer_lips",)
+
+def get_face_detector():
+    global _detector
+    if _detector is None:
+        _detector = get_detector()
+    return _detector
+
 def ensure_directories():
     if not os.path.exists(WATCH_DIR):
         os.makedirs(WATCH_DIR)
-    if not os.path.exists("temp"):
+    if PIPELINE_MODE == "disk" and not os.path.exists("temp"):
         os.makedirs("temp")
 
 ensure_directories()
 
-def update_remote_status(filename, status):
+# Conexão keep-alive compartilhada e status enviados em lote
+http = get_session()
+_status_batcher = None
+
+def get_status_batcher():
+    global _status_batcher
+    if _status_batcher is None:
+        _status_batcher = StatusBatcher(REMOTE_SERVER_URL, http, label="Status")
+    return _status_batcher
+
+def update_remote_status(filename, status, trace=None):
     try:
-        url = f"{REMOTE_SERVER_URL}/status/{filename}"
-        requests.post(url, json={"status": status})
-        print(f"Status [{filename}]: {status}")
+        get_status_batcher().update(filename, status, trace.export() if trace else None)
     except Exception as e:
         print(f"Erro ao atualizar status remoto: {e}")
 
-def detect_face_landmarks(image_path):
-    if not HAS_VISION:
-        return []
-        
-    try:
-        url = NSURL.fileURLWithPath_(os.path.abspath(image_path))
-        request_handler = Vision.VNImageRequestHandler.alloc().initWithURL_options_(url, None)
-        
-        # Criar o request usando new() ou alloc().init() de forma segura
-        request = Vision.VNDetectFaceLandmarksRequest.new()
-        
-        # Tentar performRequests com diferentes assinaturas PyObjC
-        try:
-            res = request_handler.performRequests_error_([request], None)
-            success = res[0] if isinstance(res, (tuple, list)) else res
-        except Exception:
-            res = request_handler.performRequests_error_([request])
-            success = res[0] if isinstance(res, (tuple, list)) else res
-            
-        if not success:
-            return []
-            
-        # Resultados podem ser método ou propriedade dependendo do ambiente
-        results = request.results() if callable(request.results) else request.results
-        if not results:
-            return []
-            
-        faces = []
-        for face in results:
-            # extrair landmarks de forma segura
-            landmarks_obj = face.landmarks() if callable(face.landmarks) else face.landmarks
-            if not landmarks_obj: continue
-            
-            def extract_pts(region_attr):
-                region = region_attr() if callable(region_attr) else region_attr
-                if not region: return []
-                count = region.pointCount() if callable(region.pointCount) else region.pointCount
-                
-                # Tentar normalizedPoints primeiro (mais robusto no PyObjC moderno)
-                try:
-                    norm_pts = region.normalizedPoints() if callable(region.normalizedPoints) else region.normalizedPoints
-                    return [[pt.x, pt.y] for pt in [norm_pts[i] for i in range(count)]]
-                except Exception:
-                    # Fallback para pointAtIndex_ caso necessário (embora possa falhar em alguns ambientes)
-                    try:
-                        return [[pt.x, pt.y] for pt in [region.pointAtIndex_(i) for i in range(count)]]
-                    except Exception:
-                        return []
-
-            # Bounding box também pode variar
-            bbox = face.boundingBox() if callable(face.boundingBox) else face.boundingBox
-                
-            face_data = {
-                "bbox": [bbox.origin.x, bbox.origin.y, bbox.size.width, bbox.size.height],
-                "landmarks": {
-                    "left_eye": extract_pts(landmarks_obj.leftEye),
-                    "right_eye": extract_pts(landmarks_obj.rightEye),
-                    "outer_lips": extract_pts(landmarks_obj.outerLips),
-                    "nose": extract_pts(landmarks_obj.nose)
-                }
-            }
-            faces.append(face_data)
-        return faces
-    except Exception as e:
-        print(f"Erro na detecção Vision: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+def detect_face_landmarks(image, detector=None, landmarks=OVERLAY_LANDMARKS):
+    """
+    Detecta faces/landmarks. Aceita uma imagem PIL em memória ou um caminho.
+    O backend vem de face_detection (Vision no macOS, cascata Haar nos outros);
+    só as regiões de landmarks pedidas são extraídas.
+    """
+    detector = detector or get_face_detector()
+    if isinstance(image, str):
+        with Image.open(image) as f:
+            image = f.convert("RGBA")
+    return detector.detect(image, landmarks)
 
-def is_dark_area(img, pos, size):
+def is_dark_area(img, pos, size, brightness=None):
     """
     Verifica se uma área da imagem é predominantemente escura.
+    brightness: BrightnessMap já calculado para a foto (evita reconverter a imagem).
     """
     try:
-        # Converter para escala de cinza e pegar a região
-        area = img.crop((pos[0], pos[1], pos[0] + size[0], pos[1] + size[1])).convert("L")
-        # Calcular o brilho médio
-        stat = area.load()
-        w, h = area.size
-        total = 0
-        for y in range(h):
-            for x in range(w):
-                total += stat[x, y]
-        avg = total / (w * h)
-        return avg < 110 # Limiar para considerar "escuro"
+        if brightness is None:
+            brightness = BrightnessMap(img)
+        box = (pos[0], pos[1], pos[0] + size[0], pos[1] + size[1])
+        return brightness.is_dark(box)
     except Exception as e:
         print(f"Erro ao verificar brilho: {e}")
         return False
 
-def is_frame_area_dark(img):
+def is_frame_area_dark(img, brightness=None):
     """
     Verifica se o topo (30%) e as bordas (10px) da imagem são predominantemente escuros.
     Usado para decidir a cor da moldura (frame.png).
     """
     try:
-        w, h = img.size
-        # Converter para escala de cinza para facilitar cálculo de brilho
-        img_l = img.convert("L")
-        pixels = img_l.load()
-        
-        total_brightness = 0
-        samples = 0
-        
-        # 1. Topo (30%)
-        top_h = int(h * 0.3)
-        for y in range(0, top_h, 2): # Passo de 2 para performance
-            for x in range(0, w, 2):
-                total_brightness += pixels[x, y]
-                samples += 1
-                
-        # 2. Bordas laterais (10px) abaixo dos 30% do topo
-        for y in range(top_h, h, 2):
-            # Borda esquerda
-            for x in range(min(10, w)):
-                total_brightness += pixels[x, y]
-                samples += 1
-            # Borda direita
-            for x in range(max(0, w - 10), w):
-                total_brightness += pixels[x, y]
-                samples += 1
-                
-        if samples == 0: return False
-        avg = total_brightness / samples
+        if brightness is None:
+            brightness = BrightnessMap(img)
+        avg = brightness.frame_mean()
+        if avg is None: return False
         print(f"Brilho médio da área da moldura: {avg:.2f}")
-        return avg < 120 # Limiar para inverter moldura para branco
+        return avg < FRAME_AREA_THRESHOLD # Limiar para inverter moldura para branco
     except Exception as e:
         print(f"Erro ao verificar brilho da moldura: {e}")
         return False
 
-def apply_random_overlay(img, faces, force_white=None):
+def apply_random_overlay(img, faces, force_white=None, brightness=None):
     """
     Nova lógica: se houver faces, bota cigarro em TODAS.
     Se não houver, bota uma moldura aleatória.
     force_white: se True, inverte moldura para branco.
+    brightness: BrightnessMap da foto, calculado uma vez pelo pipeline.
     """
-    items_dir = "png"
     w, h = img.size
-    frames = ["frame_fro.png", "frame _s2.png"]
+    if brightness is None:
+        brightness = BrightnessMap(img)
     
     if faces:
         print(f"Faces detectadas: {len(faces)}. Aplicando cigarro.")
-        overlay_name = "cingarro.png"
-        overlay_img = Image.open(os.path.join(items_dir, overlay_name)).convert("RGBA")
+        overlay_img = get_asset(CIGARETTE_PATH)
         
         for face in faces:
             fb_x, fb_y, fb_w, fb_h = face["bbox"]
@@ -200,93 +154,197 @@ def apply_random_overlay(img, faces, force_white=None):
                 scale = (face_rect[2] * 0.45) / overlay_img.width
                 new_size = (int(overlay_img.width * scale), int(overlay_img.height * scale))
                 
-                new_ov = overlay_img.resize(new_size, Image.Resampling.LANCZOS)
-                
                 if should_mirror:
-                    new_ov = ImageOps.mirror(new_ov)
                     pos = (int(mouth[0]), int(mouth[1]))
                 else:
                     pos = (int(mouth[0] - new_size[0]), int(mouth[1]))
                 
                 # Cigarro usa preferência local ou global? Local é melhor para detalhes pequenos
-                if is_dark_area(img, pos, new_size):
-                    r, g, b, a = new_ov.split()
-                    rgb_inverted = ImageOps.invert(Image.merge("RGB", (r, g, b)))
-                    ir, ig, ib = rgb_inverted.split()
-                    new_ov = Image.merge("RGBA", (ir, ig, ib, a))
+                invert = is_dark_area(img, pos, new_size, brightness)
                 
+                # Variante pronta (redimensionada/espelhada/invertida) vem do cache de assets
+                new_ov = get_asset(CIGARETTE_PATH, new_size, mirrored=should_mirror, inverted=invert)
                 img.paste(new_ov, pos, new_ov)
     else:
+        # Só sorteia entre as molduras que existem no disco
+        available = [p for p in RANDOM_FRAMES if os.path.exists(p)]
+        if not available:
+            print("Nenhuma face e nenhuma moldura aleatória disponível em png/. Seguindo só com frame.png.")
+            return img
         print("Nenhuma face. Aplicando moldura aleatória.")
-        overlay_name = random.choice(frames)
-        overlay_img = Image.open(os.path.join(items_dir, overlay_name)).convert("RGBA")
+        overlay_path = random.choice(available)
+        overlay_img = get_asset(overlay_path)
         
-        scale_w = w / overlay_img.width
-        scale_h = h / overlay_img.height
-        scale = max(scale_w, scale_h)
-        new_size = (int(overlay_img.width * scale), int(overlay_img.height * scale))
+        new_size = cover_size(overlay_img.size, (w, h))
         pos = ((w - new_size[0]) // 2, (h - new_size[1]) // 2)
         
-        new_ov = overlay_img.resize(new_size, Image.Resampling.LANCZOS)
-        
         # Usar preferência global (force_white) para molduras
-        should_invert = force_white if force_white is not None else is_dark_area(img, pos, new_size)
+        should_invert = force_white if force_white is not None else is_dark_area(img, pos, new_size, brightness)
         
         if should_invert:
             print(f"Moldura aleatória: Invertendo para Branco (preferência {'global' if force_white is not None else 'local'})")
-            r, g, b, a = new_ov.split()
-            rgb_inverted = ImageOps.invert(Image.merge("RGB", (r, g, b)))
-            ir, ig, ib = rgb_inverted.split()
-            new_ov = Image.merge("RGBA", (ir, ig, ib, a))
             
+        new_ov = get_asset(overlay_path, new_size, inverted=should_invert)
         img.paste(new_ov, pos, new_ov)
     
     return img
 
-def apply_halftone(img, sample=3):
+def apply_halftone(img, sample=3, shape="round", mode="dots"):
     """
     Aplica um efeito halftone de pontos na imagem para melhor visualização em impressão térmica.
     Otimizado para sample=3 (128 pontos em 384px) para ser mais pronunciado.
+    Implementação vetorizada em halftone.py (mesmo resultado do loop por célula).
     """
-    # 1. Converter para escala de cinza
-    img = img.convert("L")
-    w, h = img.size
+    return halftone.apply_halftone(img, sample=sample, shape=shape, mode=mode)
+
+def crop_box_9_16(size):
+    """Caixa do center crop 9:16 (retrato) para uma imagem desse tamanho, ou None se a proporção já está na tolerância."""
+    w_orig, h_orig = size
+    target_ratio = 9/16
+    current_ratio = w_orig / h_orig
+    
+    if abs(current_ratio - target_ratio) <= 0.02:
+        return None
+    if current_ratio > target_ratio:
+        # Mais larga que 9:16 -> Cortar laterais
+        new_w = int(h_orig * target_ratio)
+        left = (w_orig - new_w) // 2
+        return (left, 0, left + new_w, h_orig)
+    # Mais estreita que 9:16 -> Cortar topo/fundo
+    new_h = int(w_orig / target_ratio)
+    top = (h_orig - new_h) // 2
+    return (0, top, w_orig, top + new_h)
+
+def crop_to_9_16(img):
+    """Center crop 9:16 (retrato), se a proporção estiver fora da tolerância."""
+    box = crop_box_9_16(img.size)
+    if box:
+        print(f"Ajustando proporção para 9:16 (atual: {img.width / img.height:.2f})")
+        img = img.crop(box)
+    return img
+
+def decode_for_print(src, width=PRINT_WIDTH, prepared=False):
+    """
+    Etapas 1 e 2 do render_photo direto da imagem ainda não decodificada:
+    center crop 9:16 e resize para width px, em RGBA.
+    - JPEG: draft() faz o decoder reduzir por DCT (1/2, 1/4 ou 1/8) para a
+      menor escala em que o recorte 9:16 ainda tem pelo menos width px, em vez
+      de decodificar os 12 MP inteiros;
+    - o recorte vem antes da conversão: só a área recortada e já reduzida
+      vira RGBA (antes, a foto inteira virava RGBA, ~48 MB num 12 MP).
+    O tamanho final é o mesmo do caminho sem draft.
+    prepared (upload prep_ do app): se a foto de fato chegou em 9:16 com
+    largura múltipla de width, não há crop e a redução é um reduce() inteiro.
+    """
+    factor = src.width // width
+    if prepared and factor and src.width == factor * width and crop_box_9_16(src.size) is None:
+        with tracing.stage("decode"):
+            src.load()
+        with tracing.stage("resize"):
+            img = src if src.mode in ("RGB", "L") else src.convert("RGBA")
+            if factor > 1:
+                # Mesma altura do caminho com LANCZOS: int(altura / fator)
+                img = img.reduce(factor, (0, 0, img.width, img.height // factor * factor))
+            return img.convert("RGBA")
+    if prepared:
+        print(f"Foto {src.size[0]}x{src.size[1]} marcada como preparada fora do 9:16/{width} px. Seguindo o pipeline completo.")
+
+    with tracing.stage("decode"):
+        box = crop_box_9_16(src.size)
+        crop_w, crop_h = (box[2] - box[0], box[3] - box[1]) if box else src.size
+        size = (width, int(crop_h * (width / crop_w)))
+
+        if src.format == "JPEG" and crop_w > width:
+            scale = crop_w / width
+            src.draft(src.mode, (math.ceil(src.width / scale), math.ceil(src.height / scale)))
+        img = crop_to_9_16(src)
+        img.load()
+
+    with tracing.stage("resize"):
+        # RGB/L redimensionam iguais fora do RGBA; transparência e CMYK convertem antes
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGBA")
+        img = img.resize(size, Image.Resampling.LANCZOS)
+        return img.convert("RGBA")
+
+def render_photo(img_orig, detector=None, prepared=False):
+    """
+    Pipeline Otimizado para Phomemo 384px, todo em memória:
+    1. 9:16 Center Crop
+    2. Resize 384px
+    3. Detect Faces (imagem em memória)
+    4. Cigarros ou Moldura Randômica
+    5. Moldura evento obrigatória (frame.png) com contraste inteligente
+    6. Conversão Grayscale
+    7. Padding 15px
+    prepared: upload já recortado e reduzido no navegador (prefixo prep_).
+    Retorna a imagem final em "L".
+    """
+    # 1 e 2. Crop 9:16 e resize para 384px, decodificando o JPEG já reduzido
+    img = decode_for_print(img_orig, PRINT_WIDTH, prepared)
     
-    # Criar uma nova imagem branca para os pontos
-    halftone = Image.new("L", (w, h), 255)
-    draw = ImageDraw.Draw(halftone)
+    # 3. Detectar faces direto na imagem 384px (sem arquivo temporário)
+    with tracing.stage("vision"):
+        faces = detect_face_landmarks(img, detector)
     
-    for x in range(0, w, sample):
-        for y in range(0, h, sample):
-            box = (x, y, min(x + sample, w), min(y + sample, h))
-            region = img.crop(box)
-            stat = ImageStat.Stat(region)
-            if not stat.mean: continue
-            avg = stat.mean[0]
-            
-            # Mais agressivo: se for bem claro, nem desenha. Se for escuro, desenha bem.
-            ratio = 1 - (avg / 255.0)
-            # Eleva ao quadrado para aumentar o contraste dos pontos
-            radius = (sample / 1.5) * (ratio ** 1.2)
+    with tracing.stage("composite"):
+        return _composite(img, faces)
+
+def _composite(img, faces):
+    """Etapas 4 a 7 do render_photo: overlay, moldura do evento, escala de cinza e padding."""
+    # DETERMINAR PREFERÊNCIA DE CONTRASTE (Global: Topo 30% + Bordas 10px)
+    # Isso garante que a moldura principal e as secundárias fiquem visíveis.
+    brightness = BrightnessMap(img)
+    prefers_white = is_frame_area_dark(img, brightness)
+    print(f"Preferência de contraste do pipeline: {'BRANCO' if prefers_white else 'PRETO'}")
+
+    # 4. Aplicar Cigarros ou Moldura Random (passando preferência global para molduras)
+    img = apply_random_overlay(img, faces, force_white=prefers_white, brightness=brightness)
+    
+    # 5. Aplicar Moldura Evento Obrigatória
+    try:
+        event_frame = get_asset(EVENT_FRAME_PATH)
+        ef_size = cover_size(event_frame.size, img.size)
+        ef_pos = ((img.width - ef_size[0]) // 2, (img.height - ef_size[1]) // 2)
+        
+        if prefers_white:
+            print("Invertendo frame.png obrigatório para branco.")
+        ef_final = get_asset(EVENT_FRAME_PATH, ef_size, inverted=prefers_white)
             
-            if radius > 0.4:
-                cx = x + (sample / 2.0)
-                cy = y + (sample / 2.0)
-                draw.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], fill=0)
-                
-    return halftone
+        img.paste(ef_final, ef_pos, ef_final)
+    except Exception as fe:
+        print(f"Aviso: Não foi possível aplicar png/frame.png: {fe}")
+    
+    # 6. Converter para Escala de Cinza
+    print("Convertendo para escala de cinza...")
+    img_final = img.convert("L")
+    
+    # 7. Adicionar Padding de 15px na base (AUMENTA a altura total da imagem)
+    final_w, final_h = img_final.size
+    img_with_padding = Image.new("L", (final_w, final_h + 15), 255)
+    img_with_padding.paste(img_final, (0, 0))
+    return img_with_padding
+
+def render_raw(img_orig):
+    """
+    Menu secreto (raw_): sem molduras, só achata a transparência para branco
+    e gira paisagem para retrato.
+    """
+    img_orig = img_orig.convert("RGBA")
+    # Achatar transparência para Branco (evita molduras pretas em PNGs transparentes)
+    img = Image.new("RGB", img_orig.size, (255, 255, 255))
+    img.paste(img_orig, mask=img_orig.split()[3])
+    
+    # Se for paisagem, rotacionar para retrato
+    if img.width > img.height:
+        print("Rotacionando imagem paisagem para retrato (RAW).")
+        img = img.rotate(90, expand=True)
+    return img
 
 def process_with_apple_vision(input_path, output_path):
     """
-    Pipeline Otimizado para Phomemo 384px:
-    1. Check Bypass (Secret Menu)
-    2. 9:16 Center Crop
-    3. Resize 384px
-    4. Detect Faces
-    5. Cigarros ou Moldura Randômica
-    6. Moldura evento obrigatória (frame.png) com contraste inteligente
-    7. Conversão Grayscale
-    8. Padding 10px
+    Modo disco: lê input_path, roda render_photo e grava output_path,
+    passando pelo sips quando disponível (DPI e compatibilidade).
     """
     # 1. Bypass check - Prefix/Filename check
     filename = os.path.basename(input_path)
@@ -304,81 +362,19 @@ def process_with_apple_vision(input_path, output_path):
     print(f"Processando {input_path} (Thermal Pipeline 9:16)...")
     
     try:
-        # 1. Carregar e Aplicar 9:16 Center Crop
-        img_orig = Image.open(input_path).convert("RGBA")
-        w_orig, h_orig = img_orig.size
-        
-        target_ratio = 9/16
-        current_ratio = w_orig / h_orig
-        
-        if abs(current_ratio - target_ratio) > 0.02:
-            print(f"Ajustando proporção para 9:16 (atual: {current_ratio:.2f})")
-            if current_ratio > target_ratio:
-                # Mais larga que 9:16 -> Cortar laterais
-                new_w = int(h_orig * target_ratio)
-                left = (w_orig - new_w) // 2
-                img_orig = img_orig.crop((left, 0, left + new_w, h_orig))
-            else:
-                # Mais estreita que 9:16 -> Cortar topo/fundo
-                new_h = int(w_orig / target_ratio)
-                top = (h_orig - new_h) // 2
-                img_orig = img_orig.crop((0, top, w_orig, top + new_h))
-            w_orig, h_orig = img_orig.size
-
-        # 2. Resize para 384px width
-        new_w = 384
-        new_h = int(h_orig * (new_w / w_orig))
-        img = img_orig.resize((new_w, new_h), Image.Resampling.LANCZOS)
-        
-        # Salvar temporário para Vision detectar no tamanho correto
-        temp_resize_path = input_path + ".res384.png"
-        img.save(temp_resize_path)
-        
-        # 3. Detectar faces
-        faces = detect_face_landmarks(temp_resize_path)
-        if os.path.exists(temp_resize_path): os.remove(temp_resize_path)
-        
-        # DETERMINAR PREFERÊNCIA DE CONTRASTE (Global: Topo 30% + Bordas 10px)
-        # Isso garante que a moldura principal e as secundárias fiquem visíveis.
-        prefers_white = is_frame_area_dark(img)
-        print(f"Preferência de contraste do pipeline: {'BRANCO' if prefers_white else 'PRETO'}")
-
-        # 4. Aplicar Cigarros ou Moldura Random (passando preferência global para molduras)
-        img = apply_random_overlay(img, faces, force_white=prefers_white)
-        
-        # 5. Aplicar Moldura Evento Obrigatória
-        try:
-            event_frame = Image.open("png/frame.png").convert("RGBA")
-            ef_scale = max(img.width / event_frame.width, img.height / event_frame.height)
-            ef_size = (int(event_frame.width * ef_scale), int(event_frame.height * ef_scale))
-            ef_final = event_frame.resize(ef_size, Image.Resampling.LANCZOS)
-            ef_pos = ((img.width - ef_size[0]) // 2, (img.height - ef_size[1]) // 2)
-            
-            if prefers_white:
-                print("Invertendo frame.png obrigatório para branco.")
-                r, g, b, a = ef_final.split()
-                rgb_inverted = ImageOps.invert(Image.merge("RGB", (r, g, b)))
-                ir, ig, ib = rgb_inverted.split()
-                ef_final = Image.merge("RGBA", (ir, ig, ib, a))
-                
-            img.paste(ef_final, ef_pos, ef_final)
-        except Exception as fe:
-            print(f"Aviso: Não foi possível aplicar png/frame.png: {fe}")
-        
-        # 6. Converter para Escala de Cinza
-        print("Convertendo para escala de cinza...")
-        img_final = img.convert("L")
-        
-        # 7. Adicionar Padding de 15px na base (AUMENTA a altura total da imagem)
-        final_w, final_h = img_final.size
-        img_with_padding = Image.new("L", (final_w, final_h + 15), 255)
-        img_with_padding.paste(img_final, (0, 0))
+        with Image.open(input_path) as f:
+            img_with_padding = render_photo(f, prepared=PREPARED_PREFIX in filename)
         
         temp_overlay_path = input_path + ".overlay.png"
-        img_with_padding.save(temp_overlay_path)
+        with tracing.stage("encode"):
+            img_with_padding.save(temp_overlay_path)
         
         # 8. Processar final (DPI e compatibilidade)
-        subprocess.run(["sips", "-s", "format", "png", temp_overlay_path, "--out", output_path], check=True, capture_output=True)
+        with tracing.stage("sips"):
+            if shutil.which("sips"):
+                subprocess.run(["sips", "-s", "format", "png", temp_overlay_path, "--out", output_path], check=True, capture_output=True)
+            else:
+                shutil.copyfile(temp_overlay_path, output_path)
         
         if os.path.exists(temp_overlay_path):
             os.remove(temp_overlay_path)
@@ -391,85 +387,359 @@ def process_with_apple_vision(input_path, output_path):
         traceback.print_exc()
         return False
 
-def download_and_process():
+def render_to_image(filename, data):
+    """
+    Decodifica os bytes baixados direto do buffer e processa. Devolve a imagem
+    PIL final ou, para texto e reimpressões, o próprio texto (a impressora renderiza).
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.txt', '.reprint'):
+        # Texto e reimpressões (só o ID do job original) vão direto; a impressora renderiza
+        return data.decode('utf-8', errors='replace')
+    
+    with Image.open(io.BytesIO(data)) as src:
+        if "raw_" in filename:
+            print(f"Imagem RAW detectada ({filename}). Otimizando rotação e removendo molduras...")
+            with tracing.stage("raw"):
+                img = render_raw(src)
+        else:
+            print(f"Processando {filename} em memória (Thermal Pipeline 9:16)...")
+            img = render_photo(src, prepared=PREPARED_PREFIX in filename)
+            print("Processamento Otimizado (9:16 + Contraste) concluído.")
+    return img
+
+def render_to_bytes(filename, data):
+    """
+    Modo memória: decodifica os bytes baixados direto do buffer, processa e
+    devolve o conteúdo final para a fila de impressão (PNG ou o próprio texto).
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.txt', '.reprint'):
+        print(f"Arquivo de texto detectado. Movendo diretamente para {WATCH_DIR}")
+        return data
+    
+    img = render_to_image(filename, data)
+    buf = io.BytesIO()
+    with tracing.stage("encode"):
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def process_in_memory(filename, data, output_path):
+    """Modo memória: processa e grava o resultado final uma única vez em output_path (sem temp/ nem sips)."""
     try:
-        # 1. Checar por arquivos pendentes
-        url = f"{REMOTE_SERVER_URL}/pending/" # Adicionado / para evitar redirects
-        response = requests.get(url)
-        
-        if response.status_code != 200:
-            print(f"Erro no servidor ({response.status_code}): {response.text[:100]}")
-            return
+        payload = render_to_bytes(filename, data)
+        with open(output_path, "wb") as f:
+            f.write(payload)
+        return True
+    except Exception as e:
+        print(f"Erro no processamento pipeline: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
 
+def process_on_disk(filename, data, output_path):
+    """Fluxo antigo: grava o download em temp/ e processa a partir do arquivo."""
+    ext = os.path.splitext(filename)[1].lower()
+    local_temp_path = os.path.join("temp", filename)
+    if not os.path.exists("temp"): os.makedirs("temp")
+    
+    with open(local_temp_path, "wb") as f:
+        f.write(data)
+    
+    if ext in ('.txt', '.reprint'):
+        print(f"Arquivo de texto detectado. Movendo diretamente para {WATCH_DIR}")
+        with open(output_path, "wb") as f:
+            f.write(data)
+        success = True
+    elif "raw_" in filename:
+        print(f"Imagem RAW detectada ({filename}). Otimizando rotação e removendo molduras...")
         try:
-            pending_files = response.json()
-        except Exception as json_err:
-            print(f"Erro ao ler JSON: {json_err}. Resposta bruta: '{response.text}'")
-            return
-        
-        if not pending_files:
-            return
+            with Image.open(local_temp_path) as src:
+                render_raw(src).save(output_path)
+            success = True
+        except Exception as e:
+            print(f"Erro ao tratar imagem RAW: {e}")
+            success = False
+    else:
+        success = process_with_apple_vision(local_temp_path, output_path)
+    
+    # Deletar o arquivo temporário original após processamento bem sucedido
+    if success and os.path.exists(local_temp_path):
+        os.remove(local_temp_path)
+        print(f"Limpeza: Arquivo temporário {local_temp_path} removido.")
+    return success
+
+def render_job(filename, data):
+    """
+    Etapa pesada (Pillow/Vision) de um job. Roda no pool de processos,
+    por isso é uma função de módulo que só recebe e devolve bytes.
+    Retorna (sucesso, conteúdo final para a fila de impressão, etapas medidas).
+    """
+    trace = Trace(filename)
+    with tracing.activate(trace):
+        success, payload = _render_job(filename, data)
+    return success, payload, trace.spans
+
+def _render_job(filename, data):
+    if PIPELINE_MODE == "disk":
+        if not os.path.exists("temp"): os.makedirs("temp")
+        output_path = os.path.join("temp", filename + ".out")
+        try:
+            if not process_on_disk(filename, data, output_path):
+                return False, None
+            with open(output_path, "rb") as f:
+                return True, f.read()
+        finally:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+    
+    try:
+        return True, render_to_bytes(filename, data)
+    except Exception as e:
+        print(f"Erro no processamento pipeline: {e}")
+        import traceback
+        traceback.print_exc()
+        return False, None
+
+# Quantos jobs concluídos lembrar para não processar de novo um nome repetido
+RECENT_JOBS_MEMORY = 512
+
+def _init_render_worker():
+    # Cada processo do pool aquece o próprio cache de assets
+    warm_up(PRINT_WIDTH)
+
+class BridgeEngine:
+    """
+    Processa os arquivos pendentes em paralelo:
+    - pool de threads para a parte de I/O (status, download, DELETE);
+    - pool de processos para a parte pesada de Pillow (render_job);
+    - deduplicação dos arquivos em andamento e dos concluídos há pouco (o mesmo
+      arquivo pode vir do stream e de um /pending antigo);
+    - entrega na print_queue na ordem de upload, mesmo que um job termine antes
+      do anterior.
+    """
+
+    def __init__(self, io_workers=BRIDGE_IO_WORKERS, render_processes=BRIDGE_RENDER_PROCESSES):
+        self.io_pool = ThreadPoolExecutor(max_workers=max(1, io_workers), thread_name_prefix="bridge-io")
+        self.render_pool = None
+        if render_processes > 0:
+            self.render_pool = ProcessPoolExecutor(max_workers=render_processes, initializer=_init_render_worker)
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._recent = OrderedDict()
+        self._next_seq = 0
+        self._next_delivery = 0
+        self._finished = {}
+
+    def submit(self, filenames):
+        """Enfileira novos arquivos (em ordem de upload). Retorna quantos foram aceitos."""
+        accepted = 0
+        # O nome começa com o timestamp do upload, então a ordem alfabética é a de chegada
+        for filename in sorted(filenames):
+            with self._lock:
+                if filename in self._in_flight or filename in self._recent:
+                    continue
+                self._in_flight.add(filename)
+                seq = self._next_seq
+                self._next_seq += 1
+            self.io_pool.submit(self._run, seq, filename)
+            accepted += 1
+        return accepted
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def _render(self, filename, data):
+        if self.render_pool:
+            return self.render_pool.submit(render_job, filename, data).result()
+        return render_job(filename, data)
 
-        for filename in pending_files:
+    def _run(self, seq, filename):
+        success, payload = False, None
+        trace = Trace(filename)
+        try:
             update_remote_status(filename, "Me perdi aqui...")
             
-            # 2. Download
+            # 2. Download (o servidor manda o ID do trace criado no upload)
             img_url = f"{REMOTE_SERVER_URL}/download/{filename}/"
-            img_data = requests.get(img_url).content
-            
-            local_temp_path = os.path.join("temp", filename)
-            if not os.path.exists("temp"): os.makedirs("temp")
-            
-            with open(local_temp_path, "wb") as f:
-                f.write(img_data)
-            
-            # 3. Processamento Apple Vision (Apenas para imagens)
-            final_output = os.path.join(WATCH_DIR, filename)
-            ext = os.path.splitext(filename)[1].lower()
-            
-            if ext == '.txt':
-                print(f"Arquivo de texto detectado. Movendo diretamente para {WATCH_DIR}")
-                with open(final_output, "wb") as f:
-                    f.write(img_data)
-                success = True
-            elif "raw_" in filename:
-                print(f"Imagem RAW detectada ({filename}). Otimizando rotação e removendo molduras...")
-                try:
-                    img_orig = Image.open(local_temp_path).convert("RGBA")
-                    # Achatar transparência para Branco (evita molduras pretas em PNGs transparentes)
-                    img = Image.new("RGB", img_orig.size, (255, 255, 255))
-                    img.paste(img_orig, mask=img_orig.split()[3])
-                    
-                    # Se for paisagem, rotacionar para retrato
-                    if img.width > img.height:
-                        print("Rotacionando imagem paisagem para retrato (RAW).")
-                        img = img.rotate(90, expand=True)
-                    
-                    img.save(final_output)
-                    success = True
-                except Exception as e:
-                    print(f"Erro ao tratar imagem RAW: {e}")
-                    success = False
-            else:
-                success = process_with_apple_vision(local_temp_path, final_output)
+            with trace.stage("download") as span:
+                response = http.get(img_url)
+                response.raise_for_status()
+                img_data = response.content
+                span["bytes_in"] = len(img_data)
+            trace.trace_id = tracing.clean_trace_id(response.headers.get(TRACE_HEADER)) or trace.trace_id
             
+            # 3. Processamento (Apple Vision apenas para imagens)
+            success, payload, spans = self._render(filename, img_data)
+            trace.spans.extend(spans)
+        except Exception as e:
+            print(f"Erro no job {filename}: {e}")
+        self._finish(seq, filename, success, payload, trace)
+
+    def _finish(self, seq, filename, success, payload, trace):
+        # Entrega em ordem: só escreve na fila quando todos os anteriores terminaram
+        with self._lock:
+            self._finished[seq] = (filename, success, payload, trace)
+            delivered = []
+            while self._next_delivery in self._finished:
+                name, ok, data, job_trace = self._finished.pop(self._next_delivery)
+                self._next_delivery += 1
+                if ok:
+                    path = os.path.join(WATCH_DIR, name)
+                    try:
+                        with job_trace.stage("queue_write"):
+                            # O trace vai antes, para o monitor já encontrá-lo junto com o arquivo
+                            tracing.save_for_queue(job_trace, path)
+                            # temp+rename: o monitor da impressora nunca vê um arquivo pela metade
+                            atomic_write(path, data)
+                    except Exception as e:
+                        print(f"Erro ao gravar {name} na fila: {e}")
+                        tracing.discard_from_queue(path)
+                        ok = False
+                delivered.append((name, ok, job_trace))
+        
+        for name, ok, job_trace in delivered:
+            self.io_pool.submit(self._report, name, ok, job_trace)
+
+    def _report(self, filename, success, trace):
+        trace.gauges["bridge_in_flight"] = self.in_flight() - 1
+        try:
             if success:
-                update_remote_status(filename, "Olhe a impressora")
-                
-                # Deletar o arquivo temporário original após processamento bem sucedido
-                if os.path.exists(local_temp_path):
-                    os.remove(local_temp_path)
-                    print(f"Limpeza: Arquivo temporário {local_temp_path} removido.")
+                update_remote_status(filename, "Olhe a impressora", trace)
                 
                 # O script print_phomemo.py já deve estar monitorando a pasta WATCH_DIR
                 # Ele vai detectar o arquivo, imprimir e mover para 'processed'
                 
                 # 4. Avisar servidor que foi processado
-                requests.delete(f"{REMOTE_SERVER_URL}/processed/{filename}/")
+                http.delete(f"{REMOTE_SERVER_URL}/processed/{filename}/")
                 
                 # O status "Pronto" agora é enviado diretamente pelo print_phomemo.py ao finalizar a impressão.
+                with self._lock:
+                    self._recent[filename] = True
+                    while len(self._recent) > RECENT_JOBS_MEMORY:
+                        self._recent.popitem(last=False)
             else:
-                update_remote_status(filename, "Erro no processamento")
+                update_remote_status(filename, "Erro no processamento", trace)
+        except Exception as e:
+            print(f"Erro ao reportar {filename}: {e}")
+        finally:
+            trace.log()
+            # Falhas saem da lista de andamento e serão tentadas de novo no próximo /pending
+            with self._lock:
+                self._in_flight.discard(filename)
+
+    def shutdown(self):
+        self.io_pool.shutdown(wait=True)
+        if self.render_pool:
+            self.render_pool.shutdown(wait=True)
+
+def iter_sse_events(response):
+    """Lê um stream text/event-stream e gera (id, event, data) a cada evento."""
+    event_id, event_type, data = None, "message", []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event_id, event_type, "\n".join(data)
+            event_type, data = "message", []
+            continue
+        if line.startswith(":"):
+            continue # keep-alive
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "id":
+            event_id = value
+        elif field == "event":
+            event_type = value
+        elif field == "data":
+            data.append(value)
+
+class JobStreamListener:
+    """
+    Fica conectado no /jobs/stream do servidor e entrega cada upload novo ao
+    engine assim que ele chega. Guarda o cursor do último job recebido para
+    retomar sem perder nem repetir jobs depois de uma reconexão.
+    """
+
+    def __init__(self, engine, session=None):
+        self.engine = engine
+        self.session = session or http
+        self.cursor = None
+        self.connected = threading.Event()
+        self.disconnected = threading.Event()
+        self.disconnected.set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="job-stream", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _set_connected(self, value):
+        if value:
+            self.disconnected.clear()
+            self.connected.set()
+        else:
+            self.connected.clear()
+            self.disconnected.set()
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                headers = {"Accept": "text/event-stream"}
+                if self.cursor:
+                    headers["Last-Event-ID"] = self.cursor
+                url = f"{REMOTE_SERVER_URL}/jobs/stream/"
+                with self.session.get(url, headers=headers, stream=True, timeout=(HTTP_TIMEOUT, JOB_STREAM_READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    self._set_connected(True)
+                    backoff = 1
+                    print("Conectado ao stream de jobs do servidor.")
+                    for event_id, event_type, data in iter_sse_events(response):
+                        if self._stop.is_set():
+                            return
+                        if event_type == "job":
+                            filename = json.loads(data)["filename"]
+                            self.engine.submit([filename])
+                        # Eventos "cursor" só avançam a posição (jobs já processados)
+                        if event_id:
+                            self.cursor = event_id
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"Stream de jobs indisponível ({e}). Usando polling a cada {POLL_INTERVAL}s.")
+            finally:
+                self._set_connected(False)
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30)
+
+def download_and_process(engine):
+    try:
+        # 1. Checar por arquivos pendentes
+        url = f"{REMOTE_SERVER_URL}/pending/" # Adicionado / para evitar redirects
+        response = http.get(url)
+        
+        if response.status_code != 200:
+            print(f"Erro no servidor ({response.status_code}): {response.text[:100]}")
+            return
+
+        try:
+            pending_files = response.json()
+        except Exception as json_err:
+            print(f"Erro ao ler JSON: {json_err}. Resposta bruta: '{response.text}'")
+            return
+        
+        if not pending_files:
+            return
+
+        accepted = engine.submit(pending_files)
+        if accepted:
+            print(f"{accepted} novo(s) arquivo(s) na fila da bridge ({engine.in_flight()} em andamento).")
 
     except Exception as e:
         print(f"Erro no ciclo de bridge: {e}")
@@ -477,10 +747,25 @@ def download_and_process():
 def main():
     print(f"Bridge Local Iniciada - Monitorando {REMOTE_SERVER_URL}")
     print(f"Salvando resultados em: {os.path.abspath(WATCH_DIR)}")
+    print(f"Pipeline: {PIPELINE_MODE} | Detector de faces: {get_face_detector().name}")
+    warm_up(PRINT_WIDTH)
     
-    while True:
-        download_and_process()
-        time.sleep(POLL_INTERVAL)
+    engine = BridgeEngine()
+    print(f"Workers: {BRIDGE_IO_WORKERS} threads de I/O, {BRIDGE_RENDER_PROCESSES} processos de render")
+    listener = JobStreamListener(engine).start() if JOB_STREAM_ENABLED else None
+    try:
+        while True:
+            download_and_process(engine)
+            if listener and listener.connected.is_set():
+                # Stream ativo: polling só de vez em quando, ou assim que o stream cair
+                listener.disconnected.wait(FALLBACK_POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        if listener:
+            listener.stop()
+        engine.shutdown()
+        get_status_batcher().close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,119 @@
+import numpy as np
+
+# Limiares usados pelo pipeline de contraste
+DARK_AREA_THRESHOLD = 110   # cigarro / moldura aleatória
+FRAME_AREA_THRESHOLD = 120  # moldura obrigatória (frame.png)
+
+# Região da moldura: topo (30%) + bordas laterais (10px)
+FRAME_TOP_RATIO = 0.3
+FRAME_BORDER = 10
+
+
+class BrightnessMap:
+    """
+    Mapa de brilho de uma foto: converte para escala de cinza uma única vez e
+    guarda as tabelas de área somada (integral image) dos valores e dos
+    quadrados. A média/variância de qualquer retângulo vira uma consulta O(1).
+    """
+
+    def __init__(self, img):
+        self.gray = np.asarray(img.convert("L"))
+        self.height, self.width = self.gray.shape
+
+        self._sat = self._integral(self.gray.astype(np.int64))
+        # Tabela dos quadrados só é montada se alguém pedir variância
+        self._sat_sq_cache = None
+
+    def _integral(self, values):
+        # Linha/coluna de zeros na frente: sat[y, x] = soma de values[:y, :x]
+        sat = np.zeros((self.height + 1, self.width + 1), dtype=np.int64)
+        sat[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+        return sat
+
+    @property
+    def _sat_sq(self):
+        if self._sat_sq_cache is None:
+            values = self.gray.astype(np.int64)
+            self._sat_sq_cache = self._integral(values * values)
+        return self._sat_sq_cache
+
+    def _clip(self, box):
+        x0, y0, x1, y1 = box
+        return (min(max(int(x0), 0), self.width), min(max(int(y0), 0), self.height),
+                min(max(int(x1), 0), self.width), min(max(int(y1), 0), self.height))
+
+    def _rect_sum(self, table, box):
+        x0, y0, x1, y1 = self._clip(box)
+        if x1 <= x0 or y1 <= y0:
+            return 0
+        return int(table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0])
+
+    def area(self, box):
+        x0, y0, x1, y1 = box
+        return max(0, x1 - x0) * max(0, y1 - y0)
+
+    def sum(self, box):
+        """Soma do brilho no retângulo (x0, y0, x1, y1); o que cai fora da imagem conta como 0."""
+        return self._rect_sum(self._sat, box)
+
+    def mean(self, box):
+        """
+        Brilho médio do retângulo. Pixels fora da imagem contam como preto,
+        igual ao img.crop() que o pipeline usava antes.
+        """
+        area = self.area(box)
+        if area == 0:
+            return 0.0
+        return self._rect_sum(self._sat, box) / area
+
+    def variance(self, box):
+        area = self.area(box)
+        if area == 0:
+            return 0.0
+        mean = self._rect_sum(self._sat, box) / area
+        return max(0.0, self._rect_sum(self._sat_sq, box) / area - mean * mean)
+
+    def histogram(self, box, bins=256):
+        """Histograma (256 níveis por padrão) da parte do retângulo dentro da imagem."""
+        x0, y0, x1, y1 = self._clip(box)
+        region = self.gray[y0:y1, x0:x1]
+        hist = np.bincount(region.ravel(), minlength=256)
+        if bins != 256:
+            hist = hist.reshape(bins, 256 // bins).sum(axis=1)
+        return hist
+
+    def stats(self, box):
+        """Estatísticas de uma região: média, variância e histograma."""
+        return {
+            "mean": self.mean(box),
+            "variance": self.variance(box),
+            "histogram": self.histogram(box),
+        }
+
+    def frame_regions(self):
+        """Retângulos da área da moldura: topo (30%) + bordas laterais (10px) abaixo dele."""
+        w, h = self.width, self.height
+        top_h = int(h * FRAME_TOP_RATIO)
+        regions = [(0, 0, w, top_h)]
+        if top_h < h:
+            regions.append((0, top_h, min(FRAME_BORDER, w), h))
+            regions.append((max(0, w - FRAME_BORDER), top_h, w, h))
+        return regions
+
+    def frame_mean(self):
+        """Brilho médio da área da moldura (O(1): três consultas na tabela)."""
+        regions = self.frame_regions()
+        total = sum(self.sum(r) for r in regions)
+        samples = sum(self.area(r) for r in regions)
+        if samples == 0:
+            return None
+        return total / samples
+
+    def is_dark(self, box, threshold=DARK_AREA_THRESHOLD):
+        return self.mean(box) < threshold
+
+    def is_frame_dark(self, threshold=FRAME_AREA_THRESHOLD):
+        avg = self.frame_mean()
+        if avg is None:
+            return False
+        return avg < threshold
@@ -0,0 +1,117 @@
+import numpy as np
+from PIL import ImageOps
+
+ESC_INIT = b'\x1b\x40'
+FOOTER = b'\x1b\x64\x03'  # ESC d 3: avança 3 linhas no fim
+RASTER_HEADER = b'\x1d\x76\x30\x00'  # GS v 0, modo normal
+FEED = b'\x1b\x4a'  # ESC J n: avança n pontos
+
+# Sequências de linhas em branco a partir deste tamanho viram ESC J em vez de raster
+MIN_BLANK_RUN = 4
+# Altura máxima de um bloco GS v 0 (o encoder antigo usava sempre 100)
+MAX_CHUNK_ROWS = 100
+MAX_FEED = 255
+
+
+def raster_bytes(img):
+    """Imagem 1-bit -> bytes do raster (1 = queima) e bytes por linha."""
+    # Invert so white=0 (no burn), black=1 (burn)
+    img = ImageOps.invert(img.convert("L")).convert("1")
+    return img.tobytes(), (img.width + 7) // 8
+
+
+def blank_runs(data, width_bytes, min_run=MIN_BLANK_RUN):
+    """Pares (início, fim) das sequências de pelo menos min_run linhas todas zeradas."""
+    rows = np.frombuffer(data, dtype=np.uint8).reshape(-1, width_bytes)
+    blank = np.concatenate(([False], ~rows.any(axis=1), [False]))
+    edges = np.flatnonzero(blank[1:] != blank[:-1])
+    return [(int(s), int(e)) for s, e in zip(edges[::2], edges[1::2]) if e - s >= min_run]
+
+
+def raster_chunk(data, width_bytes, start, end):
+    h = end - start
+    header = RASTER_HEADER + bytes([width_bytes & 0xFF, (width_bytes >> 8) & 0xFF, h & 0xFF, (h >> 8) & 0xFF])
+    return header + data[start * width_bytes:end * width_bytes]
+
+
+def feed_commands(rows):
+    return [FEED + bytes([min(MAX_FEED, rows - n)]) for n in range(0, rows, MAX_FEED)]
+
+
+def legacy_size(height, width_bytes, chunk_rows=MAX_CHUNK_ROWS):
+    """Tamanho do job no encoder antigo (todas as linhas em raster, blocos de 100)."""
+    chunks = -(-height // chunk_rows)
+    return len(ESC_INIT) + chunks * (len(RASTER_HEADER) + 4) + height * width_bytes + len(FOOTER)
+
+
+def encode_raster(img, min_blank_run=MIN_BLANK_RUN, max_chunk_rows=MAX_CHUNK_ROWS, init=True, footer=True):
+    """
+    Converte a imagem em comandos ESC/POS. Linhas de conteúdo vão como GS v 0
+    exatamente como antes; sequências em branco viram ESC J. Os blocos de
+    raster terminam onde começa o branco e trechos longos são divididos em
+    blocos de mesma altura (até max_chunk_rows).
+    Sem init/footer a imagem continua o raster de uma anterior (páginas de PDF).
+    Retorna (comandos, estatísticas do job).
+    """
+    data, width_bytes = raster_bytes(img)
+    height = img.height
+    commands = [ESC_INIT] if init else []
+    chunks = 0
+    blank_rows = 0
+
+    row = 0
+    for blank_start, blank_end in blank_runs(data, width_bytes, min_blank_run) + [(height, height)]:
+        # Conteúdo até o próximo trecho em branco, em blocos de altura parecida
+        rows = blank_start - row
+        if rows:
+            parts = -(-rows // max_chunk_rows)
+            step = -(-rows // parts)
+            for start in range(row, blank_start, step):
+                commands.append(raster_chunk(data, width_bytes, start, min(start + step, blank_start)))
+                chunks += 1
+        commands.extend(feed_commands(blank_end - blank_start))
+        blank_rows += blank_end - blank_start
+        row = blank_end
+
+    if footer:
+        commands.append(FOOTER)
+    sent = sum(len(c) for c in commands)
+    raw = legacy_size(height, width_bytes)
+    stats = {
+        "rows": height,
+        "blank_rows": blank_rows,
+        "chunks": chunks,
+        "raw_bytes": raw,
+        "sent_bytes": sent,
+        "saved_bytes": raw - sent,
+    }
+    return commands, stats
+
+
+def decode_raster(commands, width_bytes):
+    """
+    Reconstrói o bitmap (bytes do raster, 1 = queima) a partir dos comandos,
+    tratando ESC J como linhas em branco. Serve para conferir o encoder.
+    """
+    stream = b"".join(commands)
+    rows = bytearray()
+    i = 0
+    while i < len(stream):
+        if stream.startswith(ESC_INIT, i):
+            i += len(ESC_INIT)
+        elif stream.startswith(RASTER_HEADER, i):
+            x = stream[i + 4] | (stream[i + 5] << 8)
+            y = stream[i + 6] | (stream[i + 7] << 8)
+            if x != width_bytes:
+                raise ValueError(f"Largura {x} diferente de {width_bytes} bytes no offset {i}")
+            i += 8
+            rows += stream[i:i + x * y]
+            i += x * y
+        elif stream.startswith(FEED, i):
+            rows += bytes(stream[i + 2] * width_bytes)
+            i += 3
+        elif stream.startswith(FOOTER[:2], i):
+            i += 3
+        else:
+            raise ValueError(f"Comando desconhecido no offset {i}: {stream[i:i + 4].hex()}")
+    return bytes(rows)
@@ -0,0 +1,283 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import Vision
+    from Foundation import NSData
+    HAS_VISION = True
+except ImportError:
+    HAS_VISION = False
+
+from haar_cascade import HAAR_CASCADE_PATH, load_cascade
+
+# Backend de detecção: "vision" (macOS), "haar" (NumPy, qualquer sistema), "none" (sem faces). Vazio = automático.
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "")
+# Resultados guardados por hash da imagem (0 desliga)
+DETECTION_CACHE_SIZE = int(os.getenv("FACE_CACHE_SIZE", "64"))
+
+# Regiões de landmarks do pipeline. detect() sem landmarks devolve todas.
+LANDMARKS = ("left_eye", "right_eye", "outer_lips", "nose")
+
+
+def image_key(img):
+    """Hash do conteúdo da imagem (modo, tamanho e pixels) para o cache de detecções."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.mode}:{img.size}".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def _copy_faces(faces):
+    return [{"bbox": list(face["bbox"]), "landmarks": dict(face["landmarks"])} for face in faces]
+
+
+class FaceDetector:
+    """
+    Interface dos detectores de faces. detect_batch() recebe imagens PIL em
+    memória e devolve, para cada uma, a lista de faces no formato do pipeline:
+    {"bbox": [x, y, w, h] normalizado (origem embaixo, como no Vision),
+     "landmarks": {"outer_lips": [[x, y], ...], ...} normalizado dentro da bbox}
+    Só as regiões pedidas em landmarks vêm no resultado. Resultados ficam num
+    cache LRU pelo hash da imagem; os backends implementam _detect_batch().
+    """
+    name = "base"
+
+    def __init__(self, cache_size=DETECTION_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def detect(self, img, landmarks=None):
+        return self.detect_batch([img], landmarks)[0]
+
+    def detect_batch(self, images, landmarks=None):
+        landmarks = tuple(landmarks) if landmarks is not None else LANDMARKS
+        keys = [(image_key(img), landmarks) for img in images] if self.cache_size else [None] * len(images)
+        results = [None] * len(images)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[i] = self._cache[key]
+                    self.hits += 1
+        missing = [i for i, faces in enumerate(results) if faces is None]
+        if missing:
+            detected = self._detect_batch([images[i] for i in missing], landmarks)
+            with self._lock:
+                self.misses += len(missing)
+                for i, faces in zip(missing, detected):
+                    results[i] = faces
+                    if self.cache_size:
+                        self._cache[keys[i]] = faces
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        # Cópias: quem chama pode alterar as faces sem sujar o cache
+        return [_copy_faces(faces) for faces in results]
+
+    def _detect_batch(self, images, landmarks):
+        return [self._detect(img, landmarks) for img in images]
+
+    def _detect(self, img, landmarks):
+        raise NotImplementedError
+
+
+class NullDetector(FaceDetector):
+    """Nunca encontra faces: toda foto recebe a moldura aleatória."""
+    name = "none"
+
+    def __init__(self):
+        super().__init__(cache_size=0)
+
+    def detect_batch(self, images, landmarks=None):
+        return [[] for _ in images]
+
+
+class StubDetector(FaceDetector):
+    """Devolve sempre as mesmas faces. Útil para testar o pipeline fora do macOS."""
+    name = "stub"
+
+    def __init__(self, faces=None):
+        super().__init__(cache_size=0)
+        self.faces = faces or []
+
+    def detect_batch(self, images, landmarks=None):
+        wanted = LANDMARKS if landmarks is None else landmarks
+        faces = [{"bbox": face["bbox"], "landmarks": {k: v for k, v in face.get("landmarks", {}).items() if k in wanted}}
+                 for face in self.faces]
+        return [_copy_faces(faces) for _ in images]
+
+
+class VisionDetector(FaceDetector):
+    """Apple Vision via PyObjC, lendo a imagem de um buffer em memória (sem arquivo temporário)."""
+    name = "vision"
+
+    # Região do pipeline -> atributo do VNFaceLandmarks2D
+    REGIONS = {"left_eye": "leftEye", "right_eye": "rightEye", "outer_lips": "outerLips", "nose": "nose"}
+
+    def _detect(self, img, landmarks):
+        if not HAS_VISION:
+            return []
+
+        try:
+            # Encode rápido em memória só para o Vision decodificar
+            buf = io.BytesIO()
+            img.save(buf, format="PNG", compress_level=1)
+            raw = buf.getvalue()
+            data = NSData.dataWithBytes_length_(raw, len(raw))
+            request_handler = Vision.VNImageRequestHandler.alloc().initWithData_options_(data, None)
+
+            # Sem landmarks pedidos basta o request de retângulos (bem mais rápido)
+            if landmarks:
+                request = Vision.VNDetectFaceLandmarksRequest.new()
+            else:
+                request = Vision.VNDetectFaceRectanglesRequest.new()
+
+            # Tentar performRequests com diferentes assinaturas PyObjC
+            try:
+                res = request_handler.performRequests_error_([request], None)
+                success = res[0] if isinstance(res, (tuple, list)) else res
+            except Exception:
+                res = request_handler.performRequests_error_([request])
+                success = res[0] if isinstance(res, (tuple, list)) else res
+
+            if not success:
+                return []
+
+            # Resultados podem ser método ou propriedade dependendo do ambiente
+            results = request.results() if callable(request.results) else request.results
+            if not results:
+                return []
+
+            faces = []
+            for face in results:
+                # Bounding box também pode variar
+                bbox = face.boundingBox() if callable(face.boundingBox) else face.boundingBox
+                face_data = {"bbox": [bbox.origin.x, bbox.origin.y, bbox.size.width, bbox.size.height], "landmarks": {}}
+
+                if landmarks:
+                    # extrair landmarks de forma segura
+                    landmarks_obj = face.landmarks() if callable(face.landmarks) else face.landmarks
+                    if not landmarks_obj: continue
+                    for region in landmarks:
+                        if region in self.REGIONS:
+                            face_data["landmarks"][region] = self._extract_pts(getattr(landmarks_obj, self.REGIONS[region]))
+                faces.append(face_data)
+            return faces
+        except Exception as e:
+            print(f"Erro na detecção Vision: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    @staticmethod
+    def _extract_pts(region_attr):
+        region = region_attr() if callable(region_attr) else region_attr
+        if not region: return []
+        count = region.pointCount() if callable(region.pointCount) else region.pointCount
+
+        # Tentar normalizedPoints primeiro (mais robusto no PyObjC moderno)
+        try:
+            norm_pts = region.normalizedPoints() if callable(region.normalizedPoints) else region.normalizedPoints
+            return [[norm_pts[i].x, norm_pts[i].y] for i in range(count)]
+        except Exception:
+            # Fallback para pointAtIndex_ caso necessário (embora possa falhar em alguns ambientes)
+            try:
+                return [[pt.x, pt.y] for pt in [region.pointAtIndex_(i) for i in range(count)]]
+            except Exception:
+                return []
+
+
+class HaarDetector(FaceDetector):
+    """
+    Detector em CPU para qualquer sistema: cascata Haar de faces frontais do
+    OpenCV (models/) rodando em NumPy (haar_cascade.py), sem rede. O lote
+    inteiro passa pela cascata junto. Os landmarks vêm de uma forma média
+    dentro da caixa da face; a boca é ajustada para a faixa mais escura da
+    parte de baixo da caixa.
+    """
+    name = "haar"
+
+    # Forma média dentro da caixa da cascata: (centro x, centro y a partir do topo, raio x, raio y)
+    MEAN_SHAPE = {
+        "left_eye": (0.31, 0.38, 0.09, 0.04),
+        "right_eye": (0.69, 0.38, 0.09, 0.04),
+        "nose": (0.5, 0.58, 0.08, 0.08),
+        "outer_lips": (0.5, 0.77, 0.17, 0.05),
+    }
+    SHAPE_POINTS = 8
+    # Faixa (do topo da caixa) onde a boca é procurada e largura central usada
+    MOUTH_SEARCH = (0.68, 0.9)
+    MOUTH_COLUMNS = (0.35, 0.65)
+    # Menor face procurada, em fração da largura da foto (na foto de 384 px: 48 px).
+    # Faces menores ganhariam um cigarro de poucos pixels; cortar as escalas
+    # pequenas é o que mais reduz o tempo da cascata.
+    MIN_FACE_FRACTION = 0.125
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH, cache_size=DETECTION_CACHE_SIZE):
+        super().__init__(cache_size)
+        self.cascade = load_cascade(cascade_path)
+
+    def _detect_batch(self, images, landmarks):
+        grays = [img.convert("L") for img in images]
+        min_face = max(self.cascade.window[0], round(min(g.width for g in grays) * self.MIN_FACE_FRACTION))
+        boxes = self.cascade.detect_batch(grays, min_size=(min_face, min_face))
+        return [[self._face(gray, box, landmarks) for box in found] for gray, found in zip(grays, boxes)]
+
+    def _mouth_y(self, gray, box):
+        x, y, w, h = box
+        top, bottom = (y + round(h * f) for f in self.MOUTH_SEARCH)
+        left, right = (x + round(w * f) for f in self.MOUTH_COLUMNS)
+        rows = np.asarray(gray.crop((left, top, right, bottom)), dtype=np.float32).mean(axis=1)
+        if not len(rows):
+            return self.MEAN_SHAPE["outer_lips"][1]
+        return (top - y + int(np.argmin(rows)) + 0.5) / h
+
+    def _face(self, gray, box, landmarks):
+        x, y, w, h = box
+        width, height = gray.size
+        face = {"bbox": [x / width, 1 - (y + h) / height, w / width, h / height], "landmarks": {}}
+        angles = np.linspace(0, 2 * np.pi, self.SHAPE_POINTS, endpoint=False)
+        for region in landmarks:
+            if region not in self.MEAN_SHAPE:
+                continue
+            cx, cy, rx, ry = self.MEAN_SHAPE[region]
+            if region == "outer_lips":
+                cy = self._mouth_y(gray, box)
+            # Coordenadas do Vision: y cresce para cima dentro da bbox
+            face["landmarks"][region] = [[float(cx + rx * np.cos(a)), float(1 - cy + ry * np.sin(a))] for a in angles]
+        return face
+
+
+DETECTORS = {
+    "vision": VisionDetector,
+    "haar": HaarDetector,
+    "none": NullDetector,
+    "stub": StubDetector,
+}
+
+
+def get_detector(name=None):
+    """
+    Detector configurado (FACE_DETECTOR) ou, se não houver, Vision quando
+    disponível e a cascata Haar em NumPy nos outros sistemas.
+    """
+    name = (name or FACE_DETECTOR or ("vision" if HAS_VISION else "haar")).lower()
+    if name not in DETECTORS:
+        print(f"Detector de faces desconhecido '{name}', usando 'none'.")
+        name = "none"
+    if name == "vision" and not HAS_VISION:
+        print("Apple Vision indisponível neste sistema. Seguindo sem detecção de faces.")
+    if name == "haar":
+        try:
+            return HaarDetector()
+        except (OSError, ValueError) as e:
+            print(f"Cascata Haar indisponível ({e}). Seguindo sem detecção de faces.")
+            return NullDetector()
+    return DETECTORS[name]()
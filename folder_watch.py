@@ -0,0 +1,226 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+
+# Backend do watcher da print_queue: "inotify" (Linux), "kqueue" (macOS/BSD),
+# "polling" ou vazio para escolher o melhor disponível
+WATCH_BACKEND = os.getenv("WATCH_BACKEND", "")
+# Intervalo (s) entre os stat() da pasta no backend de polling
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "0.25"))
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_temp_name(name):
+    """Arquivos ocultos são escritas em andamento (temp+rename) e não entram na fila."""
+    return name.startswith(".")
+
+
+def atomic_write(path, data):
+    """
+    Grava num arquivo oculto na mesma pasta e renomeia para path, de modo que
+    quem observa a pasta só veja o arquivo completo.
+    """
+    folder, name = os.path.split(path)
+    tmp = os.path.join(folder, f".{name}.part")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def list_files(path):
+    """Arquivos prontos na pasta (sem ocultos nem subpastas), em ordem de nome."""
+    with os.scandir(path) as entries:
+        return sorted(e.name for e in entries if not is_temp_name(e.name) and e.is_file())
+
+
+class FolderWatcher:
+    """
+    Avisa quando algo novo aparece na pasta. wait(timeout) retorna True se
+    houve mudança (é hora de listar a pasta) ou False se o tempo acabou.
+    """
+
+    name = "base"
+
+    def __init__(self, path):
+        self.path = path
+
+    async def wait(self, timeout):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(FolderWatcher):
+    """Fallback portátil: compara o mtime da pasta (muda a cada arquivo criado ou renomeado)."""
+
+    name = "polling"
+
+    def __init__(self, path, interval=WATCH_POLL_INTERVAL):
+        super().__init__(path)
+        self.interval = interval
+        self._mtime = self._stat()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    async def wait(self, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            mtime = self._stat()
+            if mtime != self._mtime:
+                self._mtime = mtime
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self.interval, remaining))
+
+
+class _DescriptorWatcher(FolderWatcher):
+    """Watcher baseado num descritor do kernel, registrado no event loop com add_reader."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._changed = None
+        self._loop = None
+
+    def fileno(self):
+        raise NotImplementedError
+
+    def _drain(self):
+        """Lê os eventos pendentes. Retorna True se algum interessa."""
+        raise NotImplementedError
+
+    def _on_readable(self):
+        if self._drain():
+            self._changed.set()
+
+    async def wait(self, timeout):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._changed = asyncio.Event()
+            self._loop.add_reader(self.fileno(), self._on_readable)
+        if not self._changed.is_set():
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        self._changed.clear()
+        return True
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self.fileno())
+            self._loop = None
+
+
+class InotifyWatcher(_DescriptorWatcher):
+    """Linux: inotify via ctypes, acordando em IN_MOVED_TO (rename) e IN_CLOSE_WRITE."""
+
+    name = "inotify"
+
+    def __init__(self, path):
+        super().__init__(path)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), IN_MOVED_TO | IN_CLOSE_WRITE) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch falhou para {path}")
+
+    def fileno(self):
+        return self._fd
+
+    def _drain(self):
+        relevant = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset + IN_EVENT_HEADER.size <= len(data):
+                _, mask, _, length = IN_EVENT_HEADER.unpack_from(data, offset)
+                offset += IN_EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                # Escritas em arquivos ocultos (.part) não contam; o rename final sim
+                if mask & IN_Q_OVERFLOW or not is_temp_name(name):
+                    relevant = True
+
+    def close(self):
+        super().close()
+        os.close(self._fd)
+
+
+class KqueueWatcher(_DescriptorWatcher):
+    """macOS/BSD: kqueue com NOTE_WRITE na pasta (entradas criadas, removidas ou renomeadas)."""
+
+    name = "kqueue"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._dir_fd = os.open(path, getattr(os, "O_EVTONLY", os.O_RDONLY))
+        self._kq = select.kqueue()
+        event = select.kevent(self._dir_fd, filter=select.KQ_FILTER_VNODE,
+                              flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                              fflags=select.KQ_NOTE_WRITE)
+        self._kq.control([event], 0)
+
+    def fileno(self):
+        return self._kq.fileno()
+
+    def _drain(self):
+        return bool(self._kq.control(None, 16, 0))
+
+    def close(self):
+        super().close()
+        self._kq.close()
+        os.close(self._dir_fd)
+
+
+WATCHERS = {
+    "inotify": InotifyWatcher,
+    "kqueue": KqueueWatcher,
+    "polling": PollingWatcher,
+}
+
+
+def default_backend():
+    if sys.platform.startswith("linux"):
+        return "inotify"
+    if hasattr(select, "kqueue"):
+        return "kqueue"
+    return "polling"
+
+
+def create_watcher(path, name=None):
+    """
+    Watcher configurado (WATCH_BACKEND) ou o nativo do sistema. Se o backend
+    não puder ser criado, cai para o polling.
+    """
+    name = (name or WATCH_BACKEND or default_backend()).lower()
+    if name not in WATCHERS:
+        print(f"Watcher desconhecido '{name}', usando 'polling'.")
+        name = "polling"
+    try:
+        return WATCHERS[name](path)
+    except (OSError, AttributeError) as e:
+        print(f"Watcher '{name}' indisponível ({e}). Usando polling da pasta.")
+        return PollingWatcher(path)
@@ -0,0 +1,293 @@
+import functools
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from PIL import Image
+
+# Cascata Haar de faces frontais (formato XML do OpenCV), distribuída em models/
+HAAR_CASCADE_PATH = os.getenv(
+    "HAAR_CASCADE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "haarcascade_frontalface_alt.xml"),
+)
+
+# Parâmetros do detectMultiScale do OpenCV
+SCALE_FACTOR = 1.1
+MIN_NEIGHBORS = 3
+GROUP_EPS = 0.2
+# Primeiras etapas avaliadas na escala inteira, com recortes da integral: elas
+# descartam a maior parte das janelas; as que sobram (de todas as imagens do
+# lote) seguem juntas, por índice
+DENSE_STAGES = 4
+# Janelas avaliadas de uma vez (limita a memória dos índices de cada etapa)
+WINDOW_CHUNK = 32768
+
+
+class HaarCascade:
+    """
+    Cascata Haar com stumps (haarcascade_frontalface_*.xml do OpenCV) avaliada
+    só com NumPy: imagem integral de cada escala da pirâmide, normalização pela
+    variância da janela e, a cada etapa, todas as janelas ainda vivas de uma vez
+    (de todas as imagens do lote). Segue o detectMultiScale do OpenCV, com o
+    mesmo agrupamento dos retângulos.
+    """
+
+    def __init__(self, path=HAAR_CASCADE_PATH):
+        try:
+            root = ET.parse(path).getroot()
+        except ET.ParseError as e:
+            raise ValueError(f"{path}: XML inválido ({e})") from e
+        cascade = root.find("cascade")
+        if cascade is None or cascade.findtext("featureType", "").strip() != "HAAR":
+            raise ValueError(f"{path} não é uma cascata Haar no formato novo do OpenCV")
+        self.window = (int(cascade.findtext("width")), int(cascade.findtext("height")))
+
+        features = []
+        for node in cascade.find("features"):
+            if int(node.findtext("tilted", "0")):
+                raise ValueError(f"{path}: features inclinadas não são suportadas")
+            rects = [[float(v) for v in r.text.split()] for r in node.find("rects")]
+            rects += [[0, 0, 0, 0, 0.0]] * (3 - len(rects))
+            features.append(rects)
+        features = np.array(features, dtype=np.float64)
+
+        self.stages = []
+        for stage in cascade.find("stages"):
+            feature_idx, thresholds, leaves = [], [], []
+            for weak in stage.find("weakClassifiers"):
+                nodes = weak.findtext("internalNodes").split()
+                if len(nodes) != 4:
+                    raise ValueError(f"{path}: só cascatas de stumps são suportadas")
+                feature_idx.append(int(nodes[2]))
+                thresholds.append(float(nodes[3]))
+                leaves.append([float(v) for v in weak.findtext("leafValues").split()])
+            rects = features[feature_idx]
+            # Retângulos com peso, em lista: soma (janelas, retângulos) @ pesos (retângulos, features)
+            used = np.nonzero(rects[:, :, 4])
+            flat = rects[used]
+            weights = np.zeros((len(flat), len(feature_idx)), dtype=np.float32)
+            weights[np.arange(len(flat)), used[0]] = flat[:, 4]
+            self.stages.append({
+                "threshold": float(stage.findtext("stageThreshold")),
+                "x": rects[:, :, 0].astype(np.int64),
+                "y": rects[:, :, 1].astype(np.int64),
+                "w": rects[:, :, 2].astype(np.int64),
+                "h": rects[:, :, 3].astype(np.int64),
+                "weight": rects[:, :, 4].astype(np.float32),
+                "node_threshold": np.array(thresholds, dtype=np.float32),
+                "leaves": np.array(leaves, dtype=np.float32),
+                "rect_x": flat[:, 0].astype(np.int32),
+                "rect_y": flat[:, 1].astype(np.int32),
+                "rect_w": flat[:, 2].astype(np.int32),
+                "rect_h": flat[:, 3].astype(np.int32),
+                "rect_weights": weights,
+            })
+
+    def _levels(self, grays, scale_factor, min_size, max_size):
+        """
+        Escalas da pirâmide como no OpenCV, para imagens do mesmo tamanho:
+        (fator, imagens reduzidas empilhadas) para cada janela dentro dos limites.
+        """
+        width, height = grays[0].size
+        win_w, win_h = self.window
+        factor = 1.0
+        while True:
+            scaled = (round(width / factor), round(height / factor))
+            window = (round(win_w * factor), round(win_h * factor))
+            if scaled[0] <= win_w or scaled[1] <= win_h:
+                return
+            if max_size and (window[0] > max_size[0] or window[1] > max_size[1]):
+                return
+            if window[0] >= min_size[0] and window[1] >= min_size[1]:
+                levels = [g if factor == 1.0 else g.resize(scaled, Image.Resampling.BILINEAR) for g in grays]
+                yield factor, np.stack([np.asarray(level) for level in levels])
+            factor *= scale_factor
+
+    def _grid(self, table, dx, dy, shape, step):
+        """table[..., y + dy, x + dx] para todas as posições (x, y) da grade de janelas, sem copiar."""
+        ny, nx = shape[-2:]
+        return table[..., dy:dy + (ny - 1) * step + 1:step, dx:dx + (nx - 1) * step + 1:step]
+
+    def _dense_stage(self, integral, stage, norm, step):
+        """Máscara das janelas de uma escala inteira que passam na etapa (recortes da integral, sem índices)."""
+        shape = norm.shape
+        score = np.zeros(shape, dtype=np.float32)
+        for f, threshold in enumerate(stage["node_threshold"]):
+            value = np.zeros(shape, dtype=np.float32)
+            for r in range(3):
+                weight = stage["weight"][f, r]
+                if not weight:
+                    continue
+                x, y, w, h = stage["x"][f, r], stage["y"][f, r], stage["w"][f, r], stage["h"][f, r]
+                box = (self._grid(integral, x + w, y + h, shape, step) - self._grid(integral, x, y + h, shape, step) -
+                       self._grid(integral, x + w, y, shape, step) + self._grid(integral, x, y, shape, step))
+                value += weight * box.astype(np.float32)
+            left, right = stage["leaves"][f]
+            score += np.where(value >= threshold * norm, right, left)
+        return score >= stage["threshold"]
+
+    def _windows(self, images, scale_factor, min_size, max_size):
+        """
+        Janelas que passam pelas primeiras DENSE_STAGES etapas, de todas as
+        escalas de todas as imagens: integrais concatenadas num vetor só e, por
+        janela, (início na integral, largura da linha, fator de variância,
+        imagem, fator de escala, x, y). Imagens do mesmo tamanho passam juntas
+        pelas etapas densas.
+        """
+        win_w, win_h = self.window
+        area = (win_w - 2) * (win_h - 2)
+        by_size = {}
+        for index, gray in enumerate(images):
+            by_size.setdefault(gray.size, []).append(index)
+
+        canvas, columns = [], []
+        offset = 0
+        for indices in by_size.values():
+            owners = np.array(indices, dtype=np.int64)
+            grays = [images[i] for i in indices]
+            for factor, level in self._levels(grays, scale_factor, min_size, max_size):
+                n, h, w = level.shape
+                # int32 basta até ~8 MP e deixa as leituras mais leves
+                integral = np.zeros((n, h + 1, w + 1), dtype=np.int32 if h * w * 255 < 2 ** 31 else np.int64)
+                integral[:, 1:, 1:] = level.cumsum(1).cumsum(2)
+                squares = np.zeros((n, h + 1, w + 1))
+                squares[:, 1:, 1:] = np.square(level, dtype=np.float64).cumsum(1).cumsum(2)
+
+                step = 1 if factor > 2 else 2
+                shape = (n, len(range(0, h - win_h, step)), len(range(0, w - win_w, step)))
+                if not shape[1] or not shape[2]:
+                    continue
+
+                # Variância na janela sem a borda de 1 pixel, como o OpenCV
+                def inner_sum(table):
+                    return (self._grid(table, win_w - 1, win_h - 1, shape, step) -
+                            self._grid(table, 1, win_h - 1, shape, step) -
+                            self._grid(table, win_w - 1, 1, shape, step) + self._grid(table, 1, 1, shape, step))
+
+                total = inner_sum(integral).astype(np.float64)
+                norm = area * inner_sum(squares) - total * total
+                norm = np.where(norm > 0, np.sqrt(np.maximum(norm, 0)), 1.0).astype(np.float32)
+
+                alive = np.ones(shape, dtype=bool)
+                for stage in self.stages[:DENSE_STAGES]:
+                    alive &= self._dense_stage(integral, stage, norm, step)
+                bs, ys, xs = np.nonzero(alive)
+                if not len(ys):
+                    continue
+                ys, xs = ys * step, xs * step
+
+                stride = w + 1
+                columns.append((
+                    offset + bs * (h + 1) * stride + ys * stride + xs,
+                    np.full(len(ys), stride, dtype=np.int64),
+                    norm[alive],
+                    owners[bs],
+                    np.full(len(ys), factor),
+                    xs,
+                    ys,
+                ))
+                canvas.append(integral.ravel())
+                offset += integral.size
+        if not canvas:
+            return None, None
+        windows = [np.concatenate(parts) for parts in zip(*columns)]
+        return np.concatenate(canvas), windows
+
+    def _rect_sums(self, canvas, base, stride, stage):
+        """Soma ponderada dos retângulos de cada feature da etapa, para cada janela: (janelas, features)."""
+        s = stride[:, None]
+        top = base[:, None] + stage["rect_y"] * s
+        bottom = top + stage["rect_h"] * s
+        x0, x1 = stage["rect_x"], stage["rect_x"] + stage["rect_w"]
+        sums = canvas[bottom + x1] - canvas[bottom + x0] - canvas[top + x1] + canvas[top + x0]
+        return sums.astype(np.float32) @ stage["rect_weights"]
+
+    def _evaluate(self, canvas, base, stride, norm):
+        """Índices das janelas que passam pelas etapas restantes."""
+        alive = np.arange(len(base))
+        for stage in self.stages[DENSE_STAGES:]:
+            if not len(alive):
+                break
+            values = self._rect_sums(canvas, base[alive], stride[alive], stage)
+            right = values >= stage["node_threshold"] * norm[alive, None]
+            score = np.where(right, stage["leaves"][:, 1], stage["leaves"][:, 0]).sum(axis=1)
+            alive = alive[score >= stage["threshold"]]
+        return alive
+
+    def detect_batch(self, images, scale_factor=SCALE_FACTOR, min_neighbors=MIN_NEIGHBORS,
+                     min_size=(30, 30), max_size=None):
+        """
+        Faces em cada imagem (PIL em tons de cinza) do lote, como listas de
+        (x, y, w, h) em pixels com origem no canto superior esquerdo.
+        """
+        canvas, windows = self._windows(images, scale_factor, min_size, max_size)
+        if canvas is None:
+            return [[] for _ in images]
+        base, stride, norm, owner, factors, xs, ys = windows
+        hits = []
+        for start in range(0, len(base), WINDOW_CHUNK):
+            chunk = slice(start, start + WINDOW_CHUNK)
+            hits.append(start + self._evaluate(canvas, base[chunk], stride[chunk], norm[chunk]))
+        hits = np.concatenate(hits)
+
+        win_w, win_h = self.window
+        candidates = [[] for _ in images]
+        for i in hits:
+            f = factors[i]
+            candidates[owner[i]].append((round(xs[i] * f), round(ys[i] * f), round(win_w * f), round(win_h * f)))
+        return [group_rectangles(rects, min_neighbors) for rects in candidates]
+
+
+def group_rectangles(rects, min_neighbors=MIN_NEIGHBORS, eps=GROUP_EPS):
+    """
+    Junta detecções vizinhas (cv::groupRectangles): agrupa retângulos
+    parecidos, descarta grupos com até min_neighbors membros, tira a média e
+    remove os que estão dentro de um grupo maior.
+    """
+    if not rects:
+        return []
+    r = np.array(rects, dtype=np.float64)
+    x, y, w, h = r.T
+    delta = eps * (np.minimum.outer(w, w) + np.minimum.outer(h, h)) * 0.5
+    similar = ((np.abs(np.subtract.outer(x, x)) <= delta) & (np.abs(np.subtract.outer(y, y)) <= delta) &
+               (np.abs(np.subtract.outer(x + w, x + w)) <= delta) & (np.abs(np.subtract.outer(y + h, y + h)) <= delta))
+
+    # Componentes conexos (union-find) da relação de semelhança
+    parent = list(range(len(rects)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(*np.nonzero(np.triu(similar, 1))):
+        parent[find(i)] = find(j)
+    labels = np.array([find(i) for i in range(len(rects))])
+
+    groups = []
+    for label in np.unique(labels):
+        members = r[labels == label]
+        if len(members) > min_neighbors:
+            groups.append((np.round(members.mean(axis=0)).astype(int), len(members)))
+
+    result = []
+    for i, (r1, n1) in enumerate(groups):
+        inside = False
+        for j, (r2, n2) in enumerate(groups):
+            if i == j:
+                continue
+            dx, dy = round(r2[2] * eps), round(r2[3] * eps)
+            if (r1[0] >= r2[0] - dx and r1[1] >= r2[1] - dy and
+                    r1[0] + r1[2] <= r2[0] + r2[2] + dx and r1[1] + r1[3] <= r2[1] + r2[3] + dy and
+                    (n2 > max(3, n1) or n1 < 3)):
+                inside = True
+                break
+        if not inside:
+            result.append(tuple(int(v) for v in r1))
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def load_cascade(path=HAAR_CASCADE_PATH):
+    return HaarCascade(path)
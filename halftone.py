@@ -0,0 +1,197 @@
+import functools
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Formatos de ponto e modos suportados pelo motor de halftone
+DOT_SHAPES = ("round", "line", "diamond")
+MODES = ("dots", "ordered", "diffusion")
+
+# Raio mínimo para desenhar um ponto (mesmo limiar do loop original)
+MIN_RADIUS = 0.4
+
+# Matriz de Bayer 4x4 normalizada para o dither ordenado
+BAYER_4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], dtype=np.float64)
+
+
+def dot_radius(avg, sample):
+    """
+    Raio do ponto para o brilho médio de uma célula.
+    Mesma fórmula da versão original: mais escuro = ponto maior.
+    """
+    ratio = 1 - (avg / 255.0)
+    return (sample / 1.5) * (ratio ** 1.2)
+
+
+def dot_stamp(radius, sample, shape="round", top=False, left=False):
+    """
+    Bitmap de um ponto de raio `radius` como offsets (dy, dx) dos pixels pretos,
+    relativos ao canto superior esquerdo da célula.
+    O ponto é desenhado com o próprio ImageDraw, então o resultado é idêntico
+    ao de desenhar diretamente na imagem final. Na primeira linha/coluna (top/left)
+    o ImageDraw recorta coordenadas negativas de outro jeito, então a célula é
+    desenhada na origem, exatamente como no desenho direto.
+    """
+    margin = sample
+    size = sample + 2 * margin
+    oy = 0 if top else margin
+    ox = 0 if left else margin
+    stamp = Image.new("L", (size, size), 255)
+    draw = ImageDraw.Draw(stamp)
+
+    cx = ox + (sample / 2.0)
+    cy = oy + (sample / 2.0)
+    if shape == "round":
+        draw.ellipse([cx - radius, cy - radius, cx + radius, cy + radius], fill=0)
+    elif shape == "line":
+        draw.rectangle([ox, cy - radius, ox + sample - 1, cy + radius], fill=0)
+    elif shape == "diamond":
+        draw.polygon([(cx, cy - radius), (cx + radius, cy), (cx, cy + radius), (cx - radius, cy)], fill=0)
+    else:
+        raise ValueError(f"Formato de ponto desconhecido: {shape}")
+
+    ys, xs = np.nonzero(np.asarray(stamp) == 0)
+    return tuple(zip((ys - oy).tolist(), (xs - ox).tolist()))
+
+
+class DotTable:
+    """
+    Tabela pré-calculada (soma, contagem da célula) -> bitmap do ponto, para um
+    sample e formato. Bitmaps iguais são compartilhados, então a tabela de
+    cobertura por offset fica pequena. É preenchida sob demanda e reaproveitada
+    entre fotos.
+    """
+    # Variantes de borda: (primeira linha, primeira coluna)
+    VARIANTS = ((False, False), (False, True), (True, False), (True, True))
+
+    def __init__(self, sample, shape):
+        if shape not in DOT_SHAPES:
+            raise ValueError(f"Formato de ponto desconhecido: {shape}")
+        self.sample = sample
+        self.shape = shape
+        self.stride = sample * sample + 1
+        self.key_bitmap = {variant: {} for variant in self.VARIANTS}
+        self.radius_bitmap = {}
+        self.bitmaps = []
+        self._bitmap_index = {}
+        self._covers = None
+
+    def _bitmap_for(self, key, variant):
+        total, count = divmod(key, self.stride)
+        radius = dot_radius(total / count, self.sample)
+        if radius <= MIN_RADIUS:
+            return -1
+        cache_key = (radius, variant)
+        if cache_key not in self.radius_bitmap:
+            offsets = dot_stamp(radius, self.sample, self.shape, *variant)
+            if offsets not in self._bitmap_index:
+                self._bitmap_index[offsets] = len(self.bitmaps)
+                self.bitmaps.append(offsets)
+                self._covers = None
+            self.radius_bitmap[cache_key] = self._bitmap_index[offsets]
+        return self.radius_bitmap[cache_key]
+
+    def lookup(self, keys, variant):
+        """Ids de bitmap (-1 = sem ponto) para um array de chaves únicas."""
+        table = self.key_bitmap[variant]
+        return np.array([table[k] if k in table else table.setdefault(k, self._bitmap_for(k, variant))
+                         for k in keys.tolist()], dtype=np.int64)
+
+    def covers(self):
+        """Para cada offset (dy, dx), quais bitmaps pintam esse pixel."""
+        if self._covers is None:
+            covers = {}
+            for b, offsets in enumerate(self.bitmaps):
+                for offset in offsets:
+                    covers.setdefault(offset, np.zeros(len(self.bitmaps), dtype=bool))[b] = True
+            self._covers = covers
+        return self._covers
+
+
+@functools.lru_cache(maxsize=None)
+def dot_table(sample, shape="round"):
+    return DotTable(sample, shape)
+
+
+def cell_sums(gray, sample):
+    """
+    Soma e contagem de pixels de cada célula sample x sample (block-reduce único).
+    As células da borda direita/inferior podem ser menores, como no crop original.
+    """
+    h, w = gray.shape
+    rows = np.arange(0, h, sample)
+    cols = np.arange(0, w, sample)
+    sums = np.add.reduceat(np.add.reduceat(gray.astype(np.int64), rows, axis=0), cols, axis=1)
+    row_counts = np.minimum(rows + sample, h) - rows
+    col_counts = np.minimum(cols + sample, w) - cols
+    counts = np.outer(row_counts, col_counts)
+    return sums, counts
+
+
+def _halftone_dots(gray, sample, shape):
+    h, w = gray.shape
+    table = dot_table(sample, shape)
+
+    # Média exata de cada célula como (soma, contagem), igual ao ImageStat.mean antigo
+    sums, counts = cell_sums(gray, sample)
+    keys = sums * table.stride + counts
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.reshape(keys.shape)
+
+    # Bitmap de cada célula, usando a variante de borda na primeira linha/coluna
+    cell_bitmap = table.lookup(unique_keys, (False, False))[inverse]
+    cell_bitmap[0, 1:] = table.lookup(unique_keys, (True, False))[inverse[0, 1:]]
+    cell_bitmap[1:, 0] = table.lookup(unique_keys, (False, True))[inverse[1:, 0]]
+    cell_bitmap[0, 0] = table.lookup(unique_keys[[inverse[0, 0]]], (True, True))[0]
+
+    cy, cx = np.nonzero(cell_bitmap >= 0)
+    bitmap = cell_bitmap[cy, cx]
+
+    # Tela com margem, já que os pontos podem vazar da célula
+    margin = sample
+    out = np.full((h + 2 * margin, w + 2 * margin), 255, dtype=np.uint8)
+    ys = cy * sample + margin
+    xs = cx * sample + margin
+
+    # Uma atribuição vetorizada por offset do carimbo em vez de um desenho por célula
+    for (dy, dx), painted in table.covers().items():
+        hit = painted[bitmap]
+        out[ys[hit] + dy, xs[hit] + dx] = 0
+
+    return out[margin:margin + h, margin:margin + w]
+
+
+def _ordered_dither(gray, sample):
+    h, w = gray.shape
+    # A matriz é ampliada para o tamanho da célula, assim `sample` controla a granulação
+    k = max(1, sample // 2)
+    threshold = (np.kron(BAYER_4, np.ones((k, k))) + 0.5) * (255.0 / 16)
+    n = threshold.shape[0]
+    tiled = np.tile(threshold, (h // n + 1, w // n + 1))[:h, :w]
+    return np.where(gray > tiled, 255, 0).astype(np.uint8)
+
+
+def apply_halftone(img, sample=3, shape="round", mode="dots"):
+    """
+    Aplica halftone na imagem e retorna uma imagem "L" (preto e branco).
+    mode="dots": pontos por célula (shape: round, line, diamond).
+    mode="ordered": dither ordenado (Bayer).
+    mode="diffusion": difusão de erro (Floyd-Steinberg do Pillow).
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo de halftone desconhecido: {mode}")
+
+    img = img.convert("L")
+    if mode == "diffusion":
+        return img.convert("1").convert("L")
+
+    gray = np.asarray(img)
+    if mode == "ordered":
+        return Image.fromarray(_ordered_dither(gray, sample), "L")
+
+    return Image.fromarray(_halftone_dots(gray, sample, shape), "L")
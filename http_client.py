@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Timeout padrão (segundos) e tentativas para chamadas ao servidor remoto
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+# Lote de status: intervalo máximo de espera e tamanho máximo por POST
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "0.25"))
+STATUS_MAX_BATCH = 50
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session com timeout padrão em todas as chamadas."""
+
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, pool_size=HTTP_POOL_SIZE):
+    """
+    Sessão keep-alive (reaproveita a conexão TCP+TLS do tunnel) com retry e
+    backoff exponencial para erros de conexão e 502/503/504.
+    """
+    session = TimeoutSession(timeout)
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST", "DELETE"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Sessão compartilhada pelo processo (o pool de conexões é thread-safe)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+class StatusBatcher:
+    """
+    Junta as mudanças de status e manda várias de uma vez em POST /status/batch,
+    em vez de uma ida e volta pelo tunnel por transição.
+    Cada atualização leva há quantos segundos aconteceu (relógio monotônico
+    deste processo); o servidor converte para o relógio dele, então um relógio
+    local errado não atrapalha, e um status antigo que chegou atrasado no lote
+    não sobrescreve um mais novo.
+    Se o servidor não tiver o endpoint de lote, cai para um POST por arquivo.
+    Uma atualização pode levar as etapas do job medidas neste processo (trace).
+    """
+
+    def __init__(self, base_url, session=None, flush_interval=STATUS_FLUSH_INTERVAL, max_batch=STATUS_MAX_BATCH, label="Status"):
+        self.base_url = base_url
+        self.session = session or get_session()
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.label = label
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._batch_supported = True
+        self._thread = threading.Thread(target=self._loop, name="status-batcher", daemon=True)
+        self._thread.start()
+
+    def update(self, filename, status, trace=None):
+        item = {"filename": filename, "status": status, "at": time.monotonic()}
+        if trace is not None:
+            item["trace"] = trace
+        with self._cond:
+            self._pending.append(item)
+            self._cond.notify()
+        print(f"{self.label} [{filename}]: {status}")
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            # Espera um pouco para juntar as transições que vierem logo em seguida
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._cond:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if not batch:
+            return
+        try:
+            self._send(batch)
+        except requests.HTTPError as e:
+            if e.response is not None and 400 <= e.response.status_code < 500:
+                # O servidor recusou o lote: tentar de novo não muda nada e travaria os próximos status
+                print(f"Servidor recusou {len(batch)} status ({e}). Lote descartado.")
+                return
+            self._requeue(batch, e)
+        except Exception as e:
+            self._requeue(batch, e)
+
+    def _requeue(self, batch, error):
+        """Erro de conexão ou 5xx: o lote volta para o começo da fila."""
+        print(f"Erro ao atualizar status remoto: {error}")
+        # A próxima rodada tenta de novo (o retry da sessão já fez backoff)
+        with self._cond:
+            self._pending[:0] = batch
+        time.sleep(self.flush_interval)
+
+    def _send(self, batch):
+        if self._batch_supported:
+            now = time.monotonic()
+            updates = []
+            for item in batch:
+                update = {key: value for key, value in item.items() if key != "at"}
+                update["age"] = max(0.0, now - item["at"])
+                updates.append(update)
+            response = self.session.post(f"{self.base_url}/status/batch", json={"updates": updates})
+            # Servidor antigo: "batch" cai na rota /status/<filename> e não responde "applied"
+            # (ou nem tem a rota); aí os status vão um a um
+            if response.status_code not in (404, 405):
+                response.raise_for_status()
+                try:
+                    if "applied" in response.json():
+                        return
+                except ValueError:
+                    pass
+            print("Servidor sem /status/batch. Enviando status um a um.")
+            self._batch_supported = False
+        for item in batch:
+            payload = {key: item[key] for key in ("status", "trace") if key in item}
+            self.session.post(f"{self.base_url}/status/{item['filename']}", json=payload)
+
+    def close(self):
+        """Envia o que falta e encerra a thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=self.flush_interval + HTTP_TIMEOUT)
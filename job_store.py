@@ -0,0 +1,274 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Backend do armazenamento de jobs: "memory" (padrão) ou "sqlite" (sobrevive a um crash)
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.db")
+
+# Por quanto tempo (s) um job finalizado continua consultável antes de expirar
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+# Jobs que nunca finalizam (pendentes ou ativos sem status novo, ex.: arquivo
+# perdido ou impressora desligada no meio) expiram depois deste tempo parados
+JOB_STALE_TTL = float(os.getenv("JOB_STALE_TTL", "86400"))
+EXPIRE_INTERVAL = 60
+
+# Estados do job no servidor
+PENDING = "pending"    # enviado, esperando a bridge
+ACTIVE = "active"      # a bridge já pegou, esperando o status final
+DONE = "done"          # chegou em "Pronto" ou erro, expira depois de JOB_TTL
+STATES = (PENDING, ACTIVE, DONE)
+
+
+def is_final_status(status):
+    return status == "Pronto" or "Erro" in status
+
+
+class JobStore:
+    """
+    Jobs, estados e histórico de status em memória, com um índice por estado:
+    /pending percorre só os pendentes e /status e /processed são buscas em dict.
+    Cada job tem um número de sequência (ordem de chegada) usado pelo /jobs/stream.
+    """
+    persistent = False
+
+    def __init__(self, ttl=JOB_TTL, stale_ttl=JOB_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # Chamado com o nome de cada job expirado (ex.: apagar o upload que sobrou)
+        self.expired_handler = None
+        self._lock = threading.RLock()
+        self._jobs = {}
+        # Em cada estado, os arquivos na ordem em que entraram nele
+        self._by_state = {state: OrderedDict() for state in STATES}
+        self._seq = 0
+        self._next_expire = 0
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def _new_record(self, filename, state, seq=0, created=None):
+        record = {
+            "filename": filename,
+            "seq": seq,
+            "state": state,
+            "status": None,
+            "created": created or time.time(),
+            "updated": 0,
+            "history": [],
+        }
+        self._jobs[filename] = record
+        self._by_state[state][filename] = None
+        return record
+
+    def _move(self, record, state):
+        if record["state"] != state:
+            del self._by_state[record["state"]][record["filename"]]
+            self._by_state[state][record["filename"]] = None
+            record["state"] = state
+
+    def add(self, filename):
+        """Registra um upload como pendente. Retorna o número de sequência do job."""
+        with self._lock:
+            record = self._jobs.get(filename)
+            if record is None or record["state"] != PENDING:
+                self._seq += 1
+                if record is None:
+                    record = self._new_record(filename, PENDING, self._seq)
+                else:
+                    record["seq"] = self._seq
+                    self._move(record, PENDING)
+                self._saved(record)
+            return record["seq"]
+
+    def set_status(self, filename, status, ts=None):
+        """
+        Grava o status. Com ts, ignora a atualização se já existe uma mais nova.
+        ts nunca passa de agora: um horário no futuro bloquearia as próximas
+        atualizações do arquivo e atrasaria a expiração.
+        """
+        now = time.time()
+        ts = now if ts is None else min(ts, now)
+        with self._lock:
+            record = self._jobs.get(filename)
+            if record is None:
+                # Status de um arquivo que o servidor não recebeu (ex.: reiniciou sem persistência)
+                record = self._new_record(filename, ACTIVE, created=ts)
+            elif record["updated"] > ts:
+                return False
+            record["status"] = status
+            record["updated"] = ts
+            record["history"].append((ts, status))
+            if record["state"] != PENDING:
+                self._move(record, DONE if is_final_status(status) else ACTIVE)
+            self._saved(record, (ts, status))
+            self._maybe_expire(now)
+            return True
+
+    def get_status(self, filename):
+        with self._lock:
+            record = self._jobs.get(filename)
+            return record["status"] if record else None
+
+    def history(self, filename):
+        """Lista de (ts, status) na ordem em que foram aplicados."""
+        with self._lock:
+            record = self._jobs.get(filename)
+            return list(record["history"]) if record else []
+
+    def version(self, filename):
+        """Muda toda vez que o status do arquivo muda."""
+        with self._lock:
+            record = self._jobs.get(filename)
+            return len(record["history"]) if record else 0
+
+    def mark_processed(self, filename):
+        """A bridge terminou de processar: o job sai da lista de pendentes."""
+        with self._lock:
+            record = self._jobs.get(filename)
+            if record is None or record["state"] != PENDING:
+                return False
+            self._move(record, DONE if record["status"] and is_final_status(record["status"]) else ACTIVE)
+            self._saved(record)
+            return True
+
+    def pending(self):
+        with self._lock:
+            return list(self._by_state[PENDING])
+
+    def pending_since(self, seq):
+        """Pares (seq, filename) dos pendentes com sequência maior que seq, em ordem."""
+        with self._lock:
+            jobs = ((self._jobs[f]["seq"], f) for f in self._by_state[PENDING])
+            return sorted(job for job in jobs if job[0] > seq)
+
+    def count(self, state=None):
+        with self._lock:
+            return len(self._by_state[state]) if state else len(self._jobs)
+
+    def _maybe_expire(self, now):
+        if now >= self._next_expire:
+            self._next_expire = now + EXPIRE_INTERVAL
+            self.expire(now)
+
+    def expire(self, now=None):
+        """
+        Remove os jobs finalizados há mais de ttl segundos e os pendentes ou
+        ativos parados há mais de stale_ttl. Retorna quantos saíram.
+        """
+        now = now or time.time()
+        cutoff = now - self.ttl
+        expired = []
+        with self._lock:
+            done = self._by_state[DONE]
+            # O índice está na ordem em que os jobs finalizaram: basta olhar o começo
+            while done:
+                filename = next(iter(done))
+                if self._jobs[filename]["updated"] > cutoff:
+                    break
+                del done[filename]
+                del self._jobs[filename]
+                expired.append(filename)
+            # Pendentes e ativos mudam de status sem sair do lugar no índice: percorre todos
+            stale_cutoff = now - self.stale_ttl
+            for state in (PENDING, ACTIVE):
+                jobs = self._by_state[state]
+                for filename in [f for f in jobs if max(self._jobs[f]["created"], self._jobs[f]["updated"]) <= stale_cutoff]:
+                    del jobs[filename]
+                    del self._jobs[filename]
+                    expired.append(filename)
+            if expired:
+                self._deleted(expired)
+        if self.expired_handler:
+            for filename in expired:
+                self.expired_handler(filename)
+        return len(expired)
+
+    # Ganchos de persistência (o armazenamento em memória não grava nada)
+    def _saved(self, record, status=None):
+        pass
+
+    def _deleted(self, filenames):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteJobStore(JobStore):
+    """
+    JobStore que também grava cada mudança num SQLite em modo WAL e recarrega
+    tudo ao iniciar, para não perder a fila se o servidor cair no meio do evento.
+    As leituras continuam sendo feitas na memória.
+    """
+    persistent = True
+
+    def __init__(self, path=JOB_STORE_PATH, ttl=JOB_TTL, stale_ttl=JOB_STALE_TTL):
+        super().__init__(ttl, stale_ttl)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "filename TEXT PRIMARY KEY, seq INTEGER, state TEXT, status TEXT, created REAL, updated REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS history (filename TEXT, ts REAL, status TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS history_filename ON history (filename)")
+        self._load()
+
+    def _load(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT filename, seq, state, status, created, updated FROM jobs ORDER BY updated"
+            ).fetchall()
+            for filename, seq, state, status, created, updated in rows:
+                record = self._new_record(filename, state if state in STATES else ACTIVE, seq, created)
+                record["status"] = status
+                record["updated"] = updated or 0
+                self._seq = max(self._seq, seq)
+            # Pendentes voltam na ordem de chegada
+            pending = self._by_state[PENDING]
+            for filename in sorted(pending, key=lambda f: self._jobs[f]["seq"]):
+                pending.move_to_end(filename)
+            for filename, ts, status in self._db.execute("SELECT filename, ts, status FROM history ORDER BY rowid"):
+                if filename in self._jobs:
+                    self._jobs[filename]["history"].append((ts, status))
+        self.expire()
+
+    def _saved(self, record, status=None):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (filename, seq, state, status, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (record["filename"], record["seq"], record["state"], record["status"], record["created"], record["updated"]),
+            )
+            if status:
+                self._db.execute(
+                    "INSERT INTO history (filename, ts, status) VALUES (?, ?, ?)", (record["filename"], *status)
+                )
+
+    def _deleted(self, filenames):
+        rows = [(f,) for f in filenames]
+        with self._db:
+            self._db.executemany("DELETE FROM jobs WHERE filename = ?", rows)
+            self._db.executemany("DELETE FROM history WHERE filename = ?", rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_job_store(backend=None):
+    """Armazenamento configurado em JOB_STORE ("memory" ou "sqlite")."""
+    backend = (backend or JOB_STORE).lower()
+    if backend == "sqlite":
+        return SQLiteJobStore()
+    if backend != "memory":
+        logger.warning(f"Armazenamento de jobs desconhecido '{backend}', usando 'memory'.")
+    return JobStore()
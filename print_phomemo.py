@@ -3,9 +3,11 @@ import sys
 import time
 import os
 import shutil
-import requests
+from collections import deque
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
 from bleak import BleakScanner, BleakClient
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+from PIL import Image, ImageDraw
 
 # For PDF support (optional if pymupdf is installed)
 try:
@@ -15,6 +17,17 @@ except ImportError:
 
 from dotenv import load_dotenv
 
+from assets import get_asset, warm_up, asset_version
+from http_client import get_session, StatusBatcher
+from ble_transmit import BleTransmitter, BLE_RATE
+from escpos import encode_raster
+from text_layout import fit_text, font_id
+from render_cache import RenderCache, render_key
+from folder_watch import create_watcher, list_files
+from printer_state import PrinterState, StateTracker
+from print_spooler import PrintSpooler
+import tracing
+
 load_dotenv()
 
 # UUIDs discovered
@@ -27,28 +40,63 @@ PRINTER_WIDTH = 384
 # Directions
 WATCH_DIR = "print_queue"
 PROCESSED_DIR = os.path.join(WATCH_DIR, "processed")
+# Dead letter: arquivos que falharam PRINT_SPOOL_MAX_ATTEMPTS vezes
+FAILED_DIR = os.path.join(WATCH_DIR, "failed")
 
 def ensure_directories():
-    if not os.path.exists(WATCH_DIR):
-        os.makedirs(WATCH_DIR)
-    if not os.path.exists(PROCESSED_DIR):
-        os.makedirs(PROCESSED_DIR)
+    for folder in (WATCH_DIR, PROCESSED_DIR, FAILED_DIR):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
 
 ensure_directories()
 
 # Text Rendering Settings
 TEXT_FONT_SIZE = 24 # Reduzido um pouco para caber melhor na moldura
-TEXT_FONT_PATH = "/System/Library/Fonts/Helvetica.ttc"
+# Fonte configurável em TEXT_FONT_PATH (ver text_layout.py), com fallback para Linux
 FRAME_PATH = "png/frame.png"
 
+# Pipeline de impressão: quantos jobs já renderizados podem esperar pelo envio BLE
+PRINT_PIPELINE_DEPTH = int(os.getenv("PRINT_PIPELINE_DEPTH", "1"))
+# Páginas de PDF renderizadas à frente da impressora (memória limitada)
+PDF_PREFETCH_PAGES = int(os.getenv("PDF_PREFETCH_PAGES", "2"))
+# A fila é listada quando o watcher avisa de um arquivo novo; esta varredura
+# completa (s) é só uma rede de segurança para eventos perdidos
+QUEUE_RESCAN_INTERVAL = 30
+
+# Renders prontos por hash do conteúdo (mensagens repetidas e reimpressões)
+render_cache = RenderCache()
+
 # Remote Status Config
 REMOTE_SERVER_URL = os.getenv("REMOTE_SERVER_URL", "http://localhost:5001")
 
-def update_remote_status(filename, status):
+# Status enviados em lote pela sessão keep-alive compartilhada
+_status_batcher = None
+
+# No modo tudo-em-um (barzar_all.py) os status vão direto para o servidor do mesmo processo
+_status_handler = None
+
+def set_status_handler(handler):
+    """
+    Sends status updates to handler(filename, status) instead of the remote
+    server. Updates that carry the job's stage timings are sent as
+    handler(filename, status, trace=exported_trace).
+    """
+    global _status_handler
+    _status_handler = handler
+
+def update_remote_status(filename, status, trace=None):
+    global _status_batcher
+    exported = trace.export() if trace else None
+    if _status_handler:
+        if exported is None:
+            _status_handler(filename, status)
+        else:
+            _status_handler(filename, status, trace=exported)
+        return
     try:
-        url = f"{REMOTE_SERVER_URL}/status/{filename}"
-        requests.post(url, json={"status": status})
-        print(f"Status Remoto [{filename}]: {status}")
+        if _status_batcher is None:
+            _status_batcher = StatusBatcher(REMOTE_SERVER_URL, get_session(), label="Status Remoto")
+        _status_batcher.update(filename, status, exported)
     except Exception as e:
         print(f"Erro ao atualizar status remoto: {e}")
 
@@ -58,11 +106,12 @@ def text_to_image(text, width=PRINTER_WIDTH):
     """
     # 1. Carregar e preparar a moldura
     try:
-        frame = Image.open(FRAME_PATH).convert("RGBA")
+        # Moldura já decodificada e redimensionada vem do cache de assets
+        frame = get_asset(FRAME_PATH)
         # Redimensionar mantendo a proporção para a largura da impressora
         aspect = frame.height / frame.width
         frame_height = int(width * aspect)
-        frame = frame.resize((width, frame_height), Image.Resampling.LANCZOS)
+        frame = get_asset(FRAME_PATH, (width, frame_height))
     except Exception as e:
         print(f"Erro ao carregar moldura: {e}")
         # Fallback para fundo branco se a moldura falhar
@@ -78,49 +127,8 @@ def text_to_image(text, width=PRINTER_WIDTH):
     max_text_width = width - left_margin - right_margin
     max_text_height = frame_height - top_margin - bottom_margin
 
-    # 3. Função auxiliar para testar quebra de linha com um dado tamanho de fonte
-    def get_lines_for_font(f_size):
-        try:
-            font = ImageFont.truetype(TEXT_FONT_PATH, f_size)
-        except:
-            font = ImageFont.load_default()
-            
-        words = text.split()
-        lines = []
-        current_line = ""
-        for word in words:
-            test_line = current_line + (" " if current_line else "") + word
-            if hasattr(font, 'getlength'):
-                line_width = font.getlength(test_line)
-            else:
-                line_width = font.getsize(test_line)[0]
-                
-            if line_width < max_text_width:
-                current_line = test_line
-            else:
-                lines.append(current_line)
-                current_line = word
-        if current_line:
-            lines.append(current_line)
-        
-        line_spacing = 4
-        line_height = f_size + line_spacing
-        total_height = len(lines) * line_height
-        return lines, font, total_height, line_height
-
-    # 4. Encontrar melhor tamanho de fonte (Escalonamento Dinâmico)
-    best_font_size = 20 # Mínimo
-    max_font_size = 60 # Máximo para não ficar bizarro
-    
-    # Busca linear regressiva para encontrar o maior tamanho que caiba na Moldura
-    for s in range(max_font_size, best_font_size - 1, -2):
-        lines, font, total_height, line_height = get_lines_for_font(s)
-        if total_height <= max_text_height:
-            best_font_size = s
-            break
-    
-    # Rodar uma última vez com o melhor tamanho encontrado
-    lines, font, total_height, line_height = get_lines_for_font(best_font_size)
+    # 3/4. Maior fonte que caiba na moldura (busca binária, fontes e larguras em cache)
+    lines, font, total_height, line_height = fit_text(text, max_text_width, max_text_height)
 
     # 5. Desenhar o texto centralizado na moldura
     canvas = Image.new("RGBA", (width, frame_height), (0, 0, 0, 0))
@@ -159,52 +167,208 @@ def process_image(img_input):
     else:
         img = img_input
         
-    # Resize keeping aspect ratio
-    w_percent = (PRINTER_WIDTH / float(img.size[0]))
-    h_size = int((float(img.size[1]) * float(w_percent)))
-    img = img.resize((PRINTER_WIDTH, h_size), Image.Resampling.LANCZOS)
+    # Resize keeping aspect ratio (PDF pages are already rasterized at the printer width)
+    if img.width != PRINTER_WIDTH:
+        w_percent = (PRINTER_WIDTH / float(img.size[0]))
+        h_size = int((float(img.size[1]) * float(w_percent)))
+        img = img.resize((PRINTER_WIDTH, h_size), Image.Resampling.LANCZOS)
     
     # Convert to 1-bit
     img = img.convert("1")
     return img
 
+def prepare_image(image_src, init=True, footer=True):
+    """
+    Full render for one page: resize/dither plus ESC/POS encoding.
+    Returns (commands, raster stats). CPU-bound, meant to run off the event loop.
+    """
+    img = process_image(image_src)
+    commands, raster = encode_raster(img, init=init, footer=footer)
+    print(f"Raster: {raster['sent_bytes']} bytes, {raster['saved_bytes']} economizados "
+          f"({raster['blank_rows']}/{raster['rows']} linhas em branco, {raster['chunks']} blocos)")
+    return commands, raster
+
+class PdfPages:
+    """
+    Pages of a PDF rasterized one at a time, straight at the printer width and
+    in grayscale. Once started, up to `prefetch` pages are rendered ahead of
+    the printer, so page N+1 is prepared while page N is sent and memory
+    stays bounded. The pages form one continuous raster (a single init and
+    footer), so there's no pause between them.
+    """
+
+    def __init__(self, file_path, prefetch=PDF_PREFETCH_PAGES):
+        self.file_path = file_path
+        self.prefetch = max(1, prefetch)
+        self.doc = fitz.open(file_path)
+        self.count = len(self.doc)
+        self._next = 0
+        self._pending = deque()
+        self._executor = None
+
+    def __len__(self):
+        return self.count
+
+    def start(self, executor=None):
+        """Starts prefetching. MuPDF documents aren't thread-safe: executor must have a single worker."""
+        if self._executor is None:
+            self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf")
+            self._fill()
+        return self
+
+    def _fill(self):
+        loop = asyncio.get_running_loop()
+        while self._next < self.count and len(self._pending) < self.prefetch:
+            self._pending.append(loop.run_in_executor(self._executor, self.render_page, self._next))
+            self._next += 1
+
+    def render_page(self, index):
+        page = self.doc[index]
+        zoom = PRINTER_WIDTH / page.rect.width
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        print(f"Pag {index+1}/{self.count}")
+        return prepare_image(img, init=index == 0, footer=index == self.count - 1)
+
+    async def __aiter__(self):
+        self.start()
+        try:
+            while self._pending:
+                page = await self._pending.popleft()
+                self._fill()
+                yield page
+        finally:
+            self.close()
+
+    def close(self):
+        # Páginas ainda em renderização terminam antes de o documento ser fechado
+        if self._pending:
+            self._pending[-1].add_done_callback(lambda _: self.doc.close())
+            self._pending.clear()
+        else:
+            self.doc.close()
+
+def open_pdf(file_path):
+    """Streaming pages of a PDF, or None if PyMuPDF isn't installed."""
+    if not fitz:
+        print(f"Erro: PyMuPDF (fitz) não instalado. Não é possível imprimir PDF.")
+        return None
+    print(f"\nLido arquivo PDF: {file_path}")
+    return PdfPages(file_path)
+
+async def iter_pages(pages):
+    """Pages of a job: a list of rendered pages or a streaming PdfPages."""
+    if hasattr(pages, '__aiter__'):
+        async with aclosing(pages.__aiter__()) as stream:
+            async for page in stream:
+                yield page
+    else:
+        for page in pages:
+            yield page
+
+class JobUnavailable(Exception):
+    """Job that can never be printed (e.g. a reprint whose render left the cache)."""
+
+def render_params(ext):
+    """Everything besides the file content that changes the rendered output."""
+    params = {"ext": ext, "width": PRINTER_WIDTH}
+    if ext == '.txt':
+        params.update(frame=asset_version(FRAME_PATH), font=font_id())
+    return params
+
+def render_file(file_path):
+    """
+    Reads a queued file and prepares the ESC/POS pages to print, going through
+    the render cache. `.reprint` files hold the ID of an already printed job
+    and reuse its cached render.
+    Returns a list of (commands, raster stats), [] if there is nothing to print,
+    or None if the file can't be printed.
+    """
+    job_id = os.path.basename(file_path)
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == '.reprint':
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return reprint_pages(f.read())
+
+    if ext == '.pdf':
+        # Rasterizado página a página durante o envio; fica fora do cache de render
+        return open_pdf(file_path)
+
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    return cached_render(job_id, content, render_params(ext), lambda: render_uncached(file_path))
+
+def render_source(job_id, source):
+    """
+    In-memory counterpart of render_file (all-in-one runner): source is the
+    text of a message (or the original job ID of a reprint) or the PIL image
+    produced by the bridge, so nothing goes through print_queue.
+    """
+    if job_id.lower().endswith('.reprint'):
+        return reprint_pages(source)
+    if isinstance(source, str):
+        text = source.strip()
+        if not text:
+            print("Mensagem de texto vazia. Ignorando.")
+            return []
+        print(f"\nMensagem de texto recebida: {job_id}")
+        return cached_render(job_id, text.encode('utf-8'), render_params('.txt'),
+                             lambda: [prepare_image(text_to_image(text))])
+    params = render_params('.image')
+    params.update(mode=source.mode, size=list(source.size))
+    print(f"\nImagem recebida: {job_id}")
+    return cached_render(job_id, source.tobytes(), params, lambda: [prepare_image(source)])
+
+def reprint_pages(original):
+    original = original.strip()
+    pages = render_cache.get_job(original)
+    if pages is None:
+        raise JobUnavailable(f"Render de {original} não está mais em cache.")
+    print(f"\nReimpressão de {original} (render em cache)")
+    return pages
+
+def cached_render(job_id, content, params, render):
+    """Pages for content from the render cache, or render() them and cache the result."""
+    key = render_key(content, **params)
+    pages = render_cache.get(key)
+    if pages is not None:
+        print(f"\nRender em cache para {job_id}, enviando direto.")
+    else:
+        pages = render()
+        if pages:
+            render_cache.put(key, pages)
+    if pages:
+        render_cache.remember_job(job_id, key)
+    return pages
+
+def render_uncached(file_path):
+    """Renders a queued file from scratch (see render_file)."""
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext in ['.jpg', '.jpeg', '.png', '.webp', '.bmp']:
+        print(f"\nLido arquivo de imagem: {file_path}")
+        return [prepare_image(file_path)]
+
+    elif ext == '.txt':
+        print(f"\nLido arquivo de texto: {file_path}")
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read().strip()
+
+        if not text:
+            print("Arquivo de texto vazio. Ignorando.")
+            return []
+
+        return [prepare_image(text_to_image(text))]
+
+    return None
+
 def image_to_escpos(img):
     """
     Convert 1-bit PIL image to ESC/POS 'GS v 0' raster format.
+    Blank row runs are sent as paper feeds (see escpos.encode_raster).
     """
-    WIDTH_BYTES = PRINTER_WIDTH // 8
-    
-    from PIL import ImageOps
-    # Invert so white=0 (no burn), black=1 (burn)
-    img = ImageOps.invert(img.convert("L")).convert("1")
-    
-    data = img.tobytes()
-    commands = []
-    
-    # Init printer
-    commands.append(b'\x1b\x40') 
-    
-    # Send image in chunks
-    chunk_height = 100
-    total_height = img.height
-    
-    for y in range(0, total_height, chunk_height):
-        h = min(chunk_height, total_height - y)
-        start = y * WIDTH_BYTES
-        end = (y + h) * WIDTH_BYTES
-        chunk_data = data[start:end]
-        
-        # Header for this chunk: GS v 0 0 xL xH yL yH
-        xL = WIDTH_BYTES & 0xFF
-        xH = (WIDTH_BYTES >> 8) & 0xFF
-        yL = h & 0xFF
-        yH = (h >> 8) & 0xFF
-        
-        cmd = b'\x1d\x76\x30\x00' + bytes([xL, xH, yL, yH]) + chunk_data
-        commands.append(cmd)
-        
-    # Feed lines (footer)
-    commands.append(b'\x1b\x64\x03')
+    commands, _ = encode_raster(img)
     return commands
 
 async def find_printer():
@@ -250,8 +414,14 @@ class PhomemoPrinter:
         self.client = None
         self._lock = asyncio.Lock()
         self._status_event = asyncio.Event()
-        self.last_status = {"ready": True, "msg": "Buscando..."}
+        # Status com carimbo de tempo, mantido pelas notificações e pelo StateTracker
+        self.state = PrinterState()
+        self._probe = None
+        self.transmitter = None
 
+    @property
+    def last_status(self):
+        return {"ready": self.state.ready, "msg": self.state.msg}
 
     def _notification_handler(self, sender, data):
         if len(data) >= 3 and data[0] == 0x1a:
@@ -262,11 +432,13 @@ class PhomemoPrinter:
                 paper_present = bool(raw_info & 0x10)
                 
                 if not paper_present:
-                    self.last_status["msg"] = "⚠️ Sem papel!"
-                    self.last_status["ready"] = False
+                    self.state.update(False, "⚠️ Sem papel!")
+                    if self.transmitter:
+                        self.transmitter.feedback(False)
                 else:
-                    self.last_status["msg"] = "Pronta"
-                    self.last_status["ready"] = True
+                    self.state.update(True, "Pronta")
+            else:
+                self.state.update()
             
             self._status_event.set()
 
@@ -282,6 +454,11 @@ class PhomemoPrinter:
             
             # Iniciar notificações imediatamente e manter abertas
             await self.client.start_notify(NOTIFY_CHARACTERISTIC_UUID, self._notification_handler)
+
+            # Pacotes do tamanho do MTU desta conexão; mantém a taxa aprendida antes da reconexão
+            rate = self.transmitter.rate if self.transmitter else BLE_RATE
+            self.transmitter = BleTransmitter(self.client, WRITE_CHARACTERISTIC_UUID, rate=rate)
+            print(f"Pacotes BLE de {self.transmitter.packet_size} bytes, {rate / 1024:.1f} KB/s.")
             return True
         except Exception as e:
             print(f"\u274c Erro ao conectar: {e}")
@@ -293,14 +470,23 @@ class PhomemoPrinter:
             return await self.connect()
         return True
 
-    async def check_status(self):
+    async def probe_status(self):
         """
-        Attempts to read status from the printer using the persistent handler.
+        Asks the printer for its status and waits for the persistent handler
+        to receive the reply. Latency and timeouts go to self.state.
+        A probe already in flight (e.g. from the StateTracker) is shared.
         """
         if not self.client or not self.client.is_connected:
             return False, "Desconectado"
-            
+        if self._probe is None:
+            self._probe = asyncio.ensure_future(self._probe_once())
+            self._probe.add_done_callback(lambda _: setattr(self, "_probe", None))
+        return await asyncio.shield(self._probe)
+
+    async def _probe_once(self):
         self._status_event.clear()
+        start = time.monotonic()
+        answered = secondary = False
         try:
             # Solicitar status (0xAB 00 trigger Phomemo T02 STATUS packets)
             await self.client.write_gatt_char(WRITE_CHARACTERISTIC_UUID, b'\xab\x00', response=False)
@@ -308,52 +494,92 @@ class PhomemoPrinter:
             # Esperar pela notificação que o handler persistente receberá
             try:
                 await asyncio.wait_for(self._status_event.wait(), timeout=1.5)
+                answered = True
             except asyncio.TimeoutError:
                 # Se falhar, tenta o comando secundário GS g n
+                secondary = True
                 await self.client.write_gatt_char(WRITE_CHARACTERISTIC_UUID, b'\x1d\x67\x6e', response=False)
                 try:
                     await asyncio.wait_for(self._status_event.wait(), timeout=1.0)
+                    answered = True
                 except asyncio.TimeoutError:
                     pass
                 
         except Exception as e:
             print(f"[ERRO Status] {e}")
+        self.state.record_probe(time.monotonic() - start, answered, secondary)
             
-        return self.last_status["ready"], self.last_status["msg"]
+        return self.state.snapshot()
+
+    async def check_status(self):
+        """
+        Current printer status: the tracked state if it is fresh (O(1)),
+        otherwise a new probe.
+        """
+        if not self.client or not self.client.is_connected:
+            return False, "Desconectado"
+        if self.state.needs_probe():
+            return await self.probe_status()
+        return self.state.snapshot()
+
+    @property
+    def available(self):
+        """Connected and, as far as the tracked state knows, with paper."""
+        return bool(self.client and self.client.is_connected and self.state.ready)
+
+    @property
+    def busy(self):
+        """True while a job is being sent (status probes would corrupt the raster)."""
+        return self._lock.locked()
 
     async def print_image(self, image_src):
         """
         Main printing function. image_src can be path or PIL Image.
         """
+        print(f"Processando e enviando...")
+        if isinstance(image_src, str) and image_src.lower().endswith('.pdf'):
+            pages = open_pdf(image_src)
+            return pages is not None and await self.print_pages(pages)
+        try:
+            page = await asyncio.get_running_loop().run_in_executor(None, prepare_image, image_src)
+        except Exception as e:
+            print(f"Erro no processamento da imagem: {e}")
+            return False
+        return await self.print_pages([page])
+
+    async def print_pages(self, pages):
+        """
+        Sends already rendered pages (list of (commands, raster stats)) or a
+        streaming PdfPages, back to back. Only byte streams reach this point,
+        so the BLE writer never waits on Pillow.
+        """
         async with self._lock:
             if not await self.ensure_connected():
                 return False
 
-            print(f"Processando e enviando...")
-            try:
-                img = process_image(image_src)
-            except Exception as e:
-                print(f"Erro no processamento da imagem: {e}")
-                return False
-
-            commands = image_to_escpos(img)
-            
-            # 1. Check Status
-            ready, msg = await self.check_status()
-            if not ready:
-                print(f"\n\u274c CANCELADO: {msg}")
-                return False
-            
-            # 2. Print
-            print(f"Status: {msg}. Enviando dados...")
-            for i, cmd in enumerate(commands):
-                await self.client.write_gatt_char(WRITE_CHARACTERISTIC_UUID, cmd, response=False)
-                await asyncio.sleep(0.04)
-                if i % 10 == 0:
-                    sys.stdout.write(f"\rProgresso: {int((i/len(commands))*100)}%")
-                    sys.stdout.flush()
-            
-            print(f"\rProgresso: 100% - \u2705 Sucesso.")
+            async for commands, raster in iter_pages(pages):
+                # 1. Check Status (só sonda a impressora se o status estiver velho)
+                with tracing.stage("status_check"):
+                    ready, msg = await self.check_status()
+                if not ready:
+                    print(f"\n\u274c CANCELADO: {msg}")
+                    return False
+
+                # 2. Print
+                print(f"Status: {msg}. Enviando dados...")
+                last_pct = -1
+
+                def progress(sent, total):
+                    nonlocal last_pct
+                    pct = sent * 100 // total
+                    if pct // 10 != last_pct // 10:
+                        last_pct = pct
+                        sys.stdout.write(f"\rProgresso: {pct}%")
+                        sys.stdout.flush()
+
+                with tracing.stage("ble_send", bytes=sum(len(c) for c in commands)):
+                    speed = await self.transmitter.send(commands, progress)
+                print(f"\rProgresso: 100% - \u2705 Sucesso. ({speed / 1024:.1f} KB/s, taxa {self.transmitter.rate / 1024:.1f} KB/s)")
             return True
 
     async def disconnect(self):
@@ -361,52 +587,150 @@ class PhomemoPrinter:
             await self.client.disconnect()
             self.client = None
 
-async def process_file(printer, file_path):
-    ext = os.path.splitext(file_path)[1].lower()
-    
-    if ext in ['.jpg', '.jpeg', '.png', '.bmp']:
-        print(f"\nLido arquivo de imagem: {file_path}")
-        return await printer.print_image(file_path)
-    
-    elif ext == '.txt':
-        print(f"\nLido arquivo de texto: {file_path}")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read().strip()
-        
-        if not text:
-            print("Arquivo de texto vazio. Ignorando.")
-            return True
-            
-        img = text_to_image(text)
-        return await printer.print_image(img)
-    
-    elif ext == '.pdf':
-        if not fitz:
-            print(f"Erro: PyMuPDF (fitz) não instalado. Não é possível imprimir PDF.")
-            return False
-            
-        print(f"\nLido arquivo PDF: {file_path}")
-        try:
-            doc = fitz.open(file_path)
-            for i, page in enumerate(doc):
-                print(f"Pag {i+1}/{len(doc)}")
-                pix = page.get_pixmap(dpi=203)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                success = await printer.print_image(img)
-                if not success: return False
-                if i < len(doc) - 1: await asyncio.sleep(2)
-            return True
-        except Exception as e:
-            print(f"Erro processando PDF: {e}")
-            return False
-    
-    return False
+class PrintPipeline:
+    """
+    Two-stage printer pipeline: files are rendered to ESC/POS in an executor
+    while the previous job is still being transmitted, and the BLE stage only
+    sends ready byte streams. At most `depth` rendered jobs wait for the
+    printer, so memory stays flat during a backlog.
+    Jobs are files in WATCH_DIR or, in the all-in-one runner, in-memory
+    sources (text or PIL image) handed over by the bridge stage. The order,
+    retries and dead letter come from the PrintSpooler.
+    Each job carries a tracing.Trace (print_queue wait, render, wait for the
+    printer, status check, BLE send) that is reported with its final status.
+    """
 
-async def monitor_folder(printer):
+    def __init__(self, printer, depth=PRINT_PIPELINE_DEPTH, spooler=None):
+        self.printer = printer
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        self.spooler = spooler if spooler is not None else PrintSpooler()
+        self.ready = asyncio.Queue(maxsize=max(1, depth))
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._render_loop()),
+            asyncio.create_task(self._transmit_loop()),
+        ]
+        return self
+
+    def submit(self, file_name, source=None, trace=None):
+        """
+        Enfileira um arquivo de WATCH_DIR ou, com source, um job em memória
+        (ignora os que já estão no spooler). trace: o Trace do job, se já existe.
+        """
+        return self.spooler.add(file_name, source, trace)
+
+    def _start_trace(self, job):
+        """Trace do job na primeira tentativa, com o tempo que ele esperou na fila."""
+        queued = None
+        if job.trace is None and job.source is None:
+            job.trace, queued = tracing.load_from_queue(os.path.join(WATCH_DIR, job.name))
+        elif job.trace is None:
+            job.trace = tracing.Trace(job.name)
+        if not job.trace.has("print_queue"):
+            job.trace.add("print_queue", max(0.0, time.time() - (queued or job.enqueued)))
+
+    def _report(self, job, status):
+        """Status final do job com as etapas medidas aqui e a profundidade da fila."""
+        job.trace.gauges.update({"print_queue": len(self.spooler), "print_ready": self.ready.qsize()})
+        update_remote_status(job.name, status, job.trace)
+        job.trace.log()
+        if job.source is None:
+            tracing.discard_from_queue(os.path.join(WATCH_DIR, job.name))
+
+    def _dead_letter(self, job):
+        print(f"Desistindo de {job.name} depois de {job.attempts} tentativas ({job.error}).")
+        self._report(job, "Erro: falha na impressão")
+        if job.source is None:
+            try:
+                shutil.move(os.path.join(WATCH_DIR, job.name), os.path.join(FAILED_DIR, job.name))
+            except Exception as e:
+                print(f"Erro ao mover {job.name} para {FAILED_DIR}: {e}")
+
+    def _fail(self, job, error):
+        if self.spooler.fail(job, error):
+            self._dead_letter(job)
+        else:
+            print(f"Falha em {job.name} ({error}). Tentativa {job.attempts + 1} em "
+                  f"{max(0, job.not_before - time.time()):.0f}s.")
+
+    async def _render_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.spooler.next_job()
+            file_name, source = job.name, job.source
+            file_path = os.path.join(WATCH_DIR, file_name) if source is None else None
+            self._start_trace(job)
+            start = time.monotonic()
+            try:
+                with job.trace.stage("print_render"):
+                    if file_path:
+                        pages = await loop.run_in_executor(self.executor, render_file, file_path)
+                    else:
+                        pages = await loop.run_in_executor(self.executor, render_source, file_name, source)
+                if isinstance(pages, PdfPages):
+                    # As primeiras páginas já renderizam enquanto o job anterior é enviado
+                    pages.start(self.executor)
+            except JobUnavailable as e:
+                print(f"{file_name}: {e}")
+                self.spooler.drop(job)
+                self._report(job, "Erro: reimpressão indisponível")
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+                continue
+            except Exception as e:
+                print(f"Erro processando {file_name}: {e}")
+                pages = None
+            if pages is None:
+                self._fail(job, "render")
+                continue
+            # Espera aqui quando já há `depth` jobs prontos aguardando a impressora
+            await self.ready.put((job, pages, time.monotonic() - start, time.monotonic()))
+
+    async def _transmit_loop(self):
+        while True:
+            job, pages, render_time, rendered_at = await self.ready.get()
+            file_name = job.name
+            start = time.monotonic()
+            # Tempo do job pronto esperando o anterior terminar de imprimir
+            job.trace.add("print_wait", start - rendered_at)
+            error = None
+            try:
+                with tracing.activate(job.trace):
+                    success = await self.printer.print_pages(pages)
+            except Exception as e:
+                print(f"Erro imprimindo {file_name}: {e}")
+                success, error = False, str(e)
+
+            if success:
+                self.spooler.complete(job, render_time + time.monotonic() - start)
+                self._report(job, "Pronto")
+                if job.source is None:
+                    try:
+                        os.remove(os.path.join(WATCH_DIR, file_name))
+                        print(f"Limpeza: Arquivo {file_name} deletado da fila após impressão.")
+                    except Exception as delete_err:
+                        print(f"Erro ao deletar arquivo: {delete_err}")
+            elif not self.printer.available:
+                # Sem papel ou desconectada: não é culpa do job, não conta tentativa
+                print(f"Impressora indisponível. {file_name} volta para a fila.")
+                self.spooler.hold(job)
+            else:
+                self._fail(job, error or "envio")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+async def monitor_folder(printer, pipeline=None):
     if not os.path.exists(WATCH_DIR): os.makedirs(WATCH_DIR)
     if not os.path.exists(PROCESSED_DIR): os.makedirs(PROCESSED_DIR)
     
-    print(f"\n--- Iniciando Monitoramento (Polling) ---")
+    watcher = create_watcher(WATCH_DIR)
+    print(f"\n--- Iniciando Monitoramento ({watcher.name}) ---")
     print(f"Observando pasta: {os.path.abspath(WATCH_DIR)}")
     print(f"Pressione Ctrl+C para parar.\n")
     
@@ -416,6 +740,12 @@ async def monitor_folder(printer):
     HEARTBEAT_INTERVAL = 1  # segundos (conforme alteração do usuário)
     FORCE_REPORT_INTERVAL = 30 # Forçar log a cada 30s mesmo se nada mudar
     
+    if pipeline is None:
+        pipeline = PrintPipeline(printer).start()
+    tracker = StateTracker(printer).start()
+    rescan = True
+    last_scan = 0
+    
     while True:
         try:
             # 1. Garantir conexão
@@ -427,8 +757,15 @@ async def monitor_folder(printer):
                 await asyncio.sleep(2)
                 continue
 
-            # 2. Verificar Status para detecção de mudanças
-            ready, msg = await printer.check_status()
+            # 2. Processar arquivos da fila (só quando o watcher avisou de algo novo)
+            if rescan or time.time() - last_scan > QUEUE_RESCAN_INTERVAL:
+                rescan = False
+                last_scan = time.time()
+                for file_name in list_files(WATCH_DIR):
+                    pipeline.submit(file_name)
+
+            # 3. Status mantido em segundo plano pelo StateTracker (sem sondar aqui)
+            ready, msg = printer.state.snapshot()
             timestamp = time.strftime("%H:%M:%S")
 
             # Se houve mudança de status, ou se faz tempo que não reportamos
@@ -438,49 +775,41 @@ async def monitor_folder(printer):
             if status_changed or time_to_heartbeat:
                 icon = "\u2705" if ready else "\u26a0\ufe0f"
                 print(f"[{timestamp}] {icon} Status: {msg}")
+                if printer.state.probes:
+                    print(f"[{timestamp}] Sondagens de status: {printer.state.stats()}")
+                if len(pipeline.spooler) or pipeline.spooler.done:
+                    print(f"[{timestamp}] Fila de impressão: {pipeline.spooler.stats()}")
+                cache = render_cache.stats()
+                if cache["hits"] + cache["disk_hits"] + cache["misses"]:
+                    print(f"[{timestamp}] Cache de render: {cache}")
                 
                 last_status_msg = msg
                 last_heartbeat = time.time()
-
-            # 3. Processar arquivos da fila
-            files = [f for f in os.listdir(WATCH_DIR) if os.path.isfile(os.path.join(WATCH_DIR, f))]
-            
-            if files:
-                for file_name in sorted(files):
-                    if file_name.startswith('.'): continue
-                    
-                    file_path = os.path.join(WATCH_DIR, file_name)
-                    success = await process_file(printer, file_path)
-                    
-                    if success:
-                        try:
-                            update_remote_status(file_name, "Pronto")
-                            os.remove(file_path)
-                            print(f"Limpeza: Arquivo {file_name} deletado da fila após impressão.")
-                        except Exception as delete_err:
-                            print(f"Erro ao deletar arquivo: {delete_err}")
-                    else:
-                        print(f"Falha ao imprimir {file_name}. Tentará novamente no próximo ciclo.")
             
         except Exception as e:
             print(f"Erro no monitor: {e}")
             await asyncio.sleep(2)
             
-        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        # Acorda na hora quando um arquivo é renomeado para a fila; senão, a cada HEARTBEAT_INTERVAL
+        rescan = await watcher.wait(HEARTBEAT_INTERVAL) or rescan
 
-async def main():
+async def resolve_target():
+    """Printer address from BLE_PRINTER_ADDRESS or interactive discovery."""
     direct_address = os.getenv("BLE_PRINTER_ADDRESS")
     if direct_address:
         print(f"Usando endereço fixo do .env: {direct_address}")
-        target = direct_address
-    else:
-        target = await find_printer()
+        return direct_address
+    return await find_printer()
+
+async def main():
+    target = await resolve_target()
 
     if not target:
         print("\n\u274c Nenhuma impressora selecionada ou encontrada.")
         return
         
     printer = PhomemoPrinter(target)
+    warm_up(PRINTER_WIDTH)
     
     if len(sys.argv) > 1:
         # Modo de comando único
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+import time
+
+# Journal (JSON por linha) com os jobs da fila de impressão; vazio = só memória
+SPOOL_JOURNAL = os.getenv("PRINT_SPOOL_JOURNAL", os.path.join("print_queue", ".spool.journal"))
+# Tentativas antes de o job ir para a fila de falhas (dead letter)
+SPOOL_MAX_ATTEMPTS = int(os.getenv("PRINT_SPOOL_MAX_ATTEMPTS", "5"))
+# Backoff exponencial entre tentativas (s)
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+# Espera (s) antes de tentar de novo quando a impressora estava sem papel/desconectada
+PRINTER_WAIT = 2.0
+# Crédito (s de custo por s de espera) que um job ganha na fila, para nada esperar para sempre
+AGING_RATE = 0.1
+# Peso da última medição na estimativa de tempo de cada fila
+COST_ALPHA = 0.3
+# Reescreve o journal quando ele passa de tantas linhas por job vivo
+COMPACT_FACTOR = 4
+COMPACT_MIN_RECORDS = 200
+
+# Filas de prioridade e custo inicial estimado (s de render + envio)
+TEXT, PHOTO, RAW, PDF = "text", "photo", "raw", "pdf"
+LANE_COSTS = {TEXT: 2.0, PHOTO: 5.0, RAW: 5.0, PDF: 12.0}
+
+# Estados do job no spooler
+QUEUED = "queued"      # esperando a vez (ou o fim do backoff)
+ACTIVE = "active"      # renderizando ou imprimindo
+DEAD = "dead"          # desistiu depois de SPOOL_MAX_ATTEMPTS
+
+
+def job_lane(name):
+    """Fila do job pelo nome do arquivo."""
+    ext = os.path.splitext(name)[1].lower()
+    if ext in (".txt", ".reprint"):
+        return TEXT
+    if ext == ".pdf":
+        return PDF
+    if "raw_" in name:
+        return RAW
+    return PHOTO
+
+
+class SpoolJob:
+    __slots__ = ("name", "lane", "source", "trace", "enqueued", "attempts", "not_before", "state", "error")
+
+    def __init__(self, name, lane, source=None, enqueued=0.0, attempts=0, not_before=0.0, trace=None):
+        self.name = name
+        self.lane = lane
+        self.source = source
+        # Etapas do job nesta impressora (tracing.Trace), criado na primeira tentativa
+        self.trace = trace
+        self.enqueued = enqueued
+        self.attempts = attempts
+        self.not_before = not_before
+        self.state = QUEUED
+        self.error = None
+
+
+class PrintSpooler:
+    """
+    Fila de impressão com prioridade, retentativas e journal em disco.
+    - Escalonamento: o menor custo estimado primeiro (textos antes de fotos e
+      PDFs), o que minimiza a espera média; cada segundo na fila desconta
+      AGING_RATE do custo, então jobs caros não ficam parados para sempre.
+      O custo de cada fila é aprendido com os tempos medidos.
+    - Falhas: backoff exponencial por job; depois de max_attempts o job vai
+      para o estado DEAD (dead letter) e sai da fila.
+    - Journal: cada mudança vira uma linha JSON; ao iniciar, a fila (com
+      tentativas e backoff) é reconstruída a partir dele. Jobs em memória
+      (modo tudo-em-um) não sobrevivem a um restart.
+    """
+
+    def __init__(self, journal=SPOOL_JOURNAL or None, max_attempts=SPOOL_MAX_ATTEMPTS, clock=time.time):
+        self.journal = journal
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.costs = dict(LANE_COSTS)
+        self._jobs = {}
+        self._records = 0
+        self._wakeup = asyncio.Event()
+        self.done = 0
+        self.dead = 0
+        self.retries = 0
+        if journal:
+            self._replay()
+
+    # Journal
+
+    def _replay(self):
+        if not os.path.exists(self.journal):
+            return
+        with open(self.journal, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # linha cortada por um crash no meio da escrita
+                self._records += 1
+                name, op = record.get("job"), record.get("op")
+                if op == "add":
+                    self._jobs[name] = SpoolJob(name, record["lane"], enqueued=record["t"])
+                elif op == "retry" and name in self._jobs:
+                    self._jobs[name].attempts = record["attempts"]
+                    self._jobs[name].not_before = record["not_before"]
+                elif op in ("done", "dead", "drop"):
+                    self._jobs.pop(name, None)
+                elif op == "cost":
+                    self.costs[record["lane"]] = record["cost"]
+        # Só os jobs de arquivo voltam, e só se o arquivo ainda existe
+        folder = os.path.dirname(self.journal)
+        for name in list(self._jobs):
+            if not os.path.exists(os.path.join(folder, name)):
+                del self._jobs[name]
+        if self._jobs:
+            print(f"Spooler: {len(self._jobs)} job(s) recuperado(s) do journal.")
+        self._compact()
+
+    def _write(self, record):
+        if not self.journal:
+            return
+        if self._records > max(COMPACT_MIN_RECORDS, COMPACT_FACTOR * len(self._jobs)):
+            self._compact()
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self._records += 1
+
+    def _compact(self):
+        """Reescreve o journal só com os jobs vivos (temp+rename)."""
+        if not self.journal:
+            return
+        records = [{"op": "cost", "lane": lane, "cost": cost} for lane, cost in self.costs.items()]
+        for job in self._jobs.values():
+            if job.source is not None:
+                continue
+            records.append({"op": "add", "job": job.name, "lane": job.lane, "t": job.enqueued})
+            if job.attempts:
+                records.append({"op": "retry", "job": job.name, "attempts": job.attempts, "not_before": job.not_before})
+        tmp = self.journal + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+        os.replace(tmp, self.journal)
+        self._records = len(records)
+
+    # Fila
+
+    def add(self, name, source=None, trace=None):
+        """Enfileira um job (arquivo da print_queue ou, com source, em memória). False se já está no spooler."""
+        if name in self._jobs:
+            return False
+        job = SpoolJob(name, job_lane(name), source, enqueued=self.clock(), trace=trace)
+        self._jobs[name] = job
+        if source is None:
+            self._write({"op": "add", "job": name, "lane": job.lane, "t": job.enqueued})
+        self._wakeup.set()
+        return True
+
+    def __contains__(self, name):
+        return name in self._jobs
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def priority(self, job, now):
+        return self.costs[job.lane] - AGING_RATE * (now - job.enqueued)
+
+    def pick(self):
+        """
+        Próximo job elegível (menor prioridade, depois ordem de chegada) ou
+        (None, segundos até o próximo sair do backoff / None se a fila está vazia).
+        """
+        now = self.clock()
+        best = None
+        wait = None
+        for job in self._jobs.values():
+            if job.state != QUEUED:
+                continue
+            if job.not_before > now:
+                delay = job.not_before - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            key = (self.priority(job, now), job.enqueued)
+            if best is None or key < best[0]:
+                best = (key, job)
+        if best is None:
+            return None, wait
+        job = best[1]
+        job.state = ACTIVE
+        return job, None
+
+    async def next_job(self):
+        """Espera até haver um job elegível e o marca como ativo."""
+        while True:
+            job, wait = self.pick()
+            if job:
+                return job
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def complete(self, job, duration=None):
+        """Job impresso. duration (s) atualiza o custo estimado da fila dele."""
+        self._jobs.pop(job.name, None)
+        self.done += 1
+        if duration is not None:
+            cost = (1 - COST_ALPHA) * self.costs[job.lane] + COST_ALPHA * duration
+            self.costs[job.lane] = cost
+            self._write({"op": "cost", "lane": job.lane, "cost": round(cost, 3)})
+        if job.source is None:
+            self._write({"op": "done", "job": job.name})
+
+    def drop(self, job):
+        """Tira o job da fila sem imprimir (ex.: reimpressão que não existe mais)."""
+        self._jobs.pop(job.name, None)
+        if job.source is None:
+            self._write({"op": "drop", "job": job.name})
+
+    def hold(self, job, delay=PRINTER_WAIT):
+        """A impressora não estava pronta: volta para a fila sem contar tentativa."""
+        job.state = QUEUED
+        job.not_before = self.clock() + delay
+        self._wakeup.set()
+
+    def fail(self, job, error=None):
+        """
+        Falha do próprio job: backoff exponencial ou, depois de max_attempts,
+        dead letter. Retorna True se o job morreu.
+        """
+        job.attempts += 1
+        job.error = error
+        if job.attempts >= self.max_attempts:
+            job.state = DEAD
+            self._jobs.pop(job.name, None)
+            self.dead += 1
+            if job.source is None:
+                self._write({"op": "dead", "job": job.name, "error": error})
+            return True
+        self.retries += 1
+        job.state = QUEUED
+        job.not_before = self.clock() + min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (job.attempts - 1))
+        if job.source is None:
+            self._write({"op": "retry", "job": job.name, "attempts": job.attempts, "not_before": job.not_before})
+        self._wakeup.set()
+        return False
+
+    def stats(self):
+        lanes = {}
+        for job in self._jobs.values():
+            lanes[job.lane] = lanes.get(job.lane, 0) + 1
+        return {
+            "queued": len(self._jobs),
+            "lanes": lanes,
+            "done": self.done,
+            "retries": self.retries,
+            "dead": self.dead,
+            "costs": {lane: round(cost, 1) for lane, cost in self.costs.items()},
+        }
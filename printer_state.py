@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+# Intervalo (s) entre as sondagens de status quando a impressora está parada
+STATUS_PROBE_INTERVAL = float(os.getenv("STATUS_PROBE_INTERVAL", "3"))
+# Idade máxima (s) do status para um job usá-lo sem sondar de novo
+STATUS_MAX_AGE = float(os.getenv("STATUS_MAX_AGE", "5"))
+# Quantas latências de sondagem guardar para as métricas
+PROBE_HISTORY = 100
+
+
+class PrinterState:
+    """
+    Último status conhecido da impressora, com o instante em que foi confirmado
+    (notificação espontânea ou resposta a uma sondagem). Leitura O(1): quem vai
+    imprimir só sonda de novo quando o status está velho.
+    """
+
+    def __init__(self, max_age=STATUS_MAX_AGE):
+        self.max_age = max_age
+        self.ready = True
+        self.msg = "Buscando..."
+        self.source = None
+        self.updated_at = None
+        self.last_probe_at = None
+        self.notifications = 0
+        self.probes = 0
+        self.probe_timeouts = 0
+        self.secondary_probes = 0
+        self._latencies = deque(maxlen=PROBE_HISTORY)
+
+    def update(self, ready=None, msg=None, source="notify"):
+        """Status confirmado agora. Sem ready/msg, só renova o carimbo (a impressora respondeu)."""
+        if ready is not None:
+            self.ready = ready
+        if msg is not None:
+            self.msg = msg
+        self.source = source
+        self.updated_at = time.monotonic()
+        if source == "notify":
+            self.notifications += 1
+
+    def age(self):
+        if self.updated_at is None:
+            return float("inf")
+        return time.monotonic() - self.updated_at
+
+    def is_fresh(self):
+        return self.age() <= self.max_age
+
+    def needs_probe(self):
+        """
+        Velho e sem sondagem recente. Uma sondagem que não teve resposta também
+        conta: uma impressora calada não custa 2,5 s a cada job.
+        """
+        if self.is_fresh():
+            return False
+        return self.last_probe_at is None or time.monotonic() - self.last_probe_at > self.max_age
+
+    def record_probe(self, latency, answered, secondary=False):
+        self.probes += 1
+        self.last_probe_at = time.monotonic()
+        if secondary:
+            self.secondary_probes += 1
+        if answered:
+            self._latencies.append(latency)
+        else:
+            self.probe_timeouts += 1
+
+    def snapshot(self):
+        return self.ready, self.msg
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {
+            "ready": self.ready,
+            "msg": self.msg,
+            "age_s": round(self.age(), 1) if self.updated_at is not None else None,
+            "source": self.source,
+            "notifications": self.notifications,
+            "probes": self.probes,
+            "probe_timeouts": self.probe_timeouts,
+            "secondary_probes": self.secondary_probes,
+            "probe_p50_ms": pct(0.5),
+            "probe_p95_ms": pct(0.95),
+        }
+
+
+class StateTracker:
+    """
+    Tarefa de fundo que mantém o PrinterState em dia: as notificações
+    espontâneas chegam pelo handler da impressora, e a sondagem (0xAB 00 /
+    GS g n) só roda quando o status passou de `interval` segundos, com a
+    impressora conectada e sem job sendo enviado.
+    """
+
+    def __init__(self, printer, interval=STATUS_PROBE_INTERVAL):
+        self.printer = printer
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def _run(self):
+        state = self.printer.state
+        while True:
+            try:
+                client = self.printer.client
+                idle = client is not None and client.is_connected and not self.printer.busy
+                last = max(t for t in (state.updated_at, state.last_probe_at, 0) if t is not None)
+                if idle and time.monotonic() - last >= self.interval:
+                    await self.printer.probe_status()
+            except Exception as e:
+                print(f"[ERRO Status] {e}")
+            await asyncio.sleep(min(1.0, self.interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
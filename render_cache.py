@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Renders prontos (ESC/POS) mantidos em memória e, opcionalmente, em disco
+RENDER_CACHE_ENTRIES = int(os.getenv("RENDER_CACHE_ENTRIES", "64"))
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", str(16 * 1024 * 1024)))
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "")
+# Quantos IDs de job (para reimpressão) lembrar
+RENDER_CACHE_JOBS = 1024
+
+
+def render_key(content, **params):
+    """Hash do conteúdo + parâmetros do render (versão da moldura, largura, fonte...)."""
+    digest = hashlib.sha256(content)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def pages_size(pages):
+    return sum(len(c) for commands, _ in pages for c in commands)
+
+
+def _dump(pages):
+    header = [{"stats": stats, "lengths": [len(c) for c in commands]} for commands, stats in pages]
+    return json.dumps(header).encode() + b"\n" + b"".join(c for commands, _ in pages for c in commands)
+
+
+def _load(blob):
+    header, _, data = blob.partition(b"\n")
+    pages = []
+    offset = 0
+    for page in json.loads(header):
+        commands = []
+        for length in page["lengths"]:
+            commands.append(data[offset:offset + length])
+            offset += length
+        pages.append((commands, page["stats"]))
+    return pages
+
+
+class RenderCache:
+    """
+    LRU de jobs já renderizados (lista de páginas (comandos ESC/POS, estatísticas)),
+    endereçado pelo hash do conteúdo e dos parâmetros do render. Limitado em
+    quantidade e em bytes; com disk_dir, o que sai da memória continua em disco.
+    Também lembra qual chave cada job impresso usou, para reimprimir pelo ID.
+    """
+
+    def __init__(self, max_entries=RENDER_CACHE_ENTRIES, max_bytes=RENDER_CACHE_BYTES, disk_dir=RENDER_CACHE_DIR or None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir and not os.path.exists(disk_dir):
+            os.makedirs(disk_dir)
+
+    def _disk_path(self, kind, name):
+        return os.path.join(self.disk_dir, f"{kind}-{name}")
+
+    def _disk_read(self, kind, name):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(kind, name), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_write(self, kind, name, data):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(kind, name)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Aviso: não foi possível gravar o cache de render em disco: {e}")
+
+    def _remember(self, key, pages):
+        size = pages_size(pages)
+        if key in self._entries:
+            self.size_bytes -= pages_size(self._entries.pop(key))
+        self._entries[key] = pages
+        self.size_bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes):
+            _, old = self._entries.popitem(last=False)
+            self.size_bytes -= pages_size(old)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            pages = self._entries.get(key)
+            if pages is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pages
+
+        blob = self._disk_read("render", key)
+        with self._lock:
+            if blob is None:
+                self.misses += 1
+                return None
+            pages = _load(blob)
+            self.disk_hits += 1
+            self._remember(key, pages)
+            return pages
+
+    def put(self, key, pages):
+        with self._lock:
+            self._remember(key, pages)
+        self._disk_write("render", key, _dump(pages))
+
+    def remember_job(self, job_id, key):
+        """Associa o ID do job (nome do arquivo no servidor) à chave do render."""
+        with self._lock:
+            self._jobs[job_id] = key
+            self._jobs.move_to_end(job_id)
+            while len(self._jobs) > RENDER_CACHE_JOBS:
+                self._jobs.popitem(last=False)
+        self._disk_write("job", hashlib.sha256(job_id.encode()).hexdigest(), key.encode())
+
+    def get_job(self, job_id):
+        """Render de um job já impresso, para reimpressão. None se não estiver mais em cache."""
+        with self._lock:
+            key = self._jobs.get(job_id)
+        if key is None:
+            blob = self._disk_read("job", hashlib.sha256(job_id.encode()).hexdigest())
+            if blob is None:
+                return None
+            key = blob.decode()
+        return self.get(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
@@ -1,12 +1,21 @@
 import os
+import json
 import time
 import logging
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+import mimetypes
+from collections import OrderedDict
+from flask import Flask, Request, request, jsonify, send_from_directory, Response, stream_with_context, g
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
 from dotenv import load_dotenv
 
+from job_store import create_job_store, is_final_status, PENDING, ACTIVE
+import metrics
+from tracing import Trace, LogSampler, TRACE_HEADER, STAGES, GAUGES
+from upload_spool import UploadSpool, UPLOAD_SPOOL_BYTES, MAX_IMAGE_BYTES, MAX_TEXT_CHARS, is_text_upload
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -14,18 +23,44 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class UploadRequest(Request):
+    """Lê o arquivo do multipart direto para um UploadBuffer do spool, em pedaços."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        buffer = upload_spool.new_buffer(filename)
+        self.upload_buffers = getattr(self, "upload_buffers", []) + [buffer]
+        return buffer
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app, resources={r"/*": {"origins": "*"}}) # CORS mais permissivo para debug
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
-PENDING_FOLDER = 'pending'
-STATUS_FOLDER = 'status'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'txt'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'txt'}
+
+# Intervalo (s) do keep-alive no /jobs/stream quando não há jobs novos
+JOB_STREAM_HEARTBEAT = float(os.getenv("JOB_STREAM_HEARTBEAT", "15"))
+
+# Requisições de polling (status, /pending, health, /metrics) entram no log 1 a cada N
+REQUEST_LOG_SAMPLE = int(os.getenv("REQUEST_LOG_SAMPLE", "20"))
+SAMPLED_REQUESTS = {
+    ("GET", "handle_status"),
+    ("GET", "list_pending"),
+    ("GET", "health_check"),
+    ("GET", "export_metrics"),
+}
+# Quantos traces de jobs guardar (os mais antigos saem primeiro)
+TRACE_MEMORY = 1024
+# Etapas aceitas por trace e por status recebido (o trace vem de fora, pelo /status)
+TRACE_MAX_SPANS = 64
+TRACE_MAX_SPANS_PER_UPDATE = 32
+# Campos de uma etapa (em bytes) que ficam guardados além de stage e seconds
+SPAN_FIELDS = ("rss", "bytes", "bytes_in")
 
 def ensure_directories():
     """Garante que as pastas essenciais existam."""
-    for folder in [UPLOAD_FOLDER, PENDING_FOLDER, STATUS_FOLDER]:
+    for folder in [UPLOAD_FOLDER]:
         if not os.path.exists(folder):
             os.makedirs(folder)
             logger.info(f"Diretório criado: {folder}")
@@ -33,10 +68,233 @@ def ensure_directories():
 ensure_directories()
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Recusa pelo Content-Length antes de ler o corpo (folga para os cabeçalhos do multipart)
+app.config['MAX_CONTENT_LENGTH'] = MAX_IMAGE_BYTES + 64 * 1024
+
+# Jobs, estados e histórico de status (memória ou SQLite, ver job_store.py)
+job_store = create_job_store()
+
+# Uploads pequenos ficam na memória até a bridge baixar. Com o job_store em SQLite
+# tudo vai para o disco, para a fila sobreviver a um restart junto com os arquivos.
+upload_spool = UploadSpool(UPLOAD_FOLDER, memory_budget=0 if job_store.persistent else UPLOAD_SPOOL_BYTES)
+# Job pendente que expirou sem a bridge pegar não deixa o upload para trás
+job_store.expired_handler = upload_spool.discard
+
+class JobFeed:
+    """
+    Entrega cada upload à bridge assim que ele chega (/jobs/stream), na ordem
+    de sequência do job_store.
+    O cursor "<epoch>:<seq>" permite retomar de onde a bridge parou; se o
+    servidor reiniciou (epoch diferente), tudo que ainda está pendente é reenviado.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.epoch = str(int(time.time()))
+        self._cond = threading.Condition()
+
+    def publish(self, filename):
+        with self._cond:
+            seq = self.store.add(filename)
+            self._cond.notify_all()
+            return seq
+
+    def parse_cursor(self, cursor):
+        try:
+            epoch, seq = (cursor or "").split(":")
+            return int(seq) if epoch == self.epoch else 0
+        except ValueError:
+            return 0
+
+    def format_cursor(self, seq):
+        return f"{self.epoch}:{seq}"
+
+    def next_jobs(self, seq, timeout):
+        """
+        (cursor, jobs pendentes depois de seq), esperando até timeout segundos
+        por um novo. Quando tudo depois de seq já foi processado, devolve na
+        hora o cursor no último seq e nenhum job: esses jobs não voltam a ficar
+        pendentes com o mesmo número, e a próxima chamada espera só pelos novos.
+        """
+        with self._cond:
+            jobs = self.store.pending_since(seq)
+            if not jobs and self.store.last_seq > seq:
+                return self.store.last_seq, []
+            if not jobs:
+                self._cond.wait_for(lambda: self.store.pending_since(seq), timeout)
+                jobs = self.store.pending_since(seq)
+            return seq, jobs
+
+job_feed = JobFeed(job_store)
+
+class StatusBroker:
+    """
+    Avisa quem está assinando (/status/<filename>/stream) sempre que set_status
+    muda o status de um arquivo. A versão de cada arquivo vem do job_store.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._cond = threading.Condition()
+
+    def version(self, filename):
+        return self.store.version(filename)
+
+    def notify(self, filename):
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, filename, version, timeout):
+        """Espera o status mudar depois de `version`. Retorna a versão atual."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.store.version(filename) != version, timeout)
+        return self.store.version(filename)
+
+status_broker = StatusBroker(job_store)
+
+# Métricas (GET /metrics). As etapas da bridge e da impressora chegam com os status.
+STAGE_SECONDS = metrics.registry.histogram(
+    "barzar_stage_seconds", "Duração de cada etapa dos jobs", ["stage"])
+STAGE_RSS = metrics.registry.histogram(
+    "barzar_stage_rss_bytes", "Memória residente do processo ao fim de cada etapa",
+    ["stage"], metrics.MEMORY_BUCKETS)
+JOB_SECONDS = metrics.registry.histogram(
+    "barzar_job_seconds", "Do upload ao status final do job", ["result"])
+BLE_BYTES = metrics.registry.counter(
+    "barzar_ble_bytes_total", "Bytes ESC/POS enviados para a impressora")
+BLE_THROUGHPUT = metrics.registry.histogram(
+    "barzar_ble_throughput_bytes_per_second", "Vazão de cada envio BLE", buckets=metrics.THROUGHPUT_BUCKETS)
+QUEUE_DEPTH = metrics.registry.gauge(
+    "barzar_queue_depth", "Jobs na fila da bridge e da impressora (último valor informado)", ["queue"])
+HTTP_REQUESTS = metrics.registry.counter(
+    "barzar_http_requests_total", "Requisições HTTP atendidas", ["endpoint", "method", "code"])
+HTTP_SECONDS = metrics.registry.histogram(
+    "barzar_http_request_seconds", "Tempo de resposta por endpoint", ["endpoint"])
+metrics.registry.gauge(
+    "barzar_jobs", "Jobs no servidor por estado", ["state"],
+    fn=lambda: {(state,): job_store.count(state) for state in (PENDING, ACTIVE)})
+metrics.registry.gauge(
+    "barzar_upload_spool_bytes", "Bytes de uploads guardados na memória", fn=lambda: upload_spool.memory_used)
+
+def clean_span(span):
+    """Etapa recebida só com nome conhecido e os campos numéricos esperados, ou None se o nome for outro."""
+    if not isinstance(span, dict) or span.get("stage") not in STAGES:
+        return None
+    clean = {"stage": span["stage"], "seconds": float(span["seconds"])}
+    for field in SPAN_FIELDS:
+        if field in span:
+            clean[field] = int(span[field])
+    if span.get("error"):
+        clean["error"] = True
+    return clean
+
+def observe_spans(spans):
+    for span in spans:
+        stage, seconds = str(span["stage"]), float(span["seconds"])
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if "rss" in span:
+            STAGE_RSS.observe(float(span["rss"]), stage=stage)
+        if span.get("bytes"):
+            BLE_BYTES.inc(int(span["bytes"]))
+            if seconds > 0:
+                BLE_THROUGHPUT.observe(int(span["bytes"]) / seconds)
+
+class JobTraces:
+    """
+    Trace de cada job no servidor: o ID criado no upload, as etapas do próprio
+    servidor e as que a bridge e a impressora mandam junto com os status.
+    """
+
+    def __init__(self, limit=TRACE_MEMORY):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+
+    def start(self, filename, trace_id=None):
+        trace = Trace(filename, trace_id)
+        with self._lock:
+            self._traces[filename] = trace
+            while len(self._traces) > self.limit:
+                self._traces.popitem(last=False)
+        return trace
+
+    def get(self, filename):
+        with self._lock:
+            return self._traces.get(filename)
+
+    def add(self, filename, spans):
+        """
+        Etapas medidas aqui ou recebidas de outro processo: entram no trace e nos
+        histogramas. Só vale para jobs com trace neste servidor, com nomes de
+        etapa conhecidos e até TRACE_MAX_SPANS etapas por trace.
+        """
+        trace = self.get(filename)
+        if trace is None:
+            return
+        spans = [span for span in map(clean_span, spans[:TRACE_MAX_SPANS_PER_UPDATE]) if span]
+        with self._lock:
+            spans = spans[:max(0, TRACE_MAX_SPANS - len(trace.spans))]
+            trace.spans.extend(spans)
+        observe_spans(spans)
+
+    def picked_up(self, filename):
+        """A bridge pegou o job: fecha a etapa "pending" (só na primeira vez). Retorna o trace."""
+        trace = self.get(filename)
+        if trace and not trace.has("pending"):
+            self.add(filename, [{"stage": "pending", "seconds": round(time.time() - trace.started, 6)}])
+        return trace
+
+    def record(self, filename, data):
+        """Trace exportado por outro processo (Trace.export())."""
+        try:
+            self.add(filename, list(data.get("spans", [])))
+            for name, value in data.get("gauges", {}).items():
+                if name in GAUGES:
+                    QUEUE_DEPTH.set(float(value), queue=name)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Trace inválido para {filename}: {e}")
+
+    def finish(self, filename, status):
+        """Status final: tempo total do job e uma linha com todas as etapas no log."""
+        trace = self.get(filename)
+        if trace is None or trace.finished:
+            return
+        trace.finished = time.time()
+        JOB_SECONDS.observe(trace.finished - trace.started, result="ok" if status == "Pronto" else "error")
+        logger.info(f"{trace.summary()} | total {(trace.finished - trace.started) * 1000:.0f} ms")
+
+job_traces = JobTraces()
+request_log = LogSampler(REQUEST_LOG_SAMPLE)
 
 @app.before_request
 def log_request_info():
-    logger.info(f"Request: {request.method} {request.url}")
+    g.request_start = time.perf_counter()
+    suffix = ""
+    if (request.method, request.endpoint) in SAMPLED_REQUESTS:
+        skipped = request_log.sample((request.method, request.endpoint))
+        if skipped is None:
+            return
+        suffix = f" (+{skipped} omitidas)" if skipped else ""
+    logger.info(f"Request: {request.method} {request.url}{suffix}")
+
+@app.after_request
+def count_request(response):
+    endpoint = request.endpoint or "unknown"
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, code=response.status_code)
+    if "request_start" in g:
+        HTTP_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def discard_upload_buffers(exc=None):
+    # Buffers de uploads recusados ou interrompidos (os guardados no spool já foram esvaziados)
+    for buffer in getattr(request, "upload_buffers", []):
+        buffer.discard()
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    logger.error(f"Upload recusado: {e.description}")
+    return jsonify({"error": "File too large"}), 413
 
 @app.route('/', methods=['GET'])
 def health_check():
@@ -58,31 +316,111 @@ def upload_file():
         return jsonify({"error": "No selected file"}), 400
     
     filename = secure_filename(f"{int(time.time())}_{file.filename}")
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
+    buffer = file.stream
+    if is_text_upload(filename):
+        text = buffer.getvalue().decode('utf-8', errors='replace')
+        if len(text) > MAX_TEXT_CHARS:
+            logger.error(f"Text message too long: {len(text)} chars")
+            return jsonify({"error": f"Message longer than {MAX_TEXT_CHARS} characters"}), 413
+    in_memory = upload_spool.store(filename, buffer)
+    # O cliente pode mandar o próprio ID (X-Trace-Id) para juntar as medidas dele às do servidor
+    trace = job_traces.start(filename, request.headers.get(TRACE_HEADER))
+    job_traces.add(filename, [{"stage": "upload", "seconds": round(time.perf_counter() - g.request_start, 6),
+                               "bytes_in": buffer.size}])
+    logger.info(f"Upload {filename}: {buffer.size} bytes ({'memória' if in_memory else 'disco'}), trace {trace.trace_id}")
     
-    # Mark as pending for the Mac
-    with open(os.path.join(PENDING_FOLDER, filename), 'w') as f:
-        f.write('pending')
+    # Mark as pending for the Mac (e entrega na hora para as bridges no /jobs/stream)
+    job_feed.publish(filename)
     
     # Initial status
     set_status(filename, "Conteúdo telepaticamente enviado")
     logger.info(f"File {filename} uploaded and marked as pending")
     
-    return jsonify({"filename": filename, "status": "Uploaded"}), 200
+    response = jsonify({"filename": filename, "status": "Uploaded", "trace": trace.trace_id})
+    response.headers[TRACE_HEADER] = trace.trace_id
+    return response, 200
+
+@app.route('/reprint/<filename>', methods=['POST', 'OPTIONS'])
+@app.route('/reprint/<filename>/', methods=['POST', 'OPTIONS'])
+def reprint_file(filename):
+    """
+    Cria um job de reimpressão: o arquivo .reprint só leva o ID do job original
+    e a impressora reaproveita o render que ficou no cache dela.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({"status": "ok"}), 200
+
+    original = secure_filename(filename)
+    if not original:
+        return jsonify({"error": "Invalid filename"}), 400
+    reprint_name = f"{int(time.time())}_{original}.reprint"
+    upload_spool.put_bytes(reprint_name, original.encode('utf-8'))
+    job_traces.start(reprint_name, request.headers.get(TRACE_HEADER))
+
+    job_feed.publish(reprint_name)
+    set_status(reprint_name, "Reimpressão enviada")
+    logger.info(f"Reprint of {original} queued as {reprint_name}")
+
+    return jsonify({"filename": reprint_name, "original": original, "status": "Uploaded"}), 200
 
 @app.route('/pending', methods=['GET'])
 @app.route('/pending/', methods=['GET'])
 def list_pending():
-    files = os.listdir(PENDING_FOLDER)
-    logger.info(f"Listing pending files: {files}")
+    files = job_store.pending()
+    if files:
+        logger.info(f"Listing pending files: {files}")
     return jsonify(files)
 
+@app.route('/jobs/stream', methods=['GET'])
+@app.route('/jobs/stream/', methods=['GET'])
+def jobs_stream():
+    """
+    Server-Sent Events com cada job novo assim que o upload chega.
+    Retoma a partir do cursor em Last-Event-ID (reconexão automática) ou ?cursor=.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    start_seq = job_feed.parse_cursor(cursor)
+    logger.info(f"Bridge conectada ao stream de jobs (cursor: {cursor or 'início'})")
+
+    def generate():
+        seq = start_seq
+        yield "retry: 2000\n\n"
+        while True:
+            cursor, jobs = job_feed.next_jobs(seq, JOB_STREAM_HEARTBEAT)
+            if not jobs:
+                if cursor != seq:
+                    # Jobs depois do cursor já foram processados: avança o Last-Event-ID
+                    # do cliente para a reconexão não voltar neles
+                    seq = cursor
+                    yield f"id: {job_feed.format_cursor(seq)}\nevent: cursor\ndata: {{}}\n\n"
+                    continue
+                # Comentário SSE para manter a conexão viva pelo tunnel
+                yield ": keep-alive\n\n"
+                continue
+            for job_seq, filename in jobs:
+                seq = job_seq
+                payload = json.dumps({"filename": filename})
+                yield f"id: {job_feed.format_cursor(job_seq)}\nevent: job\ndata: {payload}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
 @app.route('/download/<filename>', methods=['GET'])
 @app.route('/download/<filename>/', methods=['GET'])
 def download_file(filename):
     logger.info(f"Downloading file: {filename}")
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    trace = job_traces.picked_up(filename)
+    data = upload_spool.get(filename)
+    if data is not None:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = Response(data, mimetype=mimetype)
+    else:
+        # Caminho absoluto: o spool grava relativo ao diretório atual, não à raiz do app
+        response = send_from_directory(os.path.abspath(app.config['UPLOAD_FOLDER']), filename)
+    if trace:
+        # A bridge continua o mesmo trace
+        response.headers[TRACE_HEADER] = trace.trace_id
+    return response
 
 @app.route('/status/<filename>', methods=['GET', 'POST', 'OPTIONS'])
 @app.route('/status/<filename>/', methods=['GET', 'POST', 'OPTIONS'])
@@ -93,13 +431,76 @@ def handle_status(filename):
     if request.method == 'POST':
         data = request.json
         status = data.get('status', 'unknown')
-        set_status(filename, status)
+        set_status(filename, status, trace=data.get('trace'))
         logger.info(f"Status update for {filename}: {status}")
         return jsonify({"success": True})
     else:
         status = get_status(filename)
+        if request.args.get('history'):
+            history = [{"ts": ts, "status": s} for ts, s in job_store.history(filename)]
+            trace = job_traces.get(filename)
+            return jsonify({"status": status, "history": history, "trace": trace.export() if trace else None})
         return jsonify({"status": status})
 
+@app.route('/status/<filename>/stream', methods=['GET'])
+def status_stream(filename):
+    """
+    Server-Sent Events com cada mudança de status do arquivo, no momento em que
+    set_status é chamado. Fecha sozinho quando chega em "Pronto" ou erro.
+    """
+    def generate():
+        version = status_broker.version(filename)
+        status = get_status(filename)
+        yield "retry: 2000\n\n"
+        yield f"data: {json.dumps({'status': status})}\n\n"
+        while not is_final_status(status):
+            new_version = status_broker.wait(filename, version, JOB_STREAM_HEARTBEAT)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            status = get_status(filename)
+            yield f"data: {json.dumps({'status': status})}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+@app.route('/status/batch', methods=['POST', 'OPTIONS'])
+@app.route('/status/batch/', methods=['POST', 'OPTIONS'])
+def handle_status_batch():
+    """
+    Várias atualizações de status num único POST:
+    {"updates": [{"filename": ..., "status": ..., "age": ...}, ...]}
+    age é há quantos segundos o status mudou no cliente; o horário da
+    atualização é calculado no relógio do servidor (o relógio do cliente pode
+    estar errado). Clientes antigos mandam "ts", que não passa de agora.
+    Atualizações mais antigas que o status atual do arquivo são ignoradas.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({"status": "ok"}), 200
+
+    received = time.time()
+    data = request.get_json(silent=True) or {}
+    updates = data.get('updates', []) if isinstance(data, dict) else None
+    if not isinstance(updates, list):
+        return jsonify({"error": "Updates must be a list"}), 400
+    applied = 0
+    for item in updates:
+        if not isinstance(item, dict):
+            continue
+        filename = secure_filename(str(item.get('filename') or ''))
+        if not filename:
+            continue
+        age, ts = item.get('age'), item.get('ts')
+        if isinstance(age, (int, float)):
+            ts = received - max(age, 0)
+        elif not isinstance(ts, (int, float)):
+            ts = None
+        if set_status(filename, item.get('status', 'unknown'), ts, item.get('trace')):
+            applied += 1
+    logger.info(f"Status batch: {applied}/{len(updates)} updates applied")
+    return jsonify({"success": True, "applied": applied})
+
 @app.route('/processed/<filename>', methods=['DELETE', 'OPTIONS'])
 @app.route('/processed/<filename>/', methods=['DELETE', 'OPTIONS'])
 def mark_processed(filename):
@@ -108,30 +509,37 @@ def mark_processed(filename):
         
     logger.info(f"Marking as processed: {filename}")
     
-    # 1. Delete from pending folder
-    pending_path = os.path.join(PENDING_FOLDER, filename)
-    if os.path.exists(pending_path):
-        os.remove(pending_path)
+    # 1. Remove from pending
+    job_store.mark_processed(filename)
     
-    # 2. Delete from upload folder (The actual file)
-    upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(upload_path):
-        os.remove(upload_path)
+    # 2. Delete the actual file (spool in memory or upload folder)
+    if upload_spool.discard(filename):
         logger.info(f"File {filename} deleted from uploads.")
         
     return jsonify({"success": True})
 
-def set_status(filename, status):
-    status_path = os.path.join(STATUS_FOLDER, f"{filename}.status")
-    with open(status_path, 'w') as f:
-        f.write(status)
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Métricas no formato texto do Prometheus: filas, etapas dos jobs, BLE e HTTP."""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+def set_status(filename, status, ts=None, trace=None):
+    """
+    Grava o status. Com ts, ignora a atualização se já existe uma mais nova.
+    trace: etapas medidas por quem mandou o status (Trace.export()).
+    """
+    if trace:
+        # As medidas valem mesmo que o status tenha chegado atrasado
+        job_traces.record(filename, trace)
+    if not job_store.set_status(filename, status, ts):
+        return False
+    if is_final_status(status):
+        job_traces.finish(filename, status)
+    status_broker.notify(filename)
+    return True
 
 def get_status(filename):
-    status_path = os.path.join(STATUS_FOLDER, f"{filename}.status")
-    if os.path.exists(status_path):
-        with open(status_path, 'r') as f:
-            return f.read()
-    return "Aguardando..."
+    return job_store.get_status(filename) or "Aguardando..."
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001)
+    app.run(host='0.0.0.0', port=5001, threaded=True)
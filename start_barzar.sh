@@ -17,6 +17,17 @@ run_in_new_terminal() {
     end tell"
 }
 
+# Modo tudo-em-um (./start_barzar.sh --all-in-one): servidor, bridge e impressora
+# num processo só (barzar_all.py), com o tunnel em outra janela
+if [[ "$1" == "--all-in-one" ]]; then
+    echo " - Iniciando Servidor + Bridge + Impressora (Porta 5001)..."
+    run_in_new_terminal "Barzar: All-in-one" "'$VENV_PYTHON' barzar_all.py"
+    echo " - Iniciando Tunnel (api.exemplo.com)..."
+    run_in_new_terminal "Barzar: Tunnel" "cloudflared tunnel run --url http://127.0.0.1:5001 barzar"
+    echo "✅ Modo tudo-em-um aberto em novas janelas do Terminal."
+    exit 0
+fi
+
 # 1. Iniciar Servidor Flask
 echo " - Iniciando Servidor (Porta 5001)..."
 run_in_new_terminal "Barzar: Server" "'$VENV_PYTHON' server.py"
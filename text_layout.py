@@ -0,0 +1,151 @@
+import os
+from functools import lru_cache
+
+from PIL import ImageFont
+
+# Fonte das mensagens de texto. Vazio = primeira das FONT_CANDIDATES que existir
+TEXT_FONT_PATH = os.getenv("TEXT_FONT_PATH", "")
+FONT_CANDIDATES = [
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+]
+
+# Tamanhos testados (maior que couber na área), como no loop antigo de 60 até 20
+MIN_FONT_SIZE = 20
+MAX_FONT_SIZE = 60
+FONT_SIZE_STEP = 2
+LINE_SPACING = 4
+
+FONT_CACHE_SIZE = 32
+WORD_CACHE_SIZE = 4096
+# Folga (fração do tamanho da fonte) em que a soma das larguras das palavras
+# pode diferir da medida da linha inteira por causa do kerning
+KERNING_SLACK = 0.05
+
+
+@lru_cache(maxsize=None)
+def resolve_font_path(path=None):
+    """Primeira fonte existente: a configurada, depois as candidatas. None = fonte embutida do Pillow."""
+    for candidate in [path or TEXT_FONT_PATH] + FONT_CANDIDATES:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    print("Nenhuma fonte TrueType encontrada. Usando a fonte embutida do Pillow.")
+    return None
+
+
+def font_id(path=None):
+    """Identifica a fonte em uso (caminho + mtime), para chaves de cache de render."""
+    path = resolve_font_path(path)
+    if not path:
+        return "pillow-default"
+    return f"{path}:{os.stat(path).st_mtime_ns}"
+
+
+class FontMetrics:
+    """Fonte carregada num tamanho, com cache das larguras de palavras já medidas."""
+
+    def __init__(self, font, size):
+        self.font = font
+        self.size = size
+        self._widths = {}
+        self.space = self.width(" ")
+
+    def width(self, text):
+        cached = self._widths.get(text)
+        if cached is None:
+            if hasattr(self.font, 'getlength'):
+                cached = self.font.getlength(text)
+            else:
+                cached = self.font.getsize(text)[0]
+            if len(self._widths) >= WORD_CACHE_SIZE:
+                self._widths.clear()
+            self._widths[text] = cached
+        return cached
+
+    def exact(self, text):
+        """Largura da linha inteira (com kerning), sem passar pelo cache."""
+        if hasattr(self.font, 'getlength'):
+            return self.font.getlength(text)
+        return self.font.getsize(text)[0]
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_metrics(path, size):
+    """FontMetrics de (fonte, tamanho), mantidas num LRU para não recarregar a fonte a cada mensagem."""
+    try:
+        font = ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+    except Exception:
+        font = ImageFont.load_default()
+    return FontMetrics(font, size)
+
+
+def wrap_words(words, metrics, max_width):
+    """
+    Quebra as palavras em linhas menores que max_width, com a mesma regra do
+    loop antigo. A largura é estimada somando as palavras em cache; só perto
+    do limite a linha inteira é medida de verdade.
+    """
+    slack = metrics.size * KERNING_SLACK
+    lines = []
+    current_line = ""
+    current_width = 0.0
+    current_words = 0
+    for word in words:
+        if current_line:
+            test_line = current_line + " " + word
+            estimate = current_width + metrics.space + metrics.width(word)
+        else:
+            test_line = word
+            estimate = metrics.width(word)
+
+        if abs(estimate - max_width) <= slack * (current_words + 1):
+            estimate = metrics.exact(test_line)
+
+        if estimate < max_width:
+            current_line = test_line
+            current_width = estimate
+            current_words += 1
+        else:
+            lines.append(current_line)
+            current_line = word
+            current_width = metrics.width(word)
+            current_words = 1
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def layout(text, metrics, max_width):
+    lines = wrap_words(text.split(), metrics, max_width)
+    line_height = metrics.size + LINE_SPACING
+    return lines, len(lines) * line_height, line_height
+
+
+def fit_text(text, max_width, max_height, font_path=None,
+             min_size=MIN_FONT_SIZE, max_size=MAX_FONT_SIZE, step=FONT_SIZE_STEP):
+    """
+    Maior tamanho de fonte (entre min_size e max_size, de step em step) em que
+    o texto quebrado cabe em max_width x max_height. Busca binária: quanto
+    maior a fonte, mais alto o texto. Se nenhum couber, usa min_size.
+    Retorna (linhas, fonte, altura total, altura da linha).
+    """
+    path = resolve_font_path(font_path)
+    sizes = list(range(min_size, max_size + 1, step))
+    best = sizes[0]
+    low, high = 0, len(sizes) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        _, total_height, _ = layout(text, get_metrics(path, sizes[mid]), max_width)
+        if total_height <= max_height:
+            best = sizes[mid]
+            low = mid + 1
+        else:
+            high = mid - 1
+
+    metrics = get_metrics(path, best)
+    lines, total_height, line_height = layout(text, metrics, max_width)
+    return lines, metrics.font, total_height, line_height
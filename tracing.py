@@ -0,0 +1,225 @@
+import contextvars
+import ctypes
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: sem pico de memória (peak_rss)
+
+# Cabeçalho HTTP que leva o ID do trace (upload do cliente e download da bridge)
+TRACE_HEADER = "X-Trace-Id"
+# Uma linha com as etapas de cada job no log de cada processo ("0" desliga)
+TRACE_LOG = os.getenv("TRACE_LOG", "1") != "0"
+# O trace de um arquivo da print_queue fica num arquivo oculto ao lado (o watcher ignora)
+TRACE_SUFFIX = ".trace"
+
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Etapas e filas que os processos medem. O servidor só aceita estes nomes nos
+# traces que chegam com os status (cada nome vira uma série no /metrics).
+STAGES = frozenset({
+    "upload", "pending",                                                  # servidor
+    "download", "decode", "resize", "vision", "composite", "encode",      # bridge
+    "sips", "raw", "queue_write",
+    "print_queue", "print_render", "print_wait", "status_check", "ble_send",  # impressora
+})
+GAUGES = frozenset({"bridge_in_flight", "bridge_handoff", "print_queue", "print_ready"})
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def clean_trace_id(value):
+    """ID vindo de fora (cabeçalho, arquivo) se tiver um formato aceitável, senão None."""
+    if value and TRACE_ID_PATTERN.match(value):
+        return value
+    return None
+
+
+def peak_rss():
+    """Pico de memória residente do processo, em bytes (None sem o módulo resource)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_libproc = None
+# proc_pidinfo(PROC_PIDTASKINFO) preenche um struct proc_taskinfo de 96 bytes;
+# o segundo campo (uint64) é a memória residente
+PROC_PIDTASKINFO = 4
+
+
+def _darwin_rss():
+    global _libproc
+    try:
+        if _libproc is None:
+            _libproc = ctypes.CDLL("/usr/lib/libproc.dylib")
+            _libproc.proc_pidinfo.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_uint64, ctypes.c_void_p, ctypes.c_int]
+        info = (ctypes.c_uint64 * 12)()
+        if _libproc.proc_pidinfo(os.getpid(), PROC_PIDTASKINFO, 0, info, ctypes.sizeof(info)) == ctypes.sizeof(info):
+            return int(info[1])
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
+def current_rss():
+    """
+    Memória residente do processo agora, em bytes (None se o sistema não
+    informar). Ao contrário do ru_maxrss, desce quando a memória é devolvida.
+    """
+    if sys.platform == "darwin":
+        return _darwin_rss()
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Trace:
+    """
+    Etapas de um job dentro de um processo: nome, duração e a memória
+    residente do processo ao fim da etapa. O mesmo trace_id acompanha o job
+    do upload até a impressora; cada processo manda as suas etapas ao
+    servidor junto com um status (export()).
+    """
+
+    def __init__(self, job, trace_id=None, started=None):
+        self.job = job
+        self.trace_id = clean_trace_id(trace_id) or new_trace_id()
+        self.started = started or time.time()
+        self.finished = None
+        self.spans = []
+        self.gauges = {}
+
+    def add(self, stage, seconds, rss=None, **attrs):
+        span = {"stage": stage, "seconds": round(seconds, 6)}
+        if rss is not None:
+            span["rss"] = rss
+        span.update(attrs)
+        self.spans.append(span)
+        return span
+
+    def has(self, stage):
+        return any(span["stage"] == stage for span in self.spans)
+
+    @contextmanager
+    def stage(self, name, **attrs):
+        """Mede o bloco como uma etapa. O dict devolvido aceita atributos extras (ex.: bytes)."""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException:
+            attrs["error"] = True
+            raise
+        finally:
+            self.add(name, time.perf_counter() - start, current_rss(), **attrs)
+
+    def export(self):
+        """Forma serializável (JSON) que vai para o servidor com o status."""
+        data = {"id": self.trace_id, "spans": self.spans}
+        if self.gauges:
+            data["gauges"] = self.gauges
+        return data
+
+    def summary(self):
+        parts = [f"{span['stage']} {span['seconds'] * 1000:.0f} ms" for span in self.spans]
+        return f"[trace {self.trace_id}] {self.job}: " + " | ".join(parts)
+
+    def log(self):
+        if TRACE_LOG and self.spans:
+            print(self.summary())
+
+
+@contextmanager
+def activate(trace):
+    """Torna trace o trace ativo do contexto (thread ou tarefa asyncio) durante o bloco."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def stage(name, **attrs):
+    """Etapa do trace ativo. Sem trace ativo, só roda o bloco."""
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    with trace.stage(name, **attrs) as span:
+        yield span
+
+
+# Trace dos arquivos da print_queue (bridge -> print_phomemo)
+
+def trace_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}{TRACE_SUFFIX}")
+
+
+def save_for_queue(trace, path):
+    """Grava o ID do trace ao lado do arquivo da fila. Chamar antes de o arquivo aparecer na pasta."""
+    with open(trace_path(path), "w", encoding="utf-8") as f:
+        json.dump({"id": trace.trace_id, "queued": time.time()}, f)
+
+
+def load_from_queue(path):
+    """
+    Trace do arquivo da fila com o ID gravado pela bridge (ou um novo, para
+    arquivos copiados à mão) e o horário em que ele entrou na fila (ou None).
+    """
+    name = os.path.basename(path)
+    try:
+        with open(trace_path(path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return Trace(name, data.get("id")), data.get("queued")
+    except (OSError, ValueError, AttributeError):
+        return Trace(name), None
+
+
+def discard_from_queue(path):
+    try:
+        os.remove(trace_path(path))
+    except OSError:
+        pass
+
+
+class LogSampler:
+    """
+    Amostragem de logs repetitivos: por chave, deixa passar a primeira linha e
+    depois 1 a cada `every`, contando as que ficaram de fora.
+    """
+
+    def __init__(self, every):
+        self.every = max(1, every)
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def sample(self, key):
+        """Quantas linhas da chave foram omitidas desde a última registrada, ou None para omitir esta."""
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+            if count % self.every:
+                return None
+            return self.every - 1 if count else 0
@@ -0,0 +1,162 @@
+import io
+import os
+import tempfile
+import threading
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Limites de upload: mensagens de texto em caracteres, imagens em bytes
+MAX_TEXT_CHARS = 280
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+
+# Spool em memória: orçamento total e tamanho máximo de um arquivo para ficar na memória
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_SPOOL_FILE_BYTES = int(os.getenv("UPLOAD_SPOOL_FILE_BYTES", str(4 * 1024 * 1024)))
+
+PART_PREFIX = ".upload-"
+
+
+def is_text_upload(filename):
+    return (filename or "").lower().endswith(".txt")
+
+
+def upload_limit(filename):
+    """Tamanho máximo em bytes do arquivo (texto: 280 caracteres de até 4 bytes em UTF-8)."""
+    return MAX_TEXT_CHARS * 4 if is_text_upload(filename) else MAX_IMAGE_BYTES
+
+
+class UploadBuffer:
+    """
+    Destino do corpo do upload enquanto o multipart é lido em pedaços.
+    Fica em memória até memory_limit bytes e depois passa para um arquivo
+    temporário em overflow_dir. Passou de max_size, a requisição é recusada (413).
+    """
+
+    def __init__(self, max_size, memory_limit, overflow_dir):
+        self.max_size = max_size
+        self.memory_limit = memory_limit
+        self.overflow_dir = overflow_dir
+        self.size = 0
+        self.path = None
+        self._file = io.BytesIO()
+
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise RequestEntityTooLarge(f"Arquivo maior que o limite de {self.max_size} bytes.")
+        if self.path is None and self.size > self.memory_limit:
+            self._rollover()
+        return self._file.write(data)
+
+    def _rollover(self):
+        fd, self.path = tempfile.mkstemp(prefix=PART_PREFIX, suffix=".part", dir=self.overflow_dir)
+        overflow = os.fdopen(fd, "w+b")
+        overflow.write(self._file.getvalue())
+        self._file = overflow
+
+    def getvalue(self):
+        if self.in_memory:
+            return self._file.getvalue()
+        self._file.seek(0)
+        return self._file.read()
+
+    def move_to(self, path):
+        """Grava o conteúdo em path (rename quando já está em disco)."""
+        if self.in_memory:
+            with open(path, "wb") as f:
+                f.write(self._file.getbuffer())
+        else:
+            self._file.close()
+            os.replace(self.path, path)
+            self.path = None
+        self._file = io.BytesIO()
+
+    def discard(self):
+        """Descarta o conteúdo (upload recusado ou que não chegou a ser guardado)."""
+        self._file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def __getattr__(self, name):
+        # read/seek/readline/tell... do arquivo atual (FileStorage lê por aqui)
+        return getattr(self._file, name)
+
+
+class UploadSpool:
+    """
+    Uploads esperando a bridge baixar. Os pequenos ficam na memória, dentro de
+    um orçamento total de memory_budget bytes, e são servidos direto do buffer;
+    o que não couber vai para upload_dir como antes.
+    """
+
+    def __init__(self, upload_dir, memory_budget=UPLOAD_SPOOL_BYTES, file_limit=UPLOAD_SPOOL_FILE_BYTES):
+        self.upload_dir = upload_dir
+        self.memory_budget = memory_budget
+        self.file_limit = file_limit
+        self.memory_used = 0
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._clean_partials()
+
+    def _clean_partials(self):
+        # Restos de uploads interrompidos numa execução anterior
+        for name in os.listdir(self.upload_dir):
+            if name.startswith(PART_PREFIX):
+                os.remove(os.path.join(self.upload_dir, name))
+
+    def new_buffer(self, filename):
+        memory_limit = min(self.file_limit, self.memory_budget)
+        return UploadBuffer(upload_limit(filename), memory_limit, self.upload_dir)
+
+    def store(self, filename, buffer):
+        """Guarda o upload terminado. Retorna True se ficou na memória."""
+        if buffer.in_memory:
+            with self._lock:
+                if self.memory_used + buffer.size <= self.memory_budget:
+                    self._memory[filename] = buffer.getvalue()
+                    self.memory_used += buffer.size
+                    return True
+        buffer.move_to(os.path.join(self.upload_dir, filename))
+        return False
+
+    def put_bytes(self, filename, data):
+        """Guarda um conteúdo gerado pelo próprio servidor (ex.: pedido de reimpressão)."""
+        with self._lock:
+            if self.memory_used + len(data) <= self.memory_budget:
+                self._memory[filename] = data
+                self.memory_used += len(data)
+                return True
+        with open(os.path.join(self.upload_dir, filename), "wb") as f:
+            f.write(data)
+        return False
+
+    def get(self, filename):
+        """Conteúdo do upload se ele está na memória, senão None (está em disco)."""
+        with self._lock:
+            return self._memory.get(filename)
+
+    def read(self, filename):
+        """Conteúdo do upload, da memória ou do disco."""
+        data = self.get(filename)
+        if data is not None:
+            return data
+        with open(os.path.join(self.upload_dir, filename), "rb") as f:
+            return f.read()
+
+    def discard(self, filename):
+        """Remove o upload da memória ou do disco. Retorna True se existia."""
+        with self._lock:
+            data = self._memory.pop(filename, None)
+            if data is not None:
+                self.memory_used -= len(data)
+                return True
+        path = os.path.join(self.upload_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False